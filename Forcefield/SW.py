@@ -31,14 +31,19 @@ Stillinger-Weber potential are as followed:
 - Assumes a theta cutoff for the three-body interaction in LAMMPS as 
 described in the appendix of Jiang et al.[1]
 
+- verifyGulpLammps evaluates both forms on (r_ij, r_ik, theta) grids for
+every entry and reports the largest differences; genLAMMPSfile runs it on
+the converted parameters of every file it writes
+
 [1] Y. Zhou and J. Jiang, Scientific Reports 7, (2017).
 
 @author: K. Atalar
 """
 
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
-import itertools
+import re
 import sys
 
 ###############################################################################
@@ -47,73 +52,204 @@ PFORMAT = '{:<3} {:<3} {:<3} {:>8.3f} {:>7.3f} {:>7.3f} {:>7.3f} {:>7.3f} {:>7.3
 METAL= ['Sc','Ti','V','Cr','Mn','Fe','Co','Ni','Zr','Nb','Mo','Tc','Rh', \
          'Pd','Sn','Hf','Ta','W','Re','Ir','Pt']
 CHALCOGEN = ['O','S','Se','Te']
+ZEROPAR = [0] + [1]*7 + [4,0,0.0] # Interactions that are not described in dicGulp
+SW_FIELDS = ['epsilon','sigma','a','lambda','gamma','costheta0','A','B','p','q','tol']
+SW_DTYPE = [('i','i4'), ('j','i4'), ('k','i4')] + [(f,'f8') for f in SW_FIELDS]
+REPORT_DTYPE = [('el1','U8'), ('el2','U8'), ('el3','U8'), ('term','U2'),
+                ('max_abs','f8'), ('max_rel','f8')]
+GULP_TYPES = ['core','shel','bcore','bshel'] # Species types following the labels
+GULP2_DTYPE = [('el1','U8'), ('el2','U8'), ('A','f8'), ('rho','f8'), ('B','f8'),
+               ('rmin','f8'), ('rmax','f8')]
+GULP3_DTYPE = [('el1','U8'), ('el2','U8'), ('el3','U8'), ('K','f8'), ('theta0','f8'),
+               ('rho12','f8'), ('rho13','f8'), ('rmin12','f8'), ('rmax12','f8'),
+               ('rmin13','f8'), ('rmax13','f8')]
 ###############################################################################
 
+def _isMetal(atom):
+    '''
+    Function to check whether an atom label is a metal (True) or a
+    chalcogen (False), allowing an appended number (e.g. "Mo1", "Se2")
+    '''
+    if atom in METAL or atom[:-1] in METAL:
+        return True
+    elif atom in CHALCOGEN or atom[:-1] in CHALCOGEN:
+        return False
+    raise ValueError('Cannot identify whether %s is metal or chalcogen'%atom)
+
+
+def _gulpEntries(lines, nat, npar):
+    '''
+    Function to split the lines of an sw2/sw3 block into species labels and
+    parameters, stopping at the first line that is not an entry
+
+    OUTPUT:
+        labels: List of species tuples (nat labels each)
+        pars: List of parameter lists (npar floats each)
+        nread: Number of lines of the block
+    '''
+    labels = []; pars = []
+    for nread, line in enumerate(lines):
+        # Species may be followed by their core/shell type
+        splt = [i for i in line.split() if i not in GULP_TYPES]
+        try:
+            par = [float(i.replace('d','e').replace('D','e')) for i in splt[nat:]]
+        except ValueError:
+            return labels, pars, nread
+        if len(splt) < nat + npar:
+            return labels, pars, nread
+        labels.append(tuple(splt[:nat]))
+        pars.append(par[:npar])
+    return labels, pars, len(lines)
+
+
+def readGulpTable(fname):
+    '''
+    Function to read every sw2 and sw3 entry of a GULP input file
+
+    INPUT:
+        fname: GULP input file (.gin)
+
+    OUTPUT:
+        sw2: Structured array (GULP2_DTYPE) of the two-body entries
+             (el1, el2, A, rho, B, rmin, rmax)
+        sw3: Structured array (GULP3_DTYPE) of the three-body entries with
+             the central atom first (el1, el2, el3, K, theta0, rho12, rho13,
+             rmin12, rmax12, rmin13, rmax13)
+    '''
+    with open(fname) as f:
+        text = f.read()
+    # Comments and continuation lines
+    text = re.sub(r'[#!].*', '', text).replace('&\n', ' ')
+    lines = text.splitlines()
+
+    rows2 = []; rows3 = []
+    k = 0
+    while k < len(lines):
+        splt = lines[k].split()
+        keyword = splt[0].lower() if splt else ''
+        k += 1
+        if keyword in ('sw2', 'sw3'):
+            nat, npar, rows = (2, 5, rows2) if keyword == 'sw2' else (3, 8, rows3)
+            # The block ends at the first line that is not an entry
+            # (blank line or next keyword)
+            labels, pars, nread = _gulpEntries(lines[k:], nat, npar)
+            rows += [lab + tuple(par) for lab, par in zip(labels, pars)]
+            k += nread
+
+    return np.array(rows2, dtype=GULP2_DTYPE), np.array(rows3, dtype=GULP3_DTYPE)
+
+
+def _dedupe(table, keys, fname=''):
+    '''
+    Function to remove the repeated rows of a parameter table, keeping the
+    first occurrence. Different parameters for the same species (keys) are
+    reported and only the first one is kept.
+    '''
+    if len(table) == 0:
+        return table
+    first = np.sort(np.unique(table, return_index=True)[1])
+    table = table[first]
+    spec = np.array([' '.join(row) for row in zip(*[table[key] for key in keys])])
+    uniq, first, count = np.unique(spec, return_index=True, return_counts=True)
+    for name in uniq[count > 1]:
+        print('Warning in %s: Different parameters for %s, the first ones are used'%(fname or 'readGulpLibrary', name))
+    return table[np.sort(first)]
+
+
+def readGulpLibrary(fnames, workers=None):
+    '''
+    Function to read many GULP input files concurrently (threads) into a
+    single pair of parameter tables without repeated entries
+
+    INPUT:
+        fnames: List of GULP input files
+        workers: Number of threads (default: ThreadPoolExecutor default)
+
+    OUTPUT:
+        atomName: Species in the order they first appear
+        sw2, sw3: Parameter tables as in readGulpTable
+    '''
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        tables = list(pool.map(readGulpTable, fnames))
+
+    sw2 = np.concatenate([t[0] for t in tables]) if tables else np.zeros(0, dtype=GULP2_DTYPE)
+    sw3 = np.concatenate([t[1] for t in tables]) if tables else np.zeros(0, dtype=GULP3_DTYPE)
+    # Two-body entries do not depend on the order of the pair
+    swap = sw2['el1'] > sw2['el2']
+    sw2['el1'][swap], sw2['el2'][swap] = sw2['el2'][swap], sw2['el1'][swap].copy()
+    sw2 = _dedupe(sw2, ['el1', 'el2'])
+    sw3 = _dedupe(sw3, ['el1', 'el2', 'el3'])
+
+    atomName = []
+    for t2, t3 in tables:
+        for row in list(zip(t2['el1'], t2['el2'])) + list(zip(t3['el1'], t3['el2'], t3['el3'])):
+            for at in row:
+                if at not in atomName:
+                    atomName.append(str(at))
+    return atomName, sw2, sw3
+
+
+def gulpTableDic(sw2, sw3):
+    '''
+    Function to build the dictionary of GULP parameters (same format as
+    gulpDic) from the parameter tables, with the two-body parameters of
+    each pair taken from its own sw2 entry
+
+    - Each sw3 entry i-j-k gives the key "ijk" with the sw2 entry of i-j
+    - Pairs without a three-body entry give the keys "ijj" and "jii" with
+      K = 0, and three-body entries without a pair get A = B = 0
+    '''
+    pair = {}
+    for row in sw2:
+        par = [float(row['A']), float(row['rho']), float(row['B']), float(row['rmax'])]
+        pair[(row['el1'], row['el2'])] = par
+        pair[(row['el2'], row['el1'])] = par
+
+    outdic = {}
+    for (at1, at2), par in pair.items():
+        A, rho, B, rmax = par
+        outdic[''.join([at1, at2, at2])] = par + [0.0, 0.0, rho, rho, rmax, rmax]
+
+    for row in sw3:
+        gulp3 = [float(row[key]) for key in ('K', 'theta0', 'rho12', 'rho13', 'rmax12', 'rmax13')]
+        par = pair.get((row['el1'], row['el2']), [0.0, gulp3[2], 0.0, gulp3[4]])
+        outdic[''.join([row['el1'], row['el2'], row['el3']])] = par + gulp3
+
+    return outdic
+
+
 def readGulpInput(fname):
     '''
     Function to read GULP parameters from the input file
+
+    Only the first entry of each kind is returned (see readGulpTable for
+    all of them):
+        atomName, [gulp2, gulp3_mxx, gulp3_xmm(, gulp3_mx1x2)]
     '''
-    # Initialize the lists
+    sw2, sw3 = readGulpTable(fname)
     atomName = []
-    gulp2 = []
+    for row in sw2: # First appearance, row by row
+        for at in (row['el1'], row['el2']):
+            if at not in atomName:
+                atomName.append(str(at))
+    if len(sw2) == 0 or len(atomName) not in (2, 3):
+        raise ValueError('Unexpected number of atoms in %s - check GULP input file'%fname)
+
+    gulp2 = [float(sw2[0][key]) for key in ('A', 'rho', 'B', 'rmax')]
     gulp3_mxx = []; gulp3_xmm = []; gulp3_mx1x2 = []
-    twobody, threebody = False, False
-    
-    with open(fname) as f:
-        for line in f:
-            splt = line.split()
-            
-            if twobody and line != '\n':
-                # Read atom types
-                at1, at2 = splt[:2]
-                if at1 not in atomName:
-                    atomName.append(at1)
-                if at2 not in atomName:
-                    atomName.append(at2)
-                    
-                # Read 2body parameters
-                if len(gulp2) == 0:
-                    gulp2 = splt[2:5]+[splt[6]]
-                    gulp2 = [float(i) for i in gulp2]
-
-                    
-            elif threebody and line != '\n':
-                gulp3 = splt[3:7]+[splt[8],splt[10]]
-                gulp3 = [float(i) for i in gulp3]
-                at3 = splt[:3]
-                if at3[0] in CHALCOGEN or at3[0][:-1] in CHALCOGEN:
-                    if len(gulp3_xmm) == 0:
-                        gulp3_xmm = gulp3[:]
-                elif at3[0] in METAL:
-                    if at3[1] == at3[2]:
-                        if len(gulp3_mxx) == 0:
-                            gulp3_mxx = gulp3[:]
-                    else:
-                        if len(gulp3_mx1x2) == 0:
-                            gulp3_mx1x2 = gulp3[:]
-                            
-                else:
-                    print('Error in readGulpInput: Cannot identify whether atom is metal or chalcogen')
-                
-            
-            # Control the switches for reading the 2body and 3body parameters
-            if line != '\n' and splt[0] == 'sw2': 
-                twobody=True
-            elif line != '\n' and splt[0] == 'sw3':
-                threebody=True
-            elif line == '\n' and (threebody or twobody):
-                twobody, threebody = False, False
+    for row in sw3:
+        gulp3 = [float(row[key]) for key in ('K', 'theta0', 'rho12', 'rho13', 'rmax12', 'rmax13')]
+        if not _isMetal(row['el1']):
+            gulp3_xmm = gulp3_xmm or gulp3
+        elif row['el2'] == row['el3']:
+            gulp3_mxx = gulp3_mxx or gulp3
+        else:
+            gulp3_mx1x2 = gulp3_mx1x2 or gulp3
 
     # Return the parameters
     if len(atomName) == 3:
         return atomName, [gulp2, gulp3_mxx, gulp3_xmm, gulp3_mx1x2]
-    
-    elif len(atomName) == 2:
-        return atomName, [gulp2, gulp3_mxx, gulp3_xmm]
-    
-    else:
-        print("Error in readGulpInput: Unexpected number of atoms - check GULP input file")
-        sys.exit()
+    return atomName, [gulp2, gulp3_mxx, gulp3_xmm]
         
        
 def gulpDic(atnam, gulp2, gulp3mxx, gulp3xmm, gulp3mx1x2=[], gulp2mm=[], gulp2xx=[], partype = 'Jiang'):
@@ -185,34 +321,162 @@ def gulp2lammps(parGulp):
     return [epsilon, sigma, a, lmbda, gamma, costheta0, A_L, B_L, p, q, tol]
 
 
-def genLAMMPSfile(fname, atomName, dicGulp, partype='Jiang2017'):
+def gulpTerms(r12, r13, costh, gulpPar):
+    '''
+    Function to evaluate the GULP form of the potential, broadcasting the
+    distances r12, r13 (Angstrom) and cos(theta) against the parameters
+
+    INPUT:
+        gulpPar: Parameter arrays (A, rho, B, rmax, K, theta0, rho12, rho13,
+                 rmax12, rmax13), each broadcastable with the grids
+
+    OUTPUT:
+        V2(r12) and the factors of V3 = e12(r12)*e13(r13)*ang(theta) in eV
+        (zero beyond the cutoffs)
+    '''
+    A, rho, B, rmax, K, theta0, rho12, rho13, rmax12, rmax13 = gulpPar
+    with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        v2 = np.where(r12 < rmax, A*(B/r12**4 - 1)*np.exp(rho/(r12 - rmax)), 0.)
+        e12 = np.where(r12 < rmax12, np.exp(rho12/(r12 - rmax12)), 0.)
+        e13 = np.where(r13 < rmax13, np.exp(rho13/(r13 - rmax13)), 0.)
+    ang = K*(costh - np.cos(theta0*np.pi/180.))**2
+    return v2, e12, e13, ang
+
+
+def lammpsTerms(r12, r13, costh, par12, par13, par123):
+    '''
+    Function to evaluate the LAMMPS form of the potential as the sw pair
+    style does: the two-body term and the radial factor of each leg from the
+    i-j-j (par12) and i-k-k (par13) entries, lambda and costheta0 from the
+    i-j-k entry (par123). Each par is a sequence of the 11 parameter arrays.
+
+    OUTPUT:
+        V2(r12) and the factors of V3 = e12(r12)*e13(r13)*ang(theta) in eV
+        (zero beyond the cutoffs)
+    '''
+    eps, sigma, a, lmbda, gamma, costheta0, A_L, B_L, p, q, tol = par12
+    cut12 = a*sigma; gs12 = gamma*sigma
+    cut13 = par13[2]*par13[1]; gs13 = par13[4]*par13[1]
+    with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        v2 = np.where(r12 < cut12, eps*A_L*(B_L*(sigma/r12)**p - (sigma/r12)**q)
+                      *np.exp(sigma/(r12 - cut12)), 0.)
+        e12 = np.where(r12 < cut12, np.exp(gs12/(r12 - cut12)), 0.)
+        e13 = np.where(r13 < cut13, np.exp(gs13/(r13 - cut13)), 0.)
+    ang = par123[0]*par123[3]*(costh - par123[5])**2
+    return v2, e12, e13, ang
+
+
+def swDense(atomName, lammpsPar, defined):
+    '''
+    Function to reshape the flat (n^3, 11) parameters of genLAMMPSfile into
+    an (n, n, n, 11) array with the zero terms where not defined
+    '''
+    n = len(atomName)
+    return np.where(defined[:,None], lammpsPar, ZEROPAR).reshape(n, n, n, -1)
+
+
+def verifyGulpLammps(atomName, dicGulp, lammps=None, nr=80, nt=91, theta=(0., 180.), block=2000000):
+    '''
+    Function to check that the LAMMPS parameters reproduce the GULP
+    two-body and three-body terms of every entry of dicGulp, on grids of
+    r (nr points from 0.5 to 1.05 times the larger cutoff) and theta
+    (nt points in the theta range, degrees)
+
+    INPUT:
+        atomName: Element names
+        dicGulp: Dictionary of GULP parameters
+        lammps: LAMMPS parameters (n, n, n, 11) in the order of atomName
+                (e.g. from swParameters), converted from dicGulp if None
+        block: Maximum number of grid points evaluated at once
+
+    OUTPUT:
+        report: Structured array (el1, el2, el3, term, max_abs, max_rel)
+                with one V2 row per i-j-j entry and one V3 row per entry,
+                max_rel being relative to the largest GULP value on the grid
+    '''
+    names = list(dict.fromkeys(atomName))
+    n = len(names)
+    ind, gulpPar = _dicIndices(names, dicGulp)
+    if lammps is None:
+        lammpsPar = np.zeros((n**3, len(ZEROPAR)))
+        defined = np.zeros(n**3, dtype=bool)
+        if len(ind):
+            lammpsPar[ind] = np.stack(np.broadcast_arrays(*gulp2lammps(gulpPar.T)), axis=-1)
+            defined[ind] = True
+        lammps = swDense(names, lammpsPar, defined)
+    i, j, k = np.unravel_index(ind, (n, n, n))
+    G = gulpPar.T[:,:,None] # (10, m, 1)
+    L123 = lammps[i,j,k].T[:,:,None]; L12 = lammps[i,j,j].T[:,:,None]; L13 = lammps[i,k,k].T[:,:,None]
+
+    # Radial grids covering both cutoffs of each entry
+    rc = np.max([G[3], G[8], G[9], L12[1]*L12[2], L13[1]*L13[2]], axis=0) # (m, 1)
+    u = np.linspace(0.5, 1.05, nr)
+    r = rc*u # (m, nr)
+    costh = np.cos(np.radians(np.linspace(theta[0], theta[1], nt)))[None,:] # (1, nt)
+
+    # Two-body terms and factors of the three-body terms on the 1D grids
+    pair = j == k
+    v2g, e12g, e13g, angg = gulpTerms(r, r, costh, G)
+    v2l, e12l, e13l, angl = lammpsTerms(r, r, costh, L12, L13, L123)
+    err2 = np.abs(v2g - v2l).max(axis=1)
+    ref2 = np.abs(v2g).max(axis=1)
+
+    # Three-body terms on the (r12, r13, theta) grids, in blocks of the
+    # entries whose factors differ (the factors are non-negative apart from
+    # the sign of ang, so the largest |V3| is the product of the maxima)
+    ref3 = e12g.max(axis=1)*e13g.max(axis=1)*np.abs(angg).max(axis=1)
+    err3 = np.zeros(len(ind))
+    differ = np.flatnonzero(np.any(e12g != e12l, axis=1) | np.any(e13g != e13l, axis=1)
+                            | np.any(angg != angl, axis=1))
+    nb = max(1, block//(nr*nr*nt))
+    for b in range(0, len(differ), nb):
+        sl = differ[b:b + nb]
+        v3g = e12g[sl,:,None,None]*e13g[sl,None,:,None]*angg[sl,None,None,:]
+        v3l = e12l[sl,:,None,None]*e13l[sl,None,:,None]*angl[sl,None,None,:]
+        err3[sl] = np.abs(v3g - v3l).reshape(len(sl), -1).max(axis=1)
+
+    report = np.zeros(pair.sum() + len(ind), dtype=REPORT_DTYPE)
+    labels = np.array(names)
+    for rows, sel, term, err, ref in [(slice(0, pair.sum()), pair, 'V2', err2, ref2),
+                                      (slice(pair.sum(), None), np.ones(len(ind), dtype=bool), 'V3', err3, ref3)]:
+        report['el1'][rows] = labels[i[sel]]
+        report['el2'][rows] = labels[j[sel]]
+        report['el3'][rows] = labels[k[sel]]
+        report['term'][rows] = term
+        report['max_abs'][rows] = err[sel]
+        report['max_rel'][rows] = err[sel]/np.where(ref[sel] > 0, ref[sel], 1.)
+    return report
+
+
+def genLAMMPSfile(fname, atomName, dicGulp, partype='Jiang2017', verify=True, tol=1e-6):
     '''
     Currently for Jiang type parameterization only
+
+    With verify, the LAMMPS terms are checked against the GULP ones (see
+    verifyGulpLammps) and the entries with relative errors above tol are
+    reported
     '''
     # List of possible metal and chalcogen atoms
 
     
     # Check if input atoms belong to known m and x
     Mlist = []; Xlist = []
-    for atom in atomName:
-        # Check for name and possible appended name, i.e. "Mo" & "Mo1" both are metals
-        if atom in METAL or atom[:-1] in METAL:
-            Mlist.append(atom)
-            
-        elif atom in CHALCOGEN or atom[:-1] in CHALCOGEN:
-            Xlist.append(atom)
-            
-        else:
+    for atom in dict.fromkeys(atomName):
+        # Ask only for the atoms that _isMetal cannot identify
+        try:
+            metal = _isMetal(atom)
+        except ValueError:
             print("genLAMMPSfile: Unknown element in atomName")
-            print("Define whether %s is metal or chalcogen (M/X)?")
+            print("Define whether %s is metal or chalcogen (M/X)?"%atom)
             x = input()
-            if x == 'M' or x == 'm':
-                Mlist.append(atom)
-            elif x == 'X' or x == 'x':
-                Xlist.append(atom)
-            else:
+            if x not in ('M', 'm', 'X', 'x'):
                 print("Wrong input!!")
                 sys.exit()
+            metal = x in ('M', 'm')
+        if metal:
+            Mlist.append(atom)
+        else:
+            Xlist.append(atom)
     
     
     # Header for the file
@@ -240,75 +504,212 @@ def genLAMMPSfile(fname, atomName, dicGulp, partype='Jiang2017'):
         [header.insert(-8,line) for line in x1x2_explain]
         
     ############ SW parameters #############
-    
-    # Zero list - for interactions that is not described in dicGulp
-    zerolist = ["# zero terms"]
-    zeroPar = [0] + [1]*7 + [4,0,0.0]
-    
-    # Initiate all the other parameter groups
-    mxx = ["# M-X-X terms"]; 
-    xmm = ["# X-M-M terms"]; 
-    mx1x2 = ["# M-X1-X2 terms"]
-    
-    # Iterate over all possible combinations
-    comblist = []
-    for comb in itertools.combinations(atomName*3, 3):
-        comblist.append(comb)
-    comblist = set(comblist)
-    
-    for comb in comblist:
-        combstr = ''.join(comb)
-        # Check if interaction is defined
-        if combstr not in dicGulp:
-            zerolist.append(PFORMAT.format(*comb,*zeroPar))
-    
-        # If it is defined, assign to lists
-        else:
-            # Convert GULP parameters to LAMMPS format
-            lammpsPar = gulp2lammps(dicGulp[combstr])
-            line = PFORMAT.format(*comb,*lammpsPar)
-            # Check comb type
-            if comb[0] in Xlist:
-                xmm.append(line)
-            else:
-                if comb[1] == comb[2]:
-                    mxx.append(line)
-                else:
-                    mx1x2.append(line)
-                
+
+    # Species ordered as their formatted names, so that the triplets of the
+    # product below come out in the order of the sorted lines
+    names = sorted(set(atomName), key='{:<3}'.format)
+    n = len(names)
+    trip = np.indices((n, n, n)).reshape(3, -1).T # i-j-k, last index fastest
+
+    # LAMMPS parameters of the triplets defined in dicGulp, as an array
+    lammpsPar = np.zeros((n**3, len(ZEROPAR)))
+    defined = np.zeros(n**3, dtype=bool)
+    ind, gulpPar = _dicIndices(names, dicGulp)
+    if len(ind):
+        lammpsPar[ind] = np.stack(np.broadcast_arrays(*gulp2lammps(gulpPar.T)), axis=-1)
+        defined[ind] = True
+
+    # Groups: X-M-M (X centre), M-X-X, M-X1-X2 and zero terms
+    isX = np.array([atom in Xlist for atom in names], dtype=bool)
+    xmm = defined & isX[trip[:,0]]
+    mxx = defined & ~isX[trip[:,0]] & (trip[:,1] == trip[:,2])
+    mx1x2 = defined & ~isX[trip[:,0]] & (trip[:,1] != trip[:,2])
+
+    lines = header
+    for title, mask in [("# M-X-X terms", mxx), ("# X-M-M terms", xmm), ("# M-X1-X2 terms", mx1x2)]:
+        lines = lines + [title] + _formatLines(names, trip[mask], lammpsPar[mask])
+    lines = lines + ["# zero terms"] + _formatLines(names, trip[~defined], np.array(ZEROPAR))
+
     with open(fname, 'w+') as f:
-        # Write the header of the potential file
-        for line in header + sorted(mxx) + sorted(xmm) + sorted(mx1x2) + sorted(zerolist):
-            f.write(line)
-            f.write('\n')
+        # Write the whole potential file at once
+        f.write('\n'.join(lines) + '\n')
+
+    if verify:
+        report = verifyGulpLammps(names, dicGulp, lammps=swDense(names, lammpsPar, defined))
+        for row in report[report['max_rel'] > tol]:
+            print('Warning in genLAMMPSfile: %s %s-%s-%s differs from GULP (max abs %.3e, rel %.3e)'
+                  %(row['term'], row['el1'], row['el2'], row['el3'], row['max_abs'], row['max_rel']))
     
     return 1
 
 
-def genMultiple(inpfList,outfname,partype='Jiang2017'):
+def _dicIndices(names, dicGulp):
     '''
-    Function to automatically generate  the potential file given the location
-    of GULP input files
+    Function to find the flat triplet indices (i*n*n + j*n + k) of the keys of
+    dicGulp, splitting the joined keys with the species names
+
+    OUTPUT:
+        ind: Flat indices of the keys made of three of the names
+        gulpPar: Their GULP parameters (len(ind), 10)
     '''
-    dicGulp={}
-    atomName = []
-    # Iterate over GULP input files
-    for fgulp in inpfList:
-        #atName, [gulp2, gulp3_mxx, gulp3_xmm, gulp3_mx1x2] = readGulpInput(fgulp)
-        atName, gulpPar = readGulpInput(fgulp)
-        atomName += atName
-        
-        if len(atName) == 2:
-            gulp2, gulp3_mxx, gulp3_xmm = gulpPar
-            dicGulp.update(gulpDic(atName, gulp2, gulp3_mxx, gulp3_xmm))
-        elif len(atName) == 3:
-            gulp2, gulp3_mxx, gulp3_xmm, gulp3_mx1x2 = gulpPar
-            dicGulp.update(gulpDic(atName, gulp2, gulp3_mxx, gulp3_xmm, gulp3_mx1x2))
-    
+    n = len(names)
+    pos = {atom: k for k, atom in enumerate(names)}
+    alt = '|'.join(re.escape(atom) for atom in sorted(names, key=len, reverse=True))
+    keyre = re.compile('(%s)(%s)(%s)'%(alt, alt, alt))
+    ind = []; gulpPar = []
+    for key, par in dicGulp.items():
+        m = keyre.fullmatch(key)
+        if m is None:
+            continue
+        i, j, k = [pos[atom] for atom in m.groups()]
+        ind.append((i*n + j)*n + k)
+        gulpPar.append(par)
+    return np.array(ind, dtype=int), np.array(gulpPar, dtype=float).reshape(-1, 10)
+
+
+def _formatLines(names, trip, lammpsPar):
+    '''
+    Function to format the parameter lines of the triplets (m, 3) as PFORMAT.
+    lammpsPar is either one row per triplet (m, 11) or a single row (11,)
+    shared by all of them (zero terms), which is then formatted only once.
+    '''
+    nameFmt = PFORMAT.split(' ', 3)[0]
+    parFmt = PFORMAT.split(' ', 3)[3]
+    rows = np.atleast_2d(lammpsPar).tolist()
+    pars = [parFmt.format(*row[:8], int(row[8]), int(row[9]), row[10]) for row in rows]
+    if len(pars) == 1:
+        pars = pars*len(trip)
+    padded = [nameFmt.format(atom) + ' ' for atom in names]
+    return [padded[i] + padded[j] + padded[k] + par for (i, j, k), par in zip(trip.tolist(), pars)]
+
+
+def genMultiple(inpfList, outfname, partype='Jiang2017', workers=None):
+    '''
+    Function to automatically generate the potential file given the location
+    of GULP input files, which are read concurrently and merged with every
+    sw2/sw3 entry (see readGulpLibrary)
+    '''
+    atomName, sw2, sw3 = readGulpLibrary(inpfList, workers=workers)
+    dicGulp = gulpTableDic(sw2, sw3)
+
     genLAMMPSfile(outfname, atomName, dicGulp, partype=partype)
-    
+
     return 1
-        
+
+
+def readLAMMPSfile(fname):
+    '''
+    Function to read a LAMMPS potential file (.sw) back into a dictionary
+    (parsed by readSWTable)
+
+    OUTPUT:
+        atomName: Element names in the order they first appear in the file
+        dicLammps: Dictionary of LAMMPS parameter lists keyed by the joined
+                   element triplet (same keys as dicGulp), i.e.
+                   (epsilon, sigma, a, lambda, gamma, costheta0, A, B, p, q, tol)
+    '''
+    atomName, table, index = readSWTable(fname)
+    par = np.stack([table[field] for field in SW_FIELDS], axis=-1).tolist()
+    dicLammps = {}
+    for i, j, k, row in zip(table['i'], table['j'], table['k'], par):
+        dicLammps[''.join([atomName[i], atomName[j], atomName[k]])] = row
+
+    return atomName, dicLammps
+
+
+def readSWTable(fname):
+    '''
+    Function to read a LAMMPS potential file (.sw) into a parameter table
+
+    OUTPUT:
+        atomName: Element names in the order they first appear in the file
+        table: Structured array (SW_DTYPE) with the element indices i, j, k
+               of each entry and its 11 LAMMPS parameters (SW_FIELDS)
+        index: Row of every i-j-k triplet in table, -1 if not given (n, n, n)
+    '''
+    with open(fname) as f:
+        text = f.read()
+    # Entries may span several lines: the tokens are taken 14 at a time
+    tokens = re.sub(r'#.*', '', text).split()
+    if len(tokens) % 14:
+        print('Error in readSWTable: Incomplete entry at the end of %s'%fname)
+        sys.exit()
+    tokens = np.array(tokens, dtype=object).reshape(-1, 14)
+
+    # Element indices in the order the elements first appear
+    labels = tokens[:,:3].ravel().tolist()
+    pos = {}
+    for at in labels:
+        pos.setdefault(at, len(pos))
+    elem = np.array([pos[at] for at in labels], dtype=int).reshape(-1, 3)
+
+    table = np.zeros(len(tokens), dtype=SW_DTYPE)
+    table['i'], table['j'], table['k'] = elem.T
+    par = np.fromstring(' '.join(tokens[:,3:].ravel()), sep=' ').reshape(-1, 11)
+    for k, field in enumerate(SW_FIELDS):
+        table[field] = par[:,k]
+
+    return list(pos), table, swIndex(len(pos), table)
+
+
+def swIndex(n, table):
+    '''
+    Function to build the (n, n, n) array of the rows of table for every
+    element triplet (-1 for triplets without an entry, the last entry of a
+    repeated triplet is used as in LAMMPS)
+    '''
+    index = -np.ones((n, n, n), dtype=int)
+    index[table['i'], table['j'], table['k']] = np.arange(len(table))
+    return index
+
+
+def swParameters(table, index):
+    '''
+    Function to expand the parameter table to an array of shape (n, n, n, 11)
+    (SW_FIELDS order), with the zero terms for triplets without an entry
+    '''
+    par = np.stack([table[field] for field in SW_FIELDS], axis=-1)
+    par = np.vstack([par, ZEROPAR]) # Row -1: zero terms
+    return par[index]
+
+
+def saveSWTable(fname, atomName, table):
+    '''
+    Function to save a parameter table in binary form (.npz)
+    '''
+    np.savez(fname, atomName=np.array(atomName), table=table)
+
+
+def loadSWTable(fname):
+    '''
+    Function to load a parameter table from a binary (.npz, see saveSWTable)
+    or a LAMMPS (.sw) file
+
+    OUTPUT:
+        atomName, table, index as in readSWTable
+    '''
+    if not fname.endswith('.npz'):
+        return readSWTable(fname)
+    with np.load(fname) as data:
+        atomName = [str(at) for at in data['atomName']]
+        table = data['table']
+    return atomName, table, swIndex(len(atomName), table)
+
+
+def writeSWTable(fname, atomName, table, header=()):
+    '''
+    Function to write a parameter table as a LAMMPS potential file, one
+    PFORMAT line per entry in the order of the table
+    '''
+    trip = np.stack([table['i'], table['j'], table['k']], axis=-1)
+    par = np.stack([table[field] for field in SW_FIELDS], axis=-1)
+    lines = list(header) + _formatLines(atomName, trip, par)
+    with open(fname, 'w+') as f:
+        f.write('\n'.join(lines) + '\n')
+
+    return 1
+
+
 if __name__ == "__main__":
     
     #case = 'MoS2-Jiang'
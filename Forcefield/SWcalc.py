@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script to evaluate the Stillinger-Weber energy and the analytic forces of a
+whole structure at once, using the parameter tables generated by SW.py
+
+The LAMMPS form of the potential is used (see SW.py for the equations):
+
+    E = sum_i sum_{j>i} V2(rij) + sum_i sum_{j<k} V3(rij, rik, theta_jik)
+
+As in the 'sw' pair style of LAMMPS, the two-body term and the radial
+factors of the three-body term use the i-j-j entry, while lambda and
+costheta0 are taken from the i-j-k entry of the parameter table.
+
+- M-X1-X2 terms are only defined for one ordering of the chalcogens in the
+dictionaries (e.g. Nb-Se1-Se2 but not Nb-Se2-Se1), so the missing ordering is
+filled in and every j<k pair around i is counted exactly once.
+
+All the terms are evaluated on flat arrays of neighbor pairs and triplets
+(see neighbor.py), without any Python loop over atoms or triplets.
+"""
+
+import numpy as np
+import itertools
+import sys
+import time
+
+from SW import ZEROPAR, gulp2lammps, loadSWTable, swParameters
+from neighbor import buildNeighborList, neighborVectors
+
+###############################################################################
+# Global variables
+# Column indices of the LAMMPS parameter list (same order as gulp2lammps)
+EPS, SIG, LA, LAM, GAM, COS0, AL, BL, P, Q, TOL = range(11)
+###############################################################################
+
+def swTable(atomName, dicGulp=None, dicLammps=None):
+    '''
+    Function to collect the LAMMPS parameters of every element triplet into
+    a single array, with the elements ordered as in atomName
+    (swParameters gives the same array from a table of loadSWTable)
+
+    INPUT:
+        atomName: List of element names
+        dicGulp: Dictionary of GULP parameters (from gulpDic), or
+        dicLammps: Dictionary of LAMMPS parameters (from readLAMMPSfile)
+
+    OUTPUT:
+        table: Array of shape (n, n, n, 11), triplets not found in the
+               dictionary are set to the zero terms
+    '''
+    if (dicGulp is None) == (dicLammps is None):
+        print('Error in swTable: Give either dicGulp or dicLammps')
+        sys.exit()
+
+    n = len(atomName)
+    table = np.tile(np.array(ZEROPAR, dtype=float), (n, n, n, 1))
+    for (i,a), (j,b), (k,c) in itertools.product(enumerate(atomName), repeat=3):
+        key = ''.join([a,b,c])
+        if dicGulp is not None and key in dicGulp:
+            table[i,j,k] = gulp2lammps(dicGulp[key])
+        elif dicLammps is not None and key in dicLammps:
+            table[i,j,k] = dicLammps[key]
+
+    return table
+
+
+def swCoefficients(table):
+    '''
+    Function to extract the pair (n, n) and triplet (n, n, n) coefficient
+    arrays used in swEnergyForces from the parameter table
+    '''
+    n = table.shape[0]
+    ind = np.arange(n)
+    pair = table[ind[:,None], ind[None,:], ind[None,:]] # i-j-j entries
+
+    coef = {}
+    coef['eps'] = pair[...,EPS]
+    coef['sigma'] = pair[...,SIG]
+    coef['cut'] = pair[...,SIG]*pair[...,LA]
+    coef['A'] = pair[...,AL]
+    coef['B'] = pair[...,BL]
+    coef['p'] = pair[...,P]
+    coef['q'] = pair[...,Q]
+    coef['sg'] = pair[...,SIG]*pair[...,GAM]
+
+    # Three-body terms, filling in the missing j-k ordering
+    lam = table[...,EPS]*table[...,LAM]
+    cos0 = table[...,COS0]
+    lamT = lam.transpose(0,2,1)
+    miss = (lam == 0) & (lamT != 0)
+    coef['lam'] = np.where(miss, lamT, lam)
+    coef['cos0'] = np.where(miss, cos0.transpose(0,2,1), cos0)
+
+    # Pairs of the zero terms (no two-body term and not a leg of any
+    # three-body term) never contribute: zero cutoff, out of the neighbor lists
+    active = (coef['eps'] != 0) | np.any(coef['lam'] != 0, axis=2)
+    coef['cut'] = np.where(active, coef['cut'], 0.)
+
+    return coef
+
+
+def _neighborTriplets(i, nat):
+    '''
+    Function to enumerate all (a, b) index pairs of the neighbor list sharing
+    the same central atom, with a < b (i must be sorted)
+    '''
+    counts = np.bincount(i, minlength=nat)
+    start = np.cumsum(counts) - counts
+    local = np.arange(len(i)) - start[i]
+    npart = counts[i] - local - 1 # Remaining neighbors after entry a
+    a = np.repeat(np.arange(len(i)), npart)
+    offset = np.arange(len(a)) - np.repeat(np.cumsum(npart) - npart, npart)
+    b = a + 1 + offset
+
+    return a, b
+
+
+def _scatter(forces, ind, vec, sign):
+    '''
+    Function to add the force contributions vec onto the atoms ind
+    '''
+    nat = len(forces)
+    for d in range(3):
+        forces[:,d] += sign*np.bincount(ind, weights=vec[:,d], minlength=nat)
+
+
+def swNeighborList(pos, types, cell, coef, pbc=(True,True,True), skin=0.0):
+    '''
+    Function to build a neighbor list with the i-j-j cutoffs of the SW
+    parameters, which can be reused in swEnergyForces
+    '''
+    return buildNeighborList(pos, cell, coef['cut'], types=types, pbc=pbc, skin=skin)
+
+
+def _swTerms(pos, types, cell, coef, pbc=(True,True,True), nlist=None):
+    '''
+    Function to select the pairs within the cutoffs and the triplets with
+    non-zero three-body terms (shared by swEnergyForces and SWphonon.py)
+
+    OUTPUT:
+        pairs: Dictionary with the pair arrays i, j, dvec, r, ti, tj, cut
+        trip: Dictionary with the pair indices a < b of the two legs of every
+              triplet (sharing the central atom), lam and cos0
+    '''
+    types = np.asarray(types)
+    if nlist is None:
+        nlist = swNeighborList(pos, types, cell, coef, pbc=pbc)
+    i, j, dvec = neighborVectors(nlist, pos, cell)
+    ti, tj = types[i], types[j]
+    r = np.linalg.norm(dvec, axis=1)
+    cut = coef['cut'][ti,tj]
+    keep = r < cut
+    pairs = {'i': i[keep], 'j': j[keep], 'dvec': dvec[keep], 'r': r[keep],
+             'ti': ti[keep], 'tj': tj[keep], 'cut': cut[keep]}
+
+    ti, tj = pairs['ti'], pairs['tj']
+    a, b = _neighborTriplets(pairs['i'], len(pos))
+    lam = coef['lam'][ti[a], tj[a], tj[b]]
+    nonzero = lam != 0
+    a, b, lam = a[nonzero], b[nonzero], lam[nonzero]
+    trip = {'a': a, 'b': b, 'lam': lam, 'cos0': coef['cos0'][ti[a], tj[a], tj[b]]}
+
+    return pairs, trip
+
+
+def swEnergyForces(pos, types, cell, coef, pbc=(True,True,True), nlist=None):
+    '''
+    Function to calculate the total SW energy and the forces on all atoms
+
+    INPUT:
+        pos: Cartesian positions in Angstrom, shape (N, 3)
+        types: Index of the element of every atom in atomName, shape (N,)
+        cell: Lattice vectors (as rows) in Angstrom, shape (3, 3)
+        coef: Coefficients from swCoefficients
+        pbc: Periodicity along each lattice vector
+        nlist: Neighbor list from swNeighborList (kept up to date by the
+               caller with updateNeighborList), built here if not given
+
+    OUTPUT:
+        energy: Total energy in eV
+        forces: Forces in eV/Angstrom, shape (N, 3)
+    '''
+    nat = len(pos)
+    forces = np.zeros((nat,3))
+
+    pairs, trip = _swTerms(pos, types, cell, coef, pbc=pbc, nlist=nlist)
+    i, j, dvec, r = pairs['i'], pairs['j'], pairs['dvec'], pairs['r']
+    ti, tj, cut = pairs['ti'], pairs['tj'], pairs['cut']
+
+    ############ Two-body #############
+    # Every pair appears twice in the full neighbor list
+    eps = coef['eps'][ti,tj]; sigma = coef['sigma'][ti,tj]
+    p = coef['p'][ti,tj]; q = coef['q'][ti,tj]
+    rainv = 1./(r - cut)
+    expsr = np.exp(sigma*rainv)
+    srp = (sigma/r)**p; srq = (sigma/r)**q
+    v2 = eps*coef['A'][ti,tj]*(coef['B'][ti,tj]*srp - srq)
+    dv2 = eps*coef['A'][ti,tj]*(-p*coef['B'][ti,tj]*srp + q*srq)/r
+    dv2 = (dv2 - v2*sigma*rainv**2)*expsr
+    v2 = v2*expsr
+
+    energy = 0.5*np.sum(v2)
+    grad = (0.5*dv2/r)[:,None]*dvec # Gradient with respect to x_j
+    _scatter(forces, j, grad, -1.)
+    _scatter(forces, i, grad, 1.)
+
+    ############ Three-body #############
+    sg = coef['sg'][ti,tj]
+    erad = np.exp(sg*rainv) # Radial factor of each leg
+    derad = -erad*sg*rainv**2
+
+    a, b, lam, cos0 = trip['a'], trip['b'], trip['lam'], trip['cos0']
+    d1, d2 = dvec[a], dvec[b]
+    r1, r2 = r[a], r[b]
+    e1, e2 = erad[a], erad[b]
+    cs = np.einsum('ij,ij->i', d1, d2)/(r1*r2)
+    dcs = cs - cos0
+    energy += np.sum(lam*e1*e2*dcs**2)
+
+    facang = 2.*lam*e1*e2*dcs
+    g1 = ((lam*dcs**2*derad[a]*e2 - facang*cs/r1)/r1)[:,None]*d1 \
+         + (facang/(r1*r2))[:,None]*d2
+    g2 = ((lam*dcs**2*derad[b]*e1 - facang*cs/r2)/r2)[:,None]*d2 \
+         + (facang/(r1*r2))[:,None]*d1
+    _scatter(forces, j[a], g1, -1.)
+    _scatter(forces, j[b], g2, -1.)
+    _scatter(forces, i[a], g1 + g2, 1.)
+
+    return energy, forces
+
+
+if __name__ == "__main__":
+
+    # Energy and forces of a randomly displaced MoS2 supercell
+    atomName, table, index = loadSWTable('MoS2.sw')
+    coef = swCoefficients(swParameters(table, index))
+
+    a0 = 3.16; z0 = 1.56; nrep = 100
+    cell_uc = np.array([[a0, 0., 0.], [-a0/2., a0*np.sqrt(3)/2., 0.], [0., 0., 20.]])
+    frac_uc = np.array([[1/3., 2/3., 0.5], [2/3., 1/3., 0.5], [2/3., 1/3., 0.5]])
+    pos_uc = frac_uc @ cell_uc + np.array([[0., 0., 0.], [0., 0., z0], [0., 0., -z0]])
+    types_uc = np.array([0, 1, 1])
+
+    grid = np.array(list(itertools.product(range(nrep), range(nrep), [0])))
+    pos = (grid @ cell_uc)[:,None,:] + pos_uc[None,:,:]
+    pos = pos.reshape(-1,3) + 0.02*np.random.randn(len(grid)*3, 3)
+    types = np.tile(types_uc, len(grid))
+    cell = cell_uc*[[nrep],[nrep],[1]]
+
+    t0 = time.time()
+    energy, forces = swEnergyForces(pos, types, cell, coef)
+    print('Atoms = %i, E = %.6f eV, max|F| = %.4f eV/A (%.3f s)'
+          %(len(pos), energy, np.abs(forces).max(), time.time()-t0))
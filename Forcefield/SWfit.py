@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script to fit the Stillinger-Weber parameters of SW.py to Quantum ESPRESSO
+data, and to write the fitted potential with genLAMMPSfile
+(python SWfit.py START.gin [...] --dyn PREF.dyn1 [...] --traj relax.out [...])
+
+The fitted quantities are the GULP parameter vectors of gulpDic
+
+    [A, rho, B, rmax, K, theta0, rho12, rho13, rmax12, rmax13]
+
+(with rmin = 0), starting from GULP inputs of a similar material. The
+cells of one named parameter with the same starting value are tied together,
+as in the published sets (e.g. rho = rho12 = rho13 of one element triplet),
+and they are optimized in logarithmic scale so that they keep their sign.
+
+The residuals are
+- the phonon frequencies of .dyn files (at their q-points, sorted), in units
+  of fscale (cm-1), from the analytic force constants of SWphonon.py, and
+- the forces of the steps of pw.x relax/md outputs, in units of ffscale
+  (eV/Angstrom), which are zero for the relaxed geometries.
+
+They are minimized with a Levenberg-Marquardt iteration from several starting
+points (random log-normal perturbations of the start), which run in parallel
+on a process pool. The LAMMPS file of the best fit is written with partype
+'fit'.
+
+- Atoms of an element X are typed X1 (upper) and X2 (lower sub-layer) when the
+  potential has numbered sub-layer labels and no plain X
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from SW import genLAMMPSfile, gulpTableDic, readGulpLibrary
+from SWcalc import swCoefficients, swEnergyForces, swTable
+from SWphonon import dynStructure, dynamicalMatrices, forceConstants, phononFrequencies, speciesTypes
+from qetools import BOHR_A, readTrajectory
+
+###############################################################################
+# Global variables
+RY_EV = 13.605693122994 # Rydberg in eV
+# Columns of the GULP parameter vector of each named parameter
+PARCOLS = {'A': [0], 'rho': [1, 6, 7], 'B': [2], 'rmax': [3, 8, 9],
+           'K': [4], 'theta0': [5]}
+# Residual value of failed evaluations (non-finite energies or frequencies)
+BADRES = 1e3
+###############################################################################
+
+def dynTarget(fname, atomName, weight=1.0):
+    '''
+    Function to read the geometry and the phonon frequencies of a dynamical
+    matrix file (see dynStructure)
+    '''
+    target = dynStructure(fname, atomName)
+    target.update({'kind': 'dyn', 'name': fname, 'weight': weight})
+    return target
+
+
+def trajTarget(fname, atomName, steps=None, weight=1.0):
+    '''
+    Function to read the geometries and the forces (in eV/Angstrom) of
+    the steps of a pw.x output (default: the last one, relaxed)
+    '''
+    traj = readTrajectory(fname)
+    steps = [-1] if steps is None else steps
+
+    target = {'kind': 'traj', 'name': fname, 'weight': weight}
+    target['cell'] = traj['cell'][steps]
+    target['pos'] = traj['pos'][steps]
+    target['types'] = speciesTypes(traj['species'], traj['ityp'], traj['pos'][steps[0]], atomName)
+    target['forces'] = traj['forces'][steps]*RY_EV/BOHR_A
+    return target
+
+
+def fitSpec(dicGulp, free=('A', 'rho', 'B', 'K')):
+    '''
+    Function to group the cells (key, column) of the GULP dictionary into the
+    fitted variables: cells of the same named parameter with the same
+    (non-zero) starting value form one variable
+
+    OUTPUT:
+        spec: Dictionary with the 'groups' (lists of cells), their starting
+              values 'x0' and parameter 'names'
+    '''
+    spec = {'groups': [], 'x0': [], 'names': []}
+    for name in free:
+        if name not in PARCOLS:
+            print('Error in fitSpec: Unknown parameter %s (%s)'%(name, ' '.join(PARCOLS)))
+            sys.exit()
+        cells = [(key, col) for key in sorted(dicGulp) for col in PARCOLS[name]]
+        values = np.array([dicGulp[key][col] for key, col in cells])
+        for v in dict.fromkeys(values[values != 0]):
+            spec['groups'].append([c for c, vc in zip(cells, values) if vc == v])
+            spec['x0'].append(v)
+            spec['names'].append(name)
+    spec['x0'] = np.array(spec['x0'])
+    return spec
+
+
+def applySpec(dicGulp, spec, x):
+    '''
+    Function to return a copy of the GULP dictionary with the values x of
+    the fitted variables
+    '''
+    dic = {key: list(par) for key, par in dicGulp.items()}
+    for group, v in zip(spec['groups'], x):
+        for key, col in group:
+            dic[key][col] = float(v)
+    return dic
+
+
+class SWObjective:
+    '''
+    Residuals of the targets for the log-scaled variables y, x = x0 exp(y)
+    (picklable, so that it can be sent to the worker processes)
+    '''
+    def __init__(self, atomName, dicGulp, spec, targets, fscale=10.0, ffscale=0.1):
+        self.atomName = atomName
+        self.dicGulp = dicGulp
+        self.spec = spec
+        self.targets = targets
+        self.fscale = fscale
+        self.ffscale = ffscale
+
+    def params(self, y):
+        return applySpec(self.dicGulp, self.spec, self.spec['x0']*np.exp(y))
+
+    def residuals(self, y):
+        coef = swCoefficients(swTable(self.atomName, dicGulp=self.params(y)))
+        res = []
+        with np.errstate(all='ignore'):
+            for t in self.targets:
+                if t['kind'] == 'dyn':
+                    fc = forceConstants(t['pos'], t['types'], t['cell'], coef)
+                    freq = phononFrequencies(dynamicalMatrices(fc, t['mass'], t['q']))
+                    res.append(t['weight']*(freq - t['freq']).ravel()/self.fscale)
+                else:
+                    for pos, cell, forces in zip(t['pos'], t['cell'], t['forces']):
+                        f = swEnergyForces(pos, t['types'], cell, coef)[1]
+                        res.append(t['weight']*(f - forces).ravel()/self.ffscale)
+        res = np.concatenate(res)
+        return np.where(np.isfinite(res), res, BADRES)
+
+    __call__ = residuals
+
+
+def levenbergMarquardt(fun, y0, maxiter=50, tol=1e-8, h=1e-4):
+    '''
+    Function to minimize sum(fun(y)^2) with the Levenberg-Marquardt method
+    and a forward-difference Jacobian
+
+    OUTPUT:
+        y: Optimal variables
+        cost: sum(fun(y)^2)
+        niter: Number of iterations
+    '''
+    y = np.array(y0, dtype=float)
+    res = fun(y); cost = res @ res
+    mu = 1e-3
+    for niter in range(1, maxiter+1):
+        jac = np.stack([(fun(y + h*e) - res)/h for e in np.eye(len(y))], axis=1)
+        jtj = jac.T @ jac; grad = jac.T @ res
+        while True:
+            step = -np.linalg.solve(jtj + mu*np.diag(np.diag(jtj) + 1e-12), grad)
+            rnew = fun(y + step); cnew = rnew @ rnew
+            if cnew < cost or mu > 1e10:
+                break
+            mu *= 10
+        if cnew >= cost:
+            break
+        done = cost - cnew < tol*cost
+        y, res, cost = y + step, rnew, cnew
+        mu = max(mu/10, 1e-12)
+        if done:
+            break
+    return y, cost, niter
+
+
+def _fitStart(args):
+    '''Function to run one start of fitSW in a worker process'''
+    objective, y0, maxiter = args
+    return levenbergMarquardt(objective, y0, maxiter)
+
+
+def fitSW(objective, nstart=8, spread=0.3, maxiter=50, workers=None, seed=0):
+    '''
+    Function to fit from the start and nstart-1 random starts, with log
+    perturbations of standard deviation spread, in parallel
+
+    OUTPUT:
+        dic: Fitted GULP dictionary
+        cost: Sum of the squared residuals of the best fit
+        costs: Costs of all starts
+    '''
+    rng = np.random.default_rng(seed)
+    nvar = len(objective.spec['x0'])
+    starts = [np.zeros(nvar)] + [rng.normal(0, spread, nvar) for _ in range(nstart-1)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_fitStart, [(objective, y, maxiter) for y in starts]))
+    best = min(results, key=lambda r: r[1])
+    return objective.params(best[0]), best[1], np.array([r[1] for r in results])
+
+
+def _report(objective, y, label):
+    '''Function to print the rms errors of every target'''
+    res = objective(y)
+    k = 0
+    for t in objective.targets:
+        if t['kind'] == 'dyn':
+            n = t['freq'].size; unit = objective.fscale; name = 'cm-1'
+        else:
+            n = t['forces'].size; unit = objective.ffscale; name = 'eV/A'
+        rms = np.sqrt(np.mean(res[k:k+n]**2))*unit/t['weight']
+        print('  %-8s %-30s rms = %10.4f %s'%(label, t['name'], rms, name))
+        k += n
+
+
+if __name__ == "__main__":
+
+    argp = argparse.ArgumentParser(description='Fit SW parameters to QE phonons and forces')
+    argp.add_argument('gulp', nargs='+', help='GULP inputs with the starting parameters')
+    argp.add_argument('--dyn', nargs='+', default=[], help='Dynamical matrix files')
+    argp.add_argument('--traj', nargs='+', default=[], help='pw.x outputs (relax, vc-relax or md)')
+    argp.add_argument('--steps', type=int, nargs='+', help='Steps of the pw.x outputs (default: last)')
+    argp.add_argument('--free', nargs='+', default=['A', 'rho', 'B', 'K'],
+                      help='Fitted parameters (of %s)'%', '.join(PARCOLS))
+    argp.add_argument('--fscale', type=float, default=10.0, help='Frequency scale [cm-1]')
+    argp.add_argument('--ffscale', type=float, default=0.1, help='Force scale [eV/A]')
+    argp.add_argument('--starts', type=int, default=8, help='Number of starts')
+    argp.add_argument('--spread', type=float, default=0.3, help='Log spread of the random starts')
+    argp.add_argument('--maxiter', type=int, default=50, help='Iterations of each start')
+    argp.add_argument('--workers', type=int, help='Worker processes (default: all cores)')
+    argp.add_argument('-o', '--out', default='fit.sw', help='Output LAMMPS file')
+    args = argp.parse_args()
+
+    if not args.dyn and not args.traj:
+        print('Error: Give --dyn and/or --traj targets')
+        sys.exit()
+
+    atomName, sw2, sw3 = readGulpLibrary(args.gulp)
+    dicGulp = gulpTableDic(sw2, sw3)
+    targets = [dynTarget(f, atomName) for f in args.dyn] \
+              + [trajTarget(f, atomName, args.steps) for f in args.traj]
+    spec = fitSpec(dicGulp, args.free)
+    objective = SWObjective(atomName, dicGulp, spec, targets, args.fscale, args.ffscale)
+    print('%i variables, %i residuals, %i starts'%(len(spec['x0']), len(objective(np.zeros(len(spec['x0'])))), args.starts))
+
+    t0 = time.time()
+    dicFit, cost, costs = fitSW(objective, args.starts, args.spread, args.maxiter, args.workers)
+    print('Best cost %.6g of %s (%.1f s)'%(cost, ' '.join('%.4g'%c for c in costs), time.time()-t0))
+
+    yfit = np.log(np.array([dicFit[g[0][0]][g[0][1]] for g in spec['groups']])/spec['x0'])
+    _report(objective, np.zeros(len(yfit)), 'start')
+    _report(objective, yfit, 'fit')
+    for name, group, x0, y in zip(spec['names'], spec['groups'], spec['x0'], yfit):
+        print('  %-6s %-24s %12.6f -> %12.6f'%(name, ','.join(sorted({g[0] for g in group}))[:24], x0, x0*np.exp(y)))
+
+    genLAMMPSfile(args.out, atomName, dicFit, partype='fit')
+    print('Written %s'%args.out)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script to run short molecular dynamics with the Stillinger-Weber potential of
+SWcalc.py, to screen the potentials of SW.py before production runs
+(python SWmd.py POT.sw PREF.scf.in [-d N1 N2 N3] [-n STEPS] [-T TEMP] [--nvt])
+
+The structure is read from a pw.x input (and repeated dims times), in the
+units eV, Angstrom, amu and fs. The positions are advanced with velocity
+Verlet (NVE), or with a Langevin thermostat of time constant tau (NVT)
+applied exactly in the middle of the drift (the BAOAB splitting, which is
+velocity Verlet without the friction):
+
+    v += dt/2 F/m;  x += dt/2 v;  v = c v + sqrt((1-c^2) kT/m) R;
+    x += dt/2 v;  F = F(x);  v += dt/2 F/m   with c = exp(-dt/tau)
+
+- All the per-step arrays are allocated once and updated in place
+- The neighbor list is built with a Verlet skin and only rebuilt when an atom
+  has moved more than half of it (updateNeighborList)
+- Frames are streamed to a preallocated .npy file on disk (read back with
+  readMDTrajectory), with the atom types in OUT.head.npz
+- The speed is reported in ns/day
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from SW import loadSWTable, swParameters
+from SWcalc import swCoefficients, swEnergyForces, swNeighborList
+from SWphonon import buildSupercell, speciesTypes
+from neighbor import updateNeighborList
+from qetools import readPwInput
+
+###############################################################################
+# Global variables
+KB = 8.617333262e-5 # Boltzmann constant in eV/K
+# Time unit of eV, Angstrom and amu, sqrt(amu Angstrom^2/eV), in fs
+TIME_FS = 10.180505710774743
+###############################################################################
+
+def pwStructure(fname, atomName, dims=(1,1,1)):
+    '''
+    Function to read the structure of a pw.x input, repeated dims times
+
+    OUTPUT:
+        Dictionary with 'pos', 'cell' [Angstrom], 'types' (in atomName),
+        'mass' [amu] of the atoms, 'pbc' and the input 'inp'
+    '''
+    inp = readPwInput(fname)
+    struct = {'inp': inp, 'pbc': np.ones(3, dtype=bool)}
+    pos = inp.cartesian(); cell = inp.cellAngstrom()
+    types = speciesTypes(inp.species, inp.ityp, pos, atomName)
+    sc = buildSupercell(pos, types, cell, dims)
+    struct['pos'] = sc['pos']
+    struct['cell'] = sc['cell']
+    struct['types'] = sc['types']
+    struct['mass'] = np.tile(inp.masses[inp.ityp], len(sc['pos'])//inp.nat)
+    return struct
+
+
+def frameDtype(nat):
+    '''Record of one trajectory frame (single precision positions)'''
+    return np.dtype([('step', 'i8'), ('time', 'f8'), ('epot', 'f8'), ('ekin', 'f8'),
+                     ('cell', 'f4', (3,3)), ('pos', 'f4', (nat,3))])
+
+
+class TrajectoryWriter:
+    '''
+    Frames written one by one into a preallocated .npy file (memory map), so
+    that the trajectory is never held in memory
+    '''
+    def __init__(self, fname, atomName, types, mass, nframes, dt):
+        self.fname = fname
+        self.frames = np.lib.format.open_memmap(fname, mode='w+', dtype=frameDtype(len(types)),
+                                                shape=(nframes,))
+        self.frames['step'] = -1
+        self.n = 0
+        np.savez(os.path.splitext(fname)[0] + '.head.npz', atomName=np.array(atomName),
+                 types=np.asarray(types), mass=np.asarray(mass), dt=dt)
+
+    def write(self, step, time, epot, ekin, cell, pos):
+        frame = self.frames[self.n:self.n+1]
+        frame['step'] = step; frame['time'] = time
+        frame['epot'] = epot; frame['ekin'] = ekin
+        frame['cell'] = cell; frame['pos'] = pos
+        self.n += 1
+
+    def close(self):
+        self.frames.flush()
+        del self.frames
+
+
+def readMDTrajectory(fname):
+    '''
+    Function to read a trajectory of TrajectoryWriter
+
+    OUTPUT:
+        head: Dictionary with 'atomName', 'types', 'mass' and 'dt' [fs]
+        frames: Memory-mapped frames (see frameDtype) that were written
+    '''
+    with np.load(os.path.splitext(fname)[0] + '.head.npz') as data:
+        head = {key: data[key] for key in data.files}
+    head['atomName'] = head['atomName'].tolist()
+    frames = np.load(fname, mmap_mode='r')
+    return head, frames[frames['step'] >= 0]
+
+
+def initialVelocities(mass, temp, seed=0):
+    '''
+    Function to draw Maxwell-Boltzmann velocities [Angstrom/fs] at temp [K]
+    without center of mass motion, rescaled to exactly temp
+    '''
+    rng = np.random.default_rng(seed)
+    mass = np.asarray(mass, dtype=float)
+    vel = rng.normal(size=(len(mass),3))*np.sqrt(KB*temp/mass)[:,None]
+    vel -= (mass @ vel)/mass.sum()
+    ekin = 0.5*np.sum(mass[:,None]*vel**2)
+    if ekin > 0:
+        vel *= np.sqrt(0.5*(3*len(mass) - 3)*KB*temp/ekin)
+    return vel/TIME_FS
+
+
+def runMD(pos, types, cell, coef, mass, nsteps, dt=1.0, vel=None, temp=None, tau=100.0,
+          pbc=(True,True,True), skin=1.0, traj=None, every=10, thermo=100, seed=0):
+    '''
+    Function to run velocity Verlet (NVE) or Langevin (NVT) dynamics
+
+    INPUT:
+        pos, types, cell, coef, pbc: As in swEnergyForces
+        mass: Masses in amu (N,)
+        nsteps, dt: Number of steps and time step [fs]
+        vel: Initial velocities [Angstrom/fs] (default: zero)
+        temp, tau: Thermostat temperature [K] and time constant [fs] (NVT),
+                   or temp None (NVE)
+        skin: Verlet skin of the neighbor list [Angstrom]
+        traj: TrajectoryWriter receiving a frame every 'every' steps
+        thermo: Steps between the recorded energies
+
+    OUTPUT:
+        md: Dictionary with the final 'pos' and 'vel', the recorded 'step',
+            'epot', 'ekin' [eV] and 'temp' [K], the number of neighbor list
+            builds 'nbuild' and the speed 'nsday'
+    '''
+    rng = np.random.default_rng(seed)
+    nat = len(pos)
+    ndof = 3*nat - 3
+    pos = np.array(pos, dtype=float)
+    vel = np.zeros((nat,3)) if vel is None else np.array(vel, dtype=float)
+    # Acceleration factor of a force in eV/Angstrom, in Angstrom/fs^2
+    accel = (1./(np.asarray(mass, dtype=float)*TIME_FS**2))[:,None]
+    mkin = 0.5*np.asarray(mass, dtype=float)[:,None]*TIME_FS**2
+    if temp is not None:
+        c1 = np.exp(-dt/tau)
+        c2 = np.sqrt((1 - c1**2)*KB*temp*accel)
+    noise = np.empty((nat,3))
+    kick = np.empty((nat,3))
+
+    nrec = nsteps//thermo + 1
+    md = {'step': np.arange(nrec)*thermo, 'epot': np.empty(nrec), 'ekin': np.empty(nrec)}
+
+    nlist = swNeighborList(pos, types, cell, coef, pbc=pbc, skin=skin)
+    nbuild = 1
+    epot, forces = swEnergyForces(pos, types, cell, coef, pbc=pbc, nlist=nlist)
+
+    t0 = time.time()
+    for step in range(nsteps+1):
+        if step > 0:
+            np.multiply(forces, accel, out=kick); kick *= 0.5*dt
+            vel += kick
+            pos += 0.5*dt*vel
+            if temp is not None:
+                vel *= c1
+                rng.standard_normal(out=noise)
+                noise *= c2
+                vel += noise
+            pos += 0.5*dt*vel
+            nlist, rebuilt = updateNeighborList(nlist, pos, cell)
+            nbuild += rebuilt
+            epot, forces = swEnergyForces(pos, types, cell, coef, pbc=pbc, nlist=nlist)
+            np.multiply(forces, accel, out=kick); kick *= 0.5*dt
+            vel += kick
+
+        if step % thermo == 0 or (traj is not None and step % every == 0):
+            ekin = np.sum(mkin*vel**2)
+            if step % thermo == 0:
+                md['epot'][step//thermo] = epot
+                md['ekin'][step//thermo] = ekin
+            if traj is not None and step % every == 0:
+                traj.write(step, step*dt, epot, ekin, cell, pos)
+
+    elapsed = time.time() - t0
+    md['temp'] = 2*md['ekin']/(ndof*KB)
+    md['pos'] = pos; md['vel'] = vel
+    md['nbuild'] = nbuild
+    md['nsday'] = nsteps*dt*1e-6/(elapsed/86400.) if elapsed > 0 else np.inf
+    return md
+
+
+if __name__ == "__main__":
+
+    argp = argparse.ArgumentParser(description='Molecular dynamics with a SW potential')
+    argp.add_argument('pot', help='SW potential (.sw or .npz of SW.py)')
+    argp.add_argument('inp', help='pw.x input with the structure')
+    argp.add_argument('-d', '--dims', type=int, nargs=3, default=[1,1,1], help='Supercell N1 N2 N3')
+    argp.add_argument('-n', '--nsteps', type=int, default=1000, help='Number of steps')
+    argp.add_argument('--dt', type=float, default=1.0, help='Time step [fs]')
+    argp.add_argument('-T', '--temp', type=float, default=300.0, help='Initial (and NVT) temperature [K]')
+    argp.add_argument('--nvt', action='store_true', help='Langevin thermostat at TEMP')
+    argp.add_argument('--tau', type=float, default=100.0, help='Thermostat time constant [fs]')
+    argp.add_argument('--skin', type=float, default=1.0, help='Neighbor list skin [Angstrom]')
+    argp.add_argument('--every', type=int, default=10, help='Steps between trajectory frames')
+    argp.add_argument('--thermo', type=int, default=100, help='Steps between printed energies')
+    argp.add_argument('--seed', type=int, default=0, help='Random seed')
+    argp.add_argument('-o', '--out', help='Trajectory file (.npy, default: none)')
+    args = argp.parse_args()
+
+    atomName, table, index = loadSWTable(args.pot)
+    coef = swCoefficients(swParameters(table, index))
+    st = pwStructure(args.inp, atomName, args.dims)
+    vel = initialVelocities(st['mass'], args.temp, args.seed)
+
+    traj = None
+    if args.out:
+        traj = TrajectoryWriter(args.out, atomName, st['types'], st['mass'],
+                                args.nsteps//args.every + 1, args.dt)
+    md = runMD(st['pos'], st['types'], st['cell'], coef, st['mass'], args.nsteps, args.dt, vel,
+               args.temp if args.nvt else None, args.tau, st['pbc'], args.skin, traj,
+               args.every, args.thermo, args.seed)
+    if traj is not None:
+        traj.close()
+
+    print('%i atoms, %s, dt = %g fs'%(len(st['pos']), 'NVT %g K'%args.temp if args.nvt else 'NVE', args.dt))
+    print('%10s %14s %14s %14s %10s'%('step', 'Epot [eV]', 'Ekin [eV]', 'Etot [eV]', 'T [K]'))
+    for s, ep, ek, tk in zip(md['step'], md['epot'], md['ekin'], md['temp']):
+        print('%10i %14.6f %14.6f %14.6f %10.2f'%(s, ep, ek, ep + ek, tk))
+    print('Neighbor list builds: %i, %.3f ns/day'%(md['nbuild'], md['nsday']))
+    if traj is not None:
+        print('Written %i frames to %s'%(traj.n, args.out))
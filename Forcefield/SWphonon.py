@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script to calculate the phonon frequencies of a periodic structure with the
+Stillinger-Weber potential of SWcalc.py, and to compare them with the ph.x
+dynamical matrix files (in cm-1, as printed by freq_extract.py)
+(python SWphonon.py POT.sw PREF.dyn1 [...] [--grid N1 N2 N3])
+
+The force constants are the analytic second derivatives of the SW terms of
+the primitive cell, stored as 3x3 blocks Phi(k, k'; d) between the atoms k
+and k' at the distance vector d = x_k' + R - x_k. Every two-body term gives
+the blocks of its two atoms and every three-body term those of its three
+atoms, so that the dynamical matrix
+
+    D_kk'(q) = sum_d Phi(k, k'; d) exp(i q.d) / sqrt(m_k m_k')
+
+is exact at any q, with no supercell. The matrices of all the q-points are
+built in chunks and diagonalized together with a stacked np.linalg.eigh.
+
+- forceConstantsFD gives the same blocks from central differences of the
+  forces in a supercell, as a check of the analytic ones
+- Frequencies are returned as in the dyn files: imaginary ones as negative
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from SWcalc import _swTerms, swEnergyForces, swNeighborList
+from neighbor import _cellHeights
+from qetools import BOHR_A, latticeVectors, loadDyn
+
+###############################################################################
+# Global variables
+EV = 1.602176634e-19 # J
+AMU = 1.66053906660e-27 # kg
+C_CM = 2.99792458e10 # cm/s
+# Frequency in cm-1 of an eigenvalue of 1 eV/(Angstrom^2 amu)
+EV_AMU_CM = np.sqrt(EV/(1e-20*AMU))/(2*np.pi*C_CM)
+# Distance vectors of the blocks are merged on this grid (Angstrom)
+DTOL = 1e-6
+# Largest number of complex block entries (q-points x blocks x 9) at once
+CHUNK = 2**24
+###############################################################################
+
+def _outer(x, y):
+    return x[:,:,None]*y[:,None,:]
+
+
+def _pairHessian(pairs, coef):
+    '''
+    Function to calculate the second derivatives of the two-body terms with
+    respect to the distance vectors (half of each, as every pair appears
+    twice in the neighbor list)
+    '''
+    ti, tj, r, cut = pairs['ti'], pairs['tj'], pairs['r'], pairs['cut']
+    eps = coef['eps'][ti,tj]; sigma = coef['sigma'][ti,tj]
+    A = coef['A'][ti,tj]; B = coef['B'][ti,tj]
+    p = coef['p'][ti,tj]; q = coef['q'][ti,tj]
+    srp = (sigma/r)**p; srq = (sigma/r)**q
+
+    # V = f(r) g(r), f = eps A (B (s/r)^p - (s/r)^q), g = exp(s/(r - cut))
+    f = eps*A*(B*srp - srq)
+    df = eps*A*(-p*B*srp + q*srq)/r
+    d2f = eps*A*(p*(p+1)*B*srp - q*(q+1)*srq)/r**2
+    rainv = 1./(r - cut)
+    g = np.exp(sigma*rainv)
+    dg = -g*sigma*rainv**2
+    d2g = g*(sigma**2*rainv**4 + 2*sigma*rainv**3)
+    dv = df*g + f*dg
+    d2v = d2f*g + 2*df*dg + f*d2g
+
+    n = pairs['dvec']/r[:,None]
+    nn = _outer(n, n)
+    return 0.5*(d2v[:,None,None]*nn + (dv/r)[:,None,None]*(np.eye(3) - nn))
+
+
+def _tripletHessian(pairs, trip, coef):
+    '''
+    Function to calculate the second derivatives of the three-body terms
+    lam e1 e2 (cos - cos0)^2 with respect to the two legs (u, v), (nt, 6, 6)
+    '''
+    a, b, lam, cos0 = trip['a'], trip['b'], trip['lam'], trip['cos0']
+    sg = coef['sg'][pairs['ti'],pairs['tj']]
+    rainv = 1./(pairs['r'] - pairs['cut'])
+    erad = np.exp(sg*rainv)
+    derad = -erad*sg*rainv**2
+    d2erad = erad*(sg**2*rainv**4 + 2*sg*rainv**3)
+
+    r1, r2 = pairs['r'][a], pairs['r'][b]
+    n1, n2 = pairs['dvec'][a]/r1[:,None], pairs['dvec'][b]/r2[:,None]
+    e1, e2 = erad[a], erad[b]
+    de1, de2 = derad[a], derad[b]
+    cs = np.einsum('ij,ij->i', n1, n2)
+    dcs = cs - cos0
+    ang = dcs**2
+    eye = np.eye(3)
+    nt = len(a)
+
+    # Gradients (nt, 3 variables r1 r2 cos, 6) and Hessians of the variables
+    gu = (n2 - cs[:,None]*n1)/r1[:,None]
+    gv = (n1 - cs[:,None]*n2)/r2[:,None]
+    zero = np.zeros((nt,3))
+    grad = np.stack([np.hstack([n1, zero]), np.hstack([zero, n2]), np.hstack([gu, gv])], axis=1)
+
+    p1 = eye - _outer(n1, n1); p2 = eye - _outer(n2, n2)
+    hr1 = np.zeros((nt,6,6)); hr1[:,:3,:3] = p1/r1[:,None,None]
+    hr2 = np.zeros((nt,6,6)); hr2[:,3:,3:] = p2/r2[:,None,None]
+    hcs = np.zeros((nt,6,6))
+    hcs[:,:3,:3] = -(_outer(n1, gu) + _outer(gu, n1))/r1[:,None,None] - (cs/r1**2)[:,None,None]*p1
+    hcs[:,3:,3:] = -(_outer(n2, gv) + _outer(gv, n2))/r2[:,None,None] - (cs/r2**2)[:,None,None]*p2
+    hcs[:,:3,3:] = p2/(r1*r2)[:,None,None] - _outer(n1, gv)/r1[:,None,None]
+    hcs[:,3:,:3] = hcs[:,:3,3:].transpose(0,2,1)
+
+    # Derivatives of the energy with respect to (r1, r2, cos)
+    dfun = np.stack([lam*de1*e2*ang, lam*e1*de2*ang, 2*lam*e1*e2*dcs], axis=1)
+    d2fun = np.empty((nt,3,3))
+    d2fun[:,0,0] = lam*d2erad[a]*e2*ang
+    d2fun[:,1,1] = lam*e1*d2erad[b]*ang
+    d2fun[:,2,2] = 2*lam*e1*e2
+    d2fun[:,0,1] = d2fun[:,1,0] = lam*de1*de2*ang
+    d2fun[:,0,2] = d2fun[:,2,0] = 2*lam*de1*e2*dcs
+    d2fun[:,1,2] = d2fun[:,2,1] = 2*lam*e1*de2*dcs
+
+    return np.einsum('nai,nab,nbj->nij', grad, d2fun, grad) \
+           + dfun[:,0,None,None]*hr1 + dfun[:,1,None,None]*hr2 + dfun[:,2,None,None]*hcs
+
+
+def _mergeBlocks(k1, k2, dvec, phi):
+    '''
+    Function to sum the blocks with the same atoms and distance vector
+
+    OUTPUT:
+        fc: Dictionary with the atoms 'k1', 'k2', distance vectors 'd' and
+            blocks 'phi' (nblock, 3, 3), sorted by atom pair
+    '''
+    key = np.column_stack([k1, k2, np.round(dvec/DTOL).astype(np.int64)])
+    key, first, inv = np.unique(key, axis=0, return_index=True, return_inverse=True)
+    inv = inv.ravel()
+    merged = np.zeros((len(key), 9))
+    for c in range(9):
+        merged[:,c] = np.bincount(inv, weights=phi.reshape(-1,9)[:,c], minlength=len(key))
+    return {'k1': key[:,0], 'k2': key[:,1], 'd': dvec[first], 'phi': merged.reshape(-1,3,3)}
+
+
+def forceConstants(pos, types, cell, coef, pbc=(True,True,True), nlist=None):
+    '''
+    Function to calculate the analytic SW force constants of a periodic cell
+
+    INPUT:
+        pos, types, cell, coef, pbc, nlist: As in swEnergyForces
+
+    OUTPUT:
+        fc: Blocks Phi(k1, k2; d) in eV/Angstrom^2 (see _mergeBlocks)
+    '''
+    pairs, trip = _swTerms(pos, types, cell, coef, pbc=pbc, nlist=nlist)
+    i, j, dvec = pairs['i'], pairs['j'], pairs['dvec']
+
+    # Two-body: u = x_j - x_i
+    h2 = _pairHessian(pairs, coef)
+    zero = np.zeros_like(dvec)
+    k1 = [i, j, i, j]; k2 = [i, j, j, i]
+    dist = [zero, zero, dvec, -dvec]
+    phi = [h2, h2, -h2, -h2]
+
+    # Three-body: u = x_j - x_i, v = x_k - x_i for the atoms (i, j, k)
+    a, b = trip['a'], trip['b']
+    h6 = _tripletHessian(pairs, trip, coef)
+    jac = np.zeros((6,9))
+    jac[:3,:3] = jac[3:,:3] = -np.eye(3)
+    jac[:3,3:6] = jac[3:,6:] = np.eye(3)
+    h9 = np.einsum('xi,nxy,yj->nij', jac, h6, jac).reshape(-1,3,3,3,3)
+    atoms = [i[a], j[a], j[b]]
+    rel = [np.zeros_like(dvec[a]), dvec[a], dvec[b]]
+    for s in range(3):
+        for t in range(3):
+            k1.append(atoms[s]); k2.append(atoms[t])
+            dist.append(rel[t] - rel[s])
+            phi.append(h9[:,s,:,t,:])
+
+    return _mergeBlocks(np.concatenate(k1), np.concatenate(k2), np.concatenate(dist),
+                        np.concatenate(phi))
+
+
+def fcDims(cell, cutoff, pbc=(True,True,True)):
+    '''
+    Function to find the supercell with at least 4 cutoffs between opposite
+    faces along the periodic directions (force constants of the three-body
+    terms reach 2 cutoffs)
+    '''
+    heights = _cellHeights(np.asarray(cell, dtype=float))
+    dims = np.maximum(1, np.ceil(4.*cutoff/heights)).astype(int)
+    dims[~np.asarray(pbc, dtype=bool)] = 1
+    return dims
+
+
+def buildSupercell(pos, types, cell, dims, pbc=(True,True,True)):
+    '''
+    Function to repeat a cell dims times
+
+    OUTPUT:
+        sc: Dictionary with the supercell 'pos', 'types', 'cell', the primitive
+            atom of every atom 'atom' (cell-major: atom k of cell c is
+            c*nat + k, so the first nat atoms are the primitive cell), 'dims'
+            and 'pbc'
+    '''
+    pos = np.asarray(pos, dtype=float); cell = np.asarray(cell, dtype=float)
+    dims = np.asarray(dims, dtype=int)
+    nat = len(pos)
+    images = np.indices(dims).reshape(3, -1).T
+    sc = {}
+    sc['pos'] = ((images @ cell)[:,None,:] + pos[None,:,:]).reshape(-1, 3)
+    sc['types'] = np.tile(np.asarray(types), len(images))
+    sc['cell'] = cell*dims[:,None]
+    sc['atom'] = np.tile(np.arange(nat), len(images))
+    sc['dims'] = dims
+    sc['pbc'] = np.asarray(pbc, dtype=bool)
+    return sc
+
+
+def forceConstantsFD(pos, types, cell, coef, pbc=(True,True,True), dims=None, h=0.005):
+    '''
+    Function to calculate the force constants by central differences of the
+    SW forces in a supercell
+
+    INPUT:
+        pos, types, cell, coef, pbc: As in swEnergyForces (primitive cell)
+        dims: Supercell (default: fcDims with the largest SW cutoff)
+        h: Displacement in Angstrom
+
+    OUTPUT:
+        fc: Blocks Phi(k1, k2; d) in eV/Angstrom^2, as in forceConstants
+    '''
+    if dims is None:
+        dims = fcDims(cell, coef['cut'].max(), pbc)
+    sc = buildSupercell(pos, types, cell, dims, pbc)
+    nat = len(pos)
+    # The displacements are far smaller than the skin: one neighbor list
+    nlist = swNeighborList(sc['pos'], sc['types'], sc['cell'], coef, pbc=pbc, skin=4*h)
+
+    fc = np.zeros((nat, 3, len(sc['pos']), 3))
+    for k in range(nat):
+        for a in range(3):
+            disp = np.zeros_like(sc['pos'])
+            disp[k,a] = h
+            fp = swEnergyForces(sc['pos'] + disp, sc['types'], sc['cell'], coef, pbc=pbc, nlist=nlist)[1]
+            fm = swEnergyForces(sc['pos'] - disp, sc['types'], sc['cell'], coef, pbc=pbc, nlist=nlist)[1]
+            fc[k,a] = -(fp - fm)/(2*h)
+
+    # Shortest image of x_j - x_k (the force constants do not reach further)
+    dvec = sc['pos'][None,:,:] - sc['pos'][:nat,None,:]
+    frac = np.linalg.solve(sc['cell'].T, dvec.reshape(-1,3).T).T
+    frac -= np.round(frac)*sc['pbc']
+    dvec = frac @ sc['cell']
+
+    phi = fc.transpose(0,2,1,3).reshape(-1,3,3)
+    k1 = np.repeat(np.arange(nat), len(sc['pos']))
+    k2 = np.tile(sc['atom'], nat)
+    keep = np.any(phi != 0, axis=(1,2))
+    return _mergeBlocks(k1[keep], k2[keep], dvec[keep], phi[keep])
+
+
+def dynamicalMatrices(fc, mass, qpts):
+    '''
+    Function to build the dynamical matrices of many q-points at once
+
+    INPUT:
+        fc: Force constant blocks from forceConstants (or forceConstantsFD)
+        mass: Masses of the atoms in amu (nat,)
+        qpts: q-points in Cartesian coordinates [1/Angstrom] (nq, 3)
+
+    OUTPUT:
+        D: Dynamical matrices in eV/(Angstrom^2 amu), (nq, 3*nat, 3*nat)
+    '''
+    nat = len(mass)
+    qpts = np.atleast_2d(qpts)
+    # Blocks are sorted by atom pair: sum each pair with reduceat
+    pair = fc['k1']*nat + fc['k2']
+    start = np.flatnonzero(np.r_[True, pair[1:] != pair[:-1]])
+    minv = 1./np.sqrt(np.asarray(mass, dtype=float))
+    phi = fc['phi']*(minv[fc['k1']]*minv[fc['k2']])[:,None,None]
+
+    D = np.zeros((len(qpts), nat*nat, 3, 3), dtype=complex)
+    nchunk = max(1, CHUNK//(9*len(phi)))
+    for q0 in range(0, len(qpts), nchunk):
+        phase = np.exp(1j*(qpts[q0:q0+nchunk] @ fc['d'].T))
+        D[q0:q0+nchunk, pair[start]] = np.add.reduceat(phase[:,:,None,None]*phi[None], start, axis=1)
+    D = D.reshape(len(qpts), nat, nat, 3, 3).transpose(0,1,3,2,4).reshape(len(qpts), 3*nat, 3*nat)
+    return 0.5*(D + D.conj().transpose(0,2,1))
+
+
+def phononFrequencies(D, vectors=False):
+    '''
+    Function to diagonalize the stacked dynamical matrices (nq, 3n, 3n)
+
+    OUTPUT:
+        freq: Frequencies in cm-1 (nq, 3n), imaginary ones as negative
+        eigvec: Eigenvectors (nq, 3n modes, n, 3) if vectors
+    '''
+    if vectors:
+        w2, vec = np.linalg.eigh(D)
+    else:
+        w2 = np.linalg.eigvalsh(D)
+    freq = np.sign(w2)*np.sqrt(np.abs(w2))*EV_AMU_CM
+    if not vectors:
+        return freq
+    nq, nmode = w2.shape
+    return freq, vec.transpose(0,2,1).reshape(nq, nmode, nmode//3, 3)
+
+
+def speciesTypes(species, ityp, pos, atomName):
+    '''
+    Function to assign the atoms to the elements of atomName, splitting an
+    element X into the sub-layers X1 (upper) and X2 (lower) if needed
+    '''
+    types = np.zeros(len(ityp), dtype=int)
+    for s, name in enumerate(species):
+        sel = np.asarray(ityp) == s
+        if name in atomName:
+            types[sel] = atomName.index(name)
+        elif name + '1' in atomName and name + '2' in atomName:
+            upper = pos[:,2] > pos[sel,2].mean()
+            types[sel & upper] = atomName.index(name + '1')
+            types[sel & ~upper] = atomName.index(name + '2')
+        else:
+            print('Error in speciesTypes: %s is not in the potential (%s)'%(name, ' '.join(atomName)))
+            sys.exit()
+    return types
+
+
+def dynStructure(fname, atomName):
+    '''
+    Function to read the structure, the q-points and the frequencies of a
+    dynamical matrix file
+
+    OUTPUT:
+        Dictionary with 'pos', 'cell' [Angstrom], 'types' (in atomName),
+        'mass' [amu] of the atoms, 'q' [1/Angstrom], 'freq' [cm-1]
+    '''
+    dyn = loadDyn(fname)
+    alat = dyn['alat']*BOHR_A
+    basis = dyn['basis'] if 'basis' in dyn else latticeVectors(dyn['ibrav'], dyn['celldm'][:3])
+    struct = {'cell': basis*alat, 'pos': dyn['tau']*alat}
+    struct['types'] = speciesTypes(dyn['species'], dyn['ityp'], struct['pos'], atomName)
+    struct['mass'] = dyn['mass'][dyn['ityp']]
+    struct['q'] = dyn['q']*2*np.pi/alat
+    struct['freq'] = dyn['freq']
+    return struct
+
+
+if __name__ == "__main__":
+
+    from SW import loadSWTable, swParameters
+    from SWcalc import swCoefficients
+
+    argp = argparse.ArgumentParser(description='SW phonons at the q-points of ph.x dyn files')
+    argp.add_argument('pot', help='SW potential (.sw or .npz of SW.py)')
+    argp.add_argument('dyn', nargs='+', help='Dynamical matrix files (PREF.dynN)')
+    argp.add_argument('--grid', type=int, nargs=3, help='Also scan an N1xN2xN3 q-grid for imaginary modes')
+    argp.add_argument('--fd', action='store_true', help='Finite-difference force constants (check)')
+    args = argp.parse_args()
+
+    atomName, table, index = loadSWTable(args.pot)
+    coef = swCoefficients(swParameters(table, index))
+
+    for fname in args.dyn:
+        st = dynStructure(fname, atomName)
+        t0 = time.time()
+        if args.fd:
+            fc = forceConstantsFD(st['pos'], st['types'], st['cell'], coef)
+        else:
+            fc = forceConstants(st['pos'], st['types'], st['cell'], coef)
+        freq = phononFrequencies(dynamicalMatrices(fc, st['mass'], st['q']))
+        print('SYSTEM = %s (%i blocks, %.3f s)'%(fname, len(fc['phi']), time.time()-t0))
+        for q, fdyn, fsw in zip(st['q'], st['freq'], freq):
+            print('     q = ( %.9f %.9f %.9f ) [1/A]'%tuple(q))
+            for ind, (w1, w2) in enumerate(zip(fdyn, fsw)):
+                print('freq (%i) = %f [cm-1], SW %f [cm-1], diff %f'%(ind+1, w1, w2, w2-w1))
+        print('   rms = %f [cm-1]'%np.sqrt(np.mean((freq - st['freq'])**2)))
+
+        if args.grid:
+            t0 = time.time()
+            qgrid = (np.indices(args.grid).reshape(3,-1).T/np.array(args.grid)) \
+                    @ (2*np.pi*np.linalg.inv(st['cell']).T)
+            fgrid = phononFrequencies(dynamicalMatrices(fc, st['mass'], qgrid))
+            print('   %i q-points: lowest %f, highest %f [cm-1] (%.3f s)'
+                  %(len(qgrid), fgrid.min(), fgrid.max(), time.time()-t0))
+        print('   ')
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script to pre-relax the atomic positions of a pw.x input with the
+Stillinger-Weber potential of SWcalc.py, before the DFT relaxation
+(python SWrelax.py POT.sw INPUT [-m fire|lbfgs] [--fmax F] [-o OUTPUT])
+
+The cell is kept fixed and the positions are minimized with FIRE (damped
+dynamics of unit masses, Bitzek et al., PRL 97, 170201 (2006)) or with L-BFGS
+(two-loop recursion with a backtracking line search on the energy), until the
+largest force is below fmax. The fixed components of the input (if_pos = 0)
+are not moved. The pre-relaxed positions are written back into the
+ATOMIC_POSITIONS of the input, in its units, and everything else is kept.
+
+- The energy and forces of the whole structure are evaluated at once, and the
+  neighbor list (with a skin) is only rebuilt when an atom has moved more than
+  half of the skin
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from SW import loadSWTable, swParameters
+from SWcalc import swCoefficients, swEnergyForces, swNeighborList
+from SWmd import pwStructure
+from neighbor import updateNeighborList
+
+###############################################################################
+# Global variables
+# FIRE parameters (Bitzek et al.)
+FIRE = {'nmin': 5, 'finc': 1.1, 'fdec': 0.5, 'alpha': 0.1, 'falpha': 0.99}
+###############################################################################
+
+class SWModel:
+    '''
+    Energy and forces of a structure with a fixed cell, reusing the neighbor
+    list between the calls
+    '''
+    def __init__(self, types, cell, coef, pbc=(True,True,True), skin=0.5):
+        self.types = types
+        self.cell = cell
+        self.coef = coef
+        self.pbc = pbc
+        self.skin = skin
+        self.nlist = None
+        self.ncall = 0
+        self.nbuild = 0
+
+    def __call__(self, pos):
+        if self.nlist is None:
+            self.nlist = swNeighborList(pos, self.types, self.cell, self.coef, pbc=self.pbc, skin=self.skin)
+            rebuilt = True
+        else:
+            self.nlist, rebuilt = updateNeighborList(self.nlist, pos, self.cell)
+        self.ncall += 1
+        self.nbuild += rebuilt
+        return swEnergyForces(pos, self.types, self.cell, self.coef, pbc=self.pbc, nlist=self.nlist)
+
+
+def _fmax(forces):
+    return np.sqrt(np.max(np.sum(forces**2, axis=1), initial=0.))
+
+
+def fire(model, pos, mask=None, fmax=0.01, maxsteps=1000, dt=0.1, dtmax=1.0, maxmove=0.2):
+    '''
+    Function to minimize the energy with FIRE
+
+    INPUT:
+        model: Function of the positions returning (energy, forces)
+        pos: Starting positions in Angstrom (N, 3)
+        mask: 1 for the free components, 0 for the fixed ones (N, 3)
+        fmax: Convergence threshold of the largest force [eV/Angstrom]
+        dt, dtmax: Starting and largest time steps, maxmove: largest step [Angstrom]
+
+    OUTPUT:
+        pos, energy, forces, nsteps, converged
+    '''
+    pos = np.array(pos, dtype=float)
+    mask = np.ones_like(pos) if mask is None else np.asarray(mask, dtype=float)
+    vel = np.zeros_like(pos)
+    alpha = FIRE['alpha']; npos = 0
+    energy, forces = model(pos)
+    forces *= mask
+    for nsteps in range(maxsteps):
+        if _fmax(forces) < fmax:
+            return pos, energy, forces, nsteps, True
+        power = np.sum(forces*vel)
+        if nsteps == 0:
+            pass # No velocity yet: the first step is a plain Euler step
+        elif power > 0:
+            fnorm = np.linalg.norm(forces)
+            vel = (1 - alpha)*vel + alpha*np.linalg.norm(vel)*forces/fnorm
+            npos += 1
+            if npos > FIRE['nmin']:
+                dt = min(dt*FIRE['finc'], dtmax)
+                alpha *= FIRE['falpha']
+        else:
+            vel[:] = 0.
+            dt *= FIRE['fdec']
+            alpha = FIRE['alpha']; npos = 0
+        # Euler step of unit masses, limited to maxmove
+        vel += dt*forces
+        step = dt*vel
+        smax = np.sqrt(np.max(np.sum(step**2, axis=1)))
+        if smax > maxmove:
+            step *= maxmove/smax
+        pos += step
+        energy, forces = model(pos)
+        forces *= mask
+    return pos, energy, forces, maxsteps, _fmax(forces) < fmax
+
+
+def lbfgs(model, pos, mask=None, fmax=0.01, maxsteps=1000, memory=10, maxmove=0.2):
+    '''
+    Function to minimize the energy with L-BFGS (same INPUT and OUTPUT as
+    fire, with memory the number of stored steps)
+    '''
+    pos = np.array(pos, dtype=float)
+    mask = np.ones_like(pos) if mask is None else np.asarray(mask, dtype=float)
+    energy, forces = model(pos)
+    forces *= mask
+    svec = []; yvec = []
+    for nsteps in range(maxsteps):
+        if _fmax(forces) < fmax:
+            return pos, energy, forces, nsteps, True
+
+        # Two-loop recursion for the direction -H grad = H forces
+        q = forces.ravel().copy()
+        rho = [1./(y @ s) for s, y in zip(svec, yvec)]
+        alphas = []
+        for s, y, r in reversed(list(zip(svec, yvec, rho))):
+            a = r*(s @ q); q -= a*y
+            alphas.append(a)
+        gamma = (svec[-1] @ yvec[-1])/(yvec[-1] @ yvec[-1]) if svec else 1./70.
+        d = gamma*q
+        for (s, y, r), a in zip(zip(svec, yvec, rho), reversed(alphas)):
+            d += s*(a - r*(y @ d))
+        d = d.reshape(pos.shape)*mask
+        slope = -np.sum(forces*d)
+        if slope >= 0:
+            # Not a descent direction: restart from steepest descent
+            svec.clear(); yvec.clear()
+            d = forces/70.; slope = -np.sum(forces*d)
+        smax = np.sqrt(np.max(np.sum(d**2, axis=1)))
+        if smax > maxmove:
+            d *= maxmove/smax; slope *= maxmove/smax
+
+        # Backtracking line search (Armijo condition)
+        step = 1.0
+        while True:
+            new = pos + step*d
+            enew, fnew = model(new)
+            fnew *= mask
+            if enew <= energy + 1e-4*step*slope or step < 1e-4:
+                break
+            step *= 0.5
+        svec.append((new - pos).ravel()); yvec.append((forces - fnew).ravel())
+        if svec[-1] @ yvec[-1] <= 1e-12:
+            svec.pop(); yvec.pop()
+        if len(svec) > memory:
+            svec.pop(0); yvec.pop(0)
+        pos, energy, forces = new, enew, fnew
+    return pos, energy, forces, maxsteps, _fmax(forces) < fmax
+
+
+if __name__ == "__main__":
+
+    argp = argparse.ArgumentParser(description='Pre-relax the positions of a pw.x input with a SW potential')
+    argp.add_argument('pot', help='SW potential (.sw or .npz of SW.py)')
+    argp.add_argument('inp', help='pw.x input')
+    argp.add_argument('-m', '--method', choices=['fire', 'lbfgs'], default='fire', help='Minimizer (default: fire)')
+    argp.add_argument('--fmax', type=float, default=0.01, help='Largest force [eV/A] (default: 0.01)')
+    argp.add_argument('--steps', type=int, default=1000, help='Largest number of steps')
+    argp.add_argument('--skin', type=float, default=0.5, help='Neighbor list skin [Angstrom]')
+    argp.add_argument('-o', '--out', help='Output (default: INPUT with .pre before .in)')
+    args = argp.parse_args()
+
+    atomName, table, index = loadSWTable(args.pot)
+    coef = swCoefficients(swParameters(table, index))
+    st = pwStructure(args.inp, atomName)
+    inp = st['inp']
+    mask = None if inp.if_pos is None else np.asarray(inp.if_pos, dtype=float)
+    if mask is not None and mask.shape != (inp.nat, 3):
+        print('Error: if_pos of shape %s for %i atoms'%(mask.shape, inp.nat))
+        raise SystemExit
+
+    model = SWModel(st['types'], st['cell'], coef, st['pbc'], args.skin)
+    e0, f0 = model(st['pos'])
+    t0 = time.time()
+    minimize = fire if args.method == 'fire' else lbfgs
+    pos, energy, forces, nsteps, converged = minimize(model, st['pos'], mask, args.fmax, args.steps)
+
+    print('%i atoms, %s: %i steps, %i force calls, %i neighbor list builds (%.2f s)'
+          %(inp.nat, args.method, nsteps, model.ncall, model.nbuild, time.time()-t0))
+    print('E = %.6f -> %.6f eV, max|F| = %.4f -> %.4f eV/A, largest displacement %.4f A'
+          %(e0, energy, _fmax(f0), _fmax(forces), np.sqrt(np.max(np.sum((pos - st['pos'])**2, axis=1)))))
+    if not converged:
+        print('Warning: Not converged to fmax = %g eV/A'%args.fmax)
+    if mask is not None and np.any((pos != st['pos'])[mask == 0]):
+        print('Error: Fixed components (if_pos = 0) were moved')
+        raise SystemExit
+
+    root, ext = os.path.splitext(args.inp)
+    out = args.out or root + '.pre' + (ext or '.in')
+    inp.write(out, inp.fromCartesian(pos))
+    print('Written %s'%out)
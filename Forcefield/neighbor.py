@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script to build neighbor lists with a cell list (linked-cell) search, for
+the evaluation of the Stillinger-Weber potential in SWcalc.py
+
+- Periodic boundaries are treated by adding ghost images of the atoms close
+to the cell faces, so that small or triclinic cells (where the cutoff is
+larger than the cell) are handled in the same way as large supercells
+- Each element pair can have a different cutoff, e.g. the a*sigma values of
+the i-j-j entries of the SW parameter table
+- Pairs are stored up to cutoff + skin (Verlet list), together with integer
+image shifts, so the list can be reused until an atom moves more than half
+of the skin
+
+The search scales as O(N) and works on arrays of atoms per neighboring cell,
+without Python loops over the atoms.
+"""
+
+import numpy as np
+import itertools
+
+###############################################################################
+# Global variables
+STENCIL = np.array(list(itertools.product([-1,0,1], repeat=3))) # Adjacent cells
+###############################################################################
+
+def _cellHeights(cell):
+    '''
+    Function to calculate the distance between opposite faces of the cell
+    '''
+    vol = abs(np.linalg.det(cell))
+    return vol/np.linalg.norm(np.cross(cell[[1,2,0]], cell[[2,0,1]]), axis=1)
+
+
+def _ghostImages(frac, pbc, width):
+    '''
+    Function to add the periodic images within the fractional distance
+    width of the cell faces
+
+    OUTPUT:
+        index: Index of the original atom of every (real and ghost) atom
+        image: Integer lattice shift of every atom
+    '''
+    nat = len(frac)
+    index = np.arange(nat)
+    image = np.zeros((nat,3), dtype=int)
+    for d in range(3):
+        if not pbc[d]:
+            continue
+        nrep = int(np.ceil(width[d]))
+        f = frac[index,d] + image[:,d]
+        new_index = [index]; new_image = [image]
+        for m in range(-nrep, nrep+1):
+            if m == 0:
+                continue
+            # Keep the images that fall within width of the faces
+            fm = f + m
+            mask = (fm >= -width[d]) & (fm < 1. + width[d])
+            img = image[mask].copy()
+            img[:,d] += m
+            new_index.append(index[mask]); new_image.append(img)
+        index = np.concatenate(new_index); image = np.concatenate(new_image)
+
+    return index, image
+
+
+def _groupPairs(first, start, count):
+    '''
+    Function to pair every entry of first with all the count entries that
+    begin at start (arrays of equal length)
+    '''
+    ind1 = np.repeat(first, count)
+    offset = np.arange(len(ind1)) - np.repeat(np.cumsum(count) - count, count)
+    ind2 = np.repeat(start, count) + offset
+
+    return ind1, ind2
+
+
+def buildNeighborList(pos, cell, cutoff, types=None, pbc=(True,True,True), skin=0.0):
+    '''
+    Function to find all the (i, j) pairs with r_ij < cutoff[ti, tj] + skin
+
+    INPUT:
+        pos: Cartesian positions in Angstrom, shape (N, 3)
+        cell: Lattice vectors (as rows) in Angstrom, shape (3, 3)
+        cutoff: A single cutoff or an (n, n) array of element pair cutoffs
+        types: Index of the element of every atom (needed for pair cutoffs)
+        pbc: Periodicity along each lattice vector
+        skin: Verlet skin added to every cutoff
+
+    OUTPUT:
+        nlist: Dictionary holding the full (double counted) neighbor list
+               sorted by i ('i', 'j', integer image shifts 'shift') and the
+               settings and positions used to build it
+    '''
+    pos = np.asarray(pos, dtype=float)
+    cell = np.asarray(cell, dtype=float)
+    pbc = np.asarray(pbc, dtype=bool)
+    nat = len(pos)
+    if types is None:
+        types = np.zeros(nat, dtype=int)
+    types = np.asarray(types)
+    cutoff = np.atleast_2d(np.asarray(cutoff, dtype=float))
+    rc = cutoff.max() + skin
+
+    # Wrap the atoms into the cell along periodic directions
+    frac = np.linalg.solve(cell.T, pos.T).T
+    wrap = np.zeros((nat,3), dtype=int)
+    wrap[:,pbc] = np.floor(frac[:,pbc]).astype(int)
+    frac = frac - wrap
+
+    # Extend the cell with the ghost atoms
+    height = _cellHeights(cell)
+    width = rc/height # Cutoff in fractional units along each direction
+    index, image = _ghostImages(frac, pbc, width)
+    fext = frac[index] + image
+    xext = fext @ cell
+
+    # Assign all the atoms to cells of at least rc along each direction
+    fmin = fext.min(axis=0)
+    nbin = np.maximum(1, np.floor((fext.max(axis=0) - fmin)/width).astype(int) + 1)
+    bin3 = np.minimum(np.floor((fext - fmin)/width).astype(int), nbin-1)
+    binid = np.ravel_multi_index(bin3.T, nbin)
+    order = np.argsort(binid, kind='stable')
+    count = np.bincount(binid, minlength=np.prod(nbin))
+    start = np.cumsum(count) - count
+
+    # Real atoms (first nat entries) against the atoms of adjacent cells
+    ilist, jlist = [], []
+    for off in STENCIL:
+        nb3 = bin3[:nat] + off
+        valid = np.all((nb3 >= 0) & (nb3 < nbin), axis=1)
+        real = np.nonzero(valid)[0]
+        nbid = np.ravel_multi_index(nb3[valid].T, nbin)
+        ii, jj = _groupPairs(real, start[nbid], count[nbid])
+        jj = order[jj]
+        d = xext[jj] - xext[ii]
+        r2 = np.einsum('ij,ij->i', d, d)
+        rcut = cutoff[types[ii], types[index[jj]]] + skin if cutoff.size > 1 \
+               else cutoff[0,0] + skin
+        mask = (r2 < rcut**2) & (jj != ii)
+        ilist.append(ii[mask]); jlist.append(jj[mask])
+
+    i = np.concatenate(ilist); jext = np.concatenate(jlist)
+    srt = np.lexsort((jext, i))
+    i, jext = i[srt], jext[srt]
+    j = index[jext]
+
+    nlist = {}
+    nlist['i'] = i
+    nlist['j'] = j
+    # Image shifts relative to the unwrapped input positions
+    nlist['shift'] = image[jext] + wrap[i] - wrap[j]
+    nlist['pos0'] = pos.copy()
+    nlist['cell'] = cell.copy()
+    nlist['types'] = types.copy()
+    nlist['cutoff'] = cutoff
+    nlist['pbc'] = pbc
+    nlist['skin'] = skin
+
+    return nlist
+
+
+def neighborVectors(nlist, pos, cell=None):
+    '''
+    Function to calculate the distance vectors x_j - x_i of all the pairs
+    in the neighbor list for the current positions
+    '''
+    if cell is None:
+        cell = nlist['cell']
+    dvec = np.asarray(pos)[nlist['j']] - np.asarray(pos)[nlist['i']] \
+           + nlist['shift'] @ cell
+
+    return nlist['i'], nlist['j'], dvec
+
+
+def updateNeighborList(nlist, pos, cell=None):
+    '''
+    Function to rebuild the neighbor list only if an atom has moved more than
+    half of the skin (or the cell has changed) since it was built
+
+    OUTPUT:
+        nlist: The same or the rebuilt neighbor list
+        rebuilt: True if the list was rebuilt
+    '''
+    if cell is None:
+        cell = nlist['cell']
+    pos = np.asarray(pos)
+    if pos.shape == nlist['pos0'].shape and np.allclose(cell, nlist['cell']):
+        disp2 = np.max(np.sum((pos - nlist['pos0'])**2, axis=1), initial=0.)
+        if disp2 < (0.5*nlist['skin'])**2:
+            return nlist, False
+
+    nlist = buildNeighborList(pos, cell, nlist['cutoff'], types=nlist['types'],
+                              pbc=nlist['pbc'], skin=nlist['skin'])
+    return nlist, True
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Readers of the Quantum ESPRESSO files used by the Forcefield scripts, taken
+from the scripts in ../QE
+
+This is the only place where ../QE is added to the module search path (once,
+as the QE scripts import each other by name); the Forcefield scripts import
+the readers from here.
+"""
+
+import os
+import sys
+
+###############################################################################
+# Global variables
+QE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'QE')
+###############################################################################
+
+if os.path.abspath(QE_DIR) not in map(os.path.abspath, sys.path):
+    sys.path.append(os.path.abspath(QE_DIR))
+
+from phcache import loadDyn
+from pwinput import latticeVectors, readPwInput
+from pwtraj import BOHR_A, readTrajectory
+
+__all__ = ['BOHR_A', 'latticeVectors', 'loadDyn', 'readPwInput', 'readTrajectory']
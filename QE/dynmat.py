@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+###########################################################
+# Script to read the dynamical matrix files written by
+# 'ph.x' (prefix.dynN) into NumPy arrays, in a single pass
+# over the file (readModes also reads the modes of the
+# 'dynmat.x' output, dynmat.out)
+# (python dynmat.py FILE)
+###########################################################
+# Numeric blocks are sliced out of the text and converted
+# together with np.fromstring, instead of float() per token
+#
+# readDyn(fname) returns a dictionary with:
+#  - nat, species, mass [amu], ityp, tau [alat], alat [bohr]
+#  - dynq: q-points of the star (nstar, 3) [2pi/alat]
+#  - phi: dynamical matrices (nstar, nat, nat, 3, 3) [Ry/bohr^2]
+#  - q: diagonalized q-points (nq, 3)
+#  - freq: frequencies (nq, 3*nat) [cm-1], freq_thz [THz]
+#  - eigvec: complex eigenvectors (nq, 3*nat, nat, 3)
+###########################################################
+
+import glob
+import sys
+
+import numpy as np
+
+###########################################################
+AMU_RY = 911.44424310865645 # Atomic mass unit in Rydberg units (m_e/2)
+###########################################################
+
+def _qpoint(line):
+  '''q-point from a "q = ( qx qy qz )" line (dynmat.x omits the brackets)'''
+  return np.fromstring(line.split('=')[1].replace('(', ' ').replace(')', ' '), sep=' ')
+
+
+def _modes(lines, diag, nat):
+  '''
+  Frequencies and eigenvectors of the "Diagonalizing" blocks starting at
+  the line indices diag (3*nat blocks of 1+nat lines)
+  '''
+  qs = []; freq = []; freq_thz = []; eigvec = []
+  nmode = 3*nat
+  for ind in diag:
+    while 'q = ' not in lines[ind]:
+      ind += 1
+    qs.append(_qpoint(lines[ind]))
+    while 'freq' not in lines[ind].split():
+      ind += 1
+    block = lines[ind:ind + nmode*(nat+1)]
+    flines = block[::nat+1]
+    freq.append([float(l.split('=')[2].split()[0]) for l in flines])
+    freq_thz.append([float(l.split('=')[1].split()[0]) for l in flines])
+    vlines = [l for k,l in enumerate(block) if k % (nat+1)]
+    vec = np.fromstring(' '.join(vlines).replace('(', ' ').replace(')', ' '), sep=' ')
+    vec = vec.reshape(nmode, nat, 3, 2)
+    eigvec.append(vec[...,0] + 1j*vec[...,1])
+  modes = {}
+  modes['q'] = np.array(qs).reshape(-1,3)
+  modes['freq'] = np.array(freq).reshape(-1, nmode)
+  modes['freq_thz'] = np.array(freq_thz).reshape(-1, nmode)
+  modes['eigvec'] = np.ascontiguousarray(np.array(eigvec).reshape(-1, nmode, nat, 3))
+  return modes
+
+
+def readDyn(fname):
+  '''Function to read a dynamical matrix file'''
+  with open(fname) as f:
+    lines = f.read().splitlines()
+
+  dyn = {}
+  # Header: ntyp, nat, ibrav, celldm
+  head = lines[2].split()
+  ntyp, nat, ibrav = int(head[0]), int(head[1]), int(head[2])
+  celldm = np.array(head[3:9], dtype=float)
+  ind = 3
+  if ibrav == 0:
+    dyn['basis'] = np.fromstring(' '.join(lines[ind+1:ind+4]), sep=' ').reshape(3,3)
+    ind += 4
+  species = []; mass = []
+  for line in lines[ind:ind+ntyp]:
+    species.append(line.split("'")[1].strip())
+    mass.append(float(line.split("'")[2])/AMU_RY)
+  ind += ntyp
+  atoms = np.fromstring(' '.join(lines[ind:ind+nat]), sep=' ').reshape(nat,5)
+  ind += nat
+
+  dyn['nat'] = nat
+  dyn['ibrav'] = ibrav
+  dyn['celldm'] = celldm
+  dyn['alat'] = celldm[0]
+  dyn['species'] = species
+  dyn['mass'] = np.array(mass)
+  dyn['ityp'] = atoms[:,1].astype(int) - 1
+  dyn['tau'] = atoms[:,2:]
+
+  # Dynamical matrices of the star of q (4 lines per atom pair)
+  dynq = []; phi = []
+  nmat = 4*nat*nat
+  diag = []
+  while ind < len(lines):
+    line = lines[ind]
+    if 'Dynamical' in line and 'Matrix' in line:
+      while 'q = (' not in lines[ind]:
+        ind += 1
+      dynq.append(_qpoint(lines[ind]))
+      ind += 1
+      while not lines[ind].strip():
+        ind += 1
+      block = np.fromstring(' '.join(lines[ind:ind+nmat]), sep=' ').reshape(nat, nat, 20)
+      mat = block[:,:,2:].reshape(nat, nat, 3, 3, 2)
+      phi.append(mat[...,0] + 1j*mat[...,1])
+      ind += nmat
+    elif 'Diagonalizing' in line:
+      diag.append(ind)
+      ind += 1
+    else:
+      ind += 1
+  dyn['dynq'] = np.array(dynq).reshape(-1,3)
+  dyn['phi'] = np.array(phi).reshape(-1, nat, nat, 3, 3)
+
+  # Frequencies and eigenvectors
+  dyn.update(_modes(lines, diag, nat))
+
+  return dyn
+
+
+def readModes(fname):
+  '''
+  Function to read only the frequencies and eigenvectors of a file, e.g.
+  the dynmat.out of 'dynmat.x' (ASR applied), which has no dyn header
+
+  OUTPUT:
+    Dictionary with nat, q (nq, 3), freq, freq_thz (nq, 3*nat) and
+    eigvec (nq, 3*nat, nat, 3)
+  '''
+  with open(fname) as f:
+    lines = f.read().splitlines()
+  diag = [k for k, line in enumerate(lines) if 'iagonalizing' in line]
+  # Number of atoms from the lines between the first two frequencies
+  first = [k for k, line in enumerate(lines[diag[0]:]) if 'freq' in line.split()][:2]
+  nat = first[1] - first[0] - 1
+  modes = _modes(lines, diag, nat)
+  modes['nat'] = nat
+  return modes
+
+
+def dynFiles(pref, path='.'):
+  '''Function to list the prefix.dynN files (N>0) in q-point order'''
+  files = glob.glob('%s/%s.dyn*'%(path, pref))
+  files = [f for f in files if f.split('.dyn')[-1].isdigit() and int(f.split('.dyn')[-1]) > 0]
+  return sorted(files, key=lambda f: int(f.split('.dyn')[-1]))
+
+
+def readDynSet(pref, path='.', reader=readDyn):
+  '''
+  Function to read all the prefix.dynN files of a phonon calculation and
+  stack the diagonalized q-points: q (nq, 3), freq (nq, 3N),
+  eigvec (nq, 3N, N, 3) and the file index of each q-point, qfile (nq,),
+  together with the header of the first file (reader=phcache.loadDyn reads them through the binary cache)
+  '''
+  dyns = [reader(f) for f in dynFiles(pref, path)]
+  if not dyns:
+    print('Error in readDynSet: No dyn files for %s in %s'%(pref, path))
+    sys.exit()
+  out = {key: val for key, val in dyns[0].items() if key not in ('dynq', 'phi')}
+  for key in ('q', 'freq', 'freq_thz', 'eigvec'):
+    out[key] = np.concatenate([d[key] for d in dyns])
+  out['files'] = dynFiles(pref, path)
+  out['qfile'] = np.repeat(np.arange(len(dyns)), [len(d['q']) for d in dyns])
+  return out
+
+
+if __name__ == "__main__":
+
+  dyn = readDyn(sys.argv[1])
+  print('nat = %i, species = %s'%(dyn['nat'], ', '.join(dyn['species'])))
+  for q, freq in zip(dyn['q'], dyn['freq']):
+    print('q = ( %.6f %.6f %.6f )'%tuple(q))
+    print(' '.join('%.4f'%w for w in freq))
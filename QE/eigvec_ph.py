@@ -1,17 +1,21 @@
-#!/bin/python
+#!/usr/bin/env python3
 
 ###########################################################
 # Script to create the 'pw.x' input file corresponding
 # to a structure distorted due to a soft phonon mode
+# (python eigvec_ph.py PREF PH_DIR AMP)
 ###########################################################
 # Written by Kemal Atalar (May 30, 2019)
 ###########################################################
+# AMP is in Angstrom and converted to the position units of
+# the input (crystal, alat, bohr or angstrom)
+###########################################################
 
-from __future__ import division
-import numpy as np
-import os
 import sys
 
+from phcache import loadDyn
+from pwinput import readPwInput
+
 
 ####### INPUT PARAMETERS & DIRECTORIES ############
 
@@ -27,40 +31,23 @@ amp = float(sys.argv[3])
 ###########################################################
 
 # Read eigenvector from the dyn file
-eigvec = [] # Soft mode eigvec of the dynamical matrix at G
-count = 0
-with open(dyn_f) as file:
-  for line in file:
-    if 'freq' in line.split():
-      if count == 0: freq = float(line.split()[-2])
-      count += 1
-    elif count == 1:
-      splt = line.split()
-      eigvec.append( (float(splt[1]), float(splt[3]), float(splt[5])) )
+# Soft mode eigvec of the dynamical matrix at G
+dyn = loadDyn(dyn_f)
+freq = dyn['freq'][0,0]
+eigvec = dyn['eigvec'][0,0].real
 
 # Modify the SCF input according the eigvec distortion
 scf_f = pref + '.scf.in'
 scf_dist_f = pref + '.dist.scf.in' # SCF file to write distorted coord.
-with open(scf_f,'r') as f:
-  scf_lines = f.readlines()
-
-count_p = 0
-for ind,line in enumerate(scf_lines):
-  splt = line.split()
-  if atom in line[0:2]:
-    pos = (float(splt[1]), float(splt[2]), float(splt[3]))
-    new_pos = np.array(pos) + np.array(eigvec[count_p])*amp
-    scf_lines[ind] = '%s       %.10f     %.10f     %.10f \n'%(atom,new_pos[0],new_pos[1],new_pos[2])
-    count_p += 1
-
-#for line in scf_lines:
-#  if atom in line.split(): print line
-
-with open(scf_dist_f,'w+') as f:
-  f.writelines(scf_lines)
+inp = readPwInput(scf_f)
+mask = inp.speciesMask([atom])
 
 # Checks
 atom_no = float(pref[2:])
-print atom_no
-if len(eigvec) != atom_no: print 'Error: Wrong eigvec length'
-if freq > 0: print 'Warning: Not a soft mode'
+print(atom_no)
+if len(eigvec) != atom_no or mask.sum() != atom_no:
+  print('Error: Wrong eigvec length')
+  sys.exit()
+if freq > 0: print('Warning: Not a soft mode')
+
+inp.write(scf_dist_f, inp.displaced(eigvec*amp, mask))
@@ -1,4 +1,4 @@
-#!/bin/python
+#!/usr/bin/env python3
 
 ###########################################################
 # Script to create the 'pw.x' input file corresponding
@@ -7,76 +7,166 @@
 ###########################################################
 # Written by Kemal Atalar (July 16, 2019)
 ###########################################################
+# Sweeps: the dyn file and the SCF template (pwinput) are
+# read once and all (mode combination x amplitude)
+# structures are displaced in a single broadcast, then
+# written to a directory or a tar file with a manifest.csv
+# (python eigvec_ph_variable.py PREF PH_DIR ELEMENT
+#    [-a AMP ...] [-m 1 2 1+2 1:0.7,2:0.3] [-o DIR|X.tar]
+#    [--species K Ag | --all-atoms])
+# With one amplitude (-a AMP) and one mode and no -o,
+# PREF.dist.scf.in is written as before. Amplitudes are in Angstrom for all
+# position units: they are converted for crystal, alat and
+# bohr inputs (the old line replacement added eigvec*amp in
+# the units of the input, so only angstrom inputs give the
+# same file as before)
+###########################################################
 
-from __future__ import division
-import numpy as np
+import argparse
+import io
 import os
 import sys
+import tarfile
 
+import numpy as np
 
-####### INPUT PARAMETERS & DIRECTORIES ############
-#element = 2 # 1 for Rb, 2 for K, 3 for Na
-element = int(sys.argv[4])
+from phcache import loadDyn
+from pwinput import readPwInput
 
+####### INPUT PARAMETERS & DIRECTORIES ############
 #---- Cases for different materials ------
-if element == 1:
-  atom = 'Rb'; atom_lc = 'rb' # lowercase
-elif element == 2:
-  atom = 'K'; atom_lc = 'k'
-elif element == 3:
-  atom = 'Na'; atom_lc = 'na'
-else:
-  print 'ERROR: Use a valid element number input'
+ATOMS = {1: ('Rb', 'rb'), 2: ('K', 'k'), 3: ('Na', 'na')} # atom, lowercase
 #-----------------------------------------
-
-ph_dir = sys.argv[2] # Phonon directory, e.g. phonons_112
-pref = sys.argv[1] # Prefix, e.g. 'rb20'
-amp = float(sys.argv[3]) # Amplitude of distirtion in Angstroms
-
-dyn_f = '../%s/%s.dyn1'%(ph_dir,pref)
-eigv = 1 # eigenvector of the dynmat to use 
-
-#atom_no = 20
-atom_no = int(pref.split(atom_lc)[1])
-
-debug=False
 ###################################################
 
-# Read eigenvector from the dyn file
-eigvec = [] # Soft mode eigvec of the dynamical matrix at G
-count = 0
-with open(dyn_f) as file:
-  for line in file:
-    if 'freq' in line.split():
-      if count == 0: freq = float(line.split()[-2])
-      count += 1
-    elif count == eigv:
-      splt = line.split()
-      eigvec.append( (float(splt[1]), float(splt[3]), float(splt[5])) )
-
-# Modify the SCF input according the eigvec distortion
-scf_f = pref + '.scf.in'
-scf_dist_f = pref + '.dist.scf.in' # SCF file to write distorted coord.
-with open(scf_f,'r') as f:
-  scf_lines = f.readlines()
-
-count_p = 0
-for ind,line in enumerate(scf_lines):
-  splt = line.split()
-  if (atom in splt) and (len(splt) == 4):
-    pos = (float(splt[1]), float(splt[2]), float(splt[3]))
-    new_pos = np.array(pos) + np.array(eigvec[count_p])*amp
-    scf_lines[ind] = '%s       %.10f     %.10f     %.10f \n'%(atom,new_pos[0],new_pos[1],new_pos[2])
-    count_p += 1
-
-with open(scf_dist_f,'w+') as f:
-  f.writelines(scf_lines)
-
-# Checks
-if debug:
-  for line in scf_lines:
-    if atom in line.split(): print line
-
-if len(eigvec) != atom_no: print 'Error: Wrong eigvec length'
-if freq > 0: print 'Warning: Not a soft mode'
-
+def parseModes(specs):
+  '''
+  Function to turn mode combinations into a coefficient matrix
+
+  INPUT:
+    specs: List of strings: '1' (single mode), '1+2' (equal weights),
+           '1:0.7,2:0.3' (explicit weights); modes are 1-based
+  OUTPUT:
+    (labels, modes, coef): used modes (nmodes,) and coefficients (ncomb, nmodes),
+    each row normalized to unit length
+  '''
+  combs = []
+  for spec in specs:
+    terms = {}
+    for term in spec.replace('+', ',').split(','):
+      mode, _, weight = term.partition(':')
+      terms[int(mode)] = terms.get(int(mode), 0.0) + (float(weight) if weight else 1.0)
+    combs.append(terms)
+  modes = sorted({m for terms in combs for m in terms})
+  coef = np.zeros((len(combs), len(modes)))
+  for k, terms in enumerate(combs):
+    for m, weight in terms.items():
+      coef[k, modes.index(m)] = weight
+  coef /= np.linalg.norm(coef, axis=1)[:,None]
+  labels = [spec.replace(':', '_').replace(',', '+') for spec in specs]
+  return labels, modes, coef
+
+
+def distort(inp, eigvec, coef, amps, mask=None):
+  '''
+  Function to displace the positions for all combinations and amplitudes
+
+  INPUT:
+    inp: SCF template (PwInput)
+    eigvec: Real eigenvectors of the used modes (nmodes, n, 3)
+    coef: Mode coefficients (ncomb, nmodes)
+    amps: Amplitudes (namp,) [Angstrom]
+    mask: Atoms of the eigenvectors (nat,), None for all
+  OUTPUT:
+    Distorted positions (ncomb, namp, nat, 3)
+  '''
+  pattern = np.tensordot(coef, eigvec, axes=1)
+  return inp.displaced(amps[None,:,None,None]*pattern[:,None], mask)
+
+
+def writeSweep(out, pref, texts, labels, amps, freq):
+  '''
+  Function to stream the distorted SCF files into a directory or a tar
+  file, followed by manifest.csv (file, modes, amplitude, freq)
+  '''
+  rows = [(lab, a, f) for lab, f in zip(labels, freq) for a in amps]
+  names = ['%s.dist.m%s.a%+.4f.scf.in'%(pref, lab, a) for lab, a, f in rows]
+  manifest = 'file,modes,amplitude,freq\n'
+  manifest += ''.join('%s,%s,%.6f,%s\n'%(name, lab, a, f) for name, (lab, a, f) in zip(names, rows))
+  files = zip(names + ['manifest.csv'], _chain(texts, manifest))
+
+  if out.endswith('.tar') or out.endswith('.tar.gz'):
+    with tarfile.open(out, 'w:gz' if out.endswith('.gz') else 'w') as tar:
+      for name, text in files:
+        data = text.encode()
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+  else:
+    os.makedirs(out, exist_ok=True)
+    for name, text in files:
+      with open(os.path.join(out, name), 'w') as f:
+        f.write(text)
+  return len(names)
+
+
+def _chain(texts, last):
+  '''Generator of texts followed by last'''
+  yield from texts
+  yield last
+
+
+if __name__ == "__main__":
+
+  argp = argparse.ArgumentParser(description='Distorted pw.x inputs along soft phonon modes')
+  argp.add_argument('pref', help="Prefix, e.g. 'rb20'")
+  argp.add_argument('ph_dir', help='Phonon directory, e.g. phonons_112')
+  argp.add_argument('element', type=int, help='1 for Rb, 2 for K, 3 for Na')
+  argp.add_argument('-a', '--amps', type=float, nargs='+', help='Amplitude(s) of distortion in Angstroms')
+  argp.add_argument('-r', '--amp-range', type=float, nargs=3, metavar=('START', 'STOP', 'NUM'),
+                    help='Evenly spaced amplitudes')
+  argp.add_argument('-m', '--modes', nargs='+', default=['1'], help="Modes (eigenvectors) or combinations, e.g. 1 2 1+2")
+  argp.add_argument('-o', '--out', help='Output directory or .tar/.tar.gz file')
+  argp.add_argument('--species', nargs='+', help='Displaced species (default: the element)')
+  argp.add_argument('--all-atoms', action='store_true', help='Displace all the atoms (full dyn file)')
+  args = argp.parse_args()
+
+  if args.element not in ATOMS:
+    print('ERROR: Use a valid element number input')
+    sys.exit()
+  atom, atom_lc = ATOMS[args.element]
+  atom_no = int(args.pref.split(atom_lc)[1])
+  if args.amp_range:
+    amps = np.linspace(args.amp_range[0], args.amp_range[1], int(args.amp_range[2]))
+  elif args.amps:
+    amps = np.array(args.amps)
+  else:
+    print('ERROR: Give the amplitude(s) with -a or --amp-range')
+    sys.exit()
+
+  # Read the dyn file and the template once
+  dyn = loadDyn('../%s/%s.dyn1'%(args.ph_dir, args.pref))
+  labels, modes, coef = parseModes(args.modes)
+  freq = dyn['freq'][0]
+  eigvec = dyn['eigvec'][0, np.array(modes)-1].real
+  inp = readPwInput(args.pref + '.scf.in')
+  mask = None if args.all_atoms else inp.speciesMask(args.species or [atom])
+
+  # Checks
+  ndisp = inp.nat if mask is None else mask.sum()
+  if dyn['nat'] != ndisp or (mask is not None and not args.species and ndisp != atom_no):
+    print('Error: Wrong eigvec length')
+    sys.exit()
+  for m in modes:
+    if freq[m-1] > 0: print('Warning: Not a soft mode (%i)'%m)
+
+  new_pos = distort(inp, eigvec, coef, amps, mask)
+  texts = inp.texts(new_pos)
+  if args.out is None and new_pos.shape[:2] == (1, 1):
+    with open(args.pref + '.dist.scf.in', 'w+') as f:
+      f.write(next(texts))
+  else:
+    out = args.out or args.pref + '.dist'
+    mfreq = [' '.join('%.4f'%freq[m-1] for m, c in zip(modes, row) if c) for row in coef]
+    nfile = writeSweep(out, args.pref, texts, labels, amps, mfreq)
+    print('%i structures -> %s'%(nfile, out))
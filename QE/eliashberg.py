@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+###########################################################
+# Script to calculate the Eliashberg function a2F(w), the
+# total lambda, omega_log and the Allen-Dynes Tc from the
+# (corrected) lambda_qv and frequencies of all q-points,
+# for every broadening and mu* at once
+# (python eliashberg.py [-d ELPH_DIR] [-u MUSTAR ...])
+###########################################################
+# With normalized q-point weights w_q (star sizes):
+#  a2F(w) = 1/2 sum_qv w_q lambda_qv w_qv delta(w - w_qv)
+#  lambda = sum_qv w_q lambda_qv
+#  w_log  = exp(sum_qv w_q lambda_qv ln(w_qv) / lambda)
+#  w_2    = sqrt(sum_qv w_q lambda_qv w_qv^2 / lambda)
+# The delta is a histogram bin (smear=0) or a Gaussian.
+# Tc: McMillan formula with w_log/1.2 (as lambda.x) and
+# with the f1 f2 corrections of Allen and Dynes (1975)
+###########################################################
+
+import argparse
+import os
+
+import numpy as np
+
+from elph_correct_q import CM2GHZ, findPrefix, loadElphSet
+
+###########################################################
+CM2K = 1.4387769 # cm-1 -> K
+CHUNK = 4096 # Modes per block of the Gaussian a2F sum
+###########################################################
+
+def qWeights(nstar):
+  '''Function to normalize the q-point weights (star sizes)'''
+  nstar = np.asarray(nstar, dtype=float)
+  return nstar/nstar.sum()
+
+
+def allenDynes(lam, wlog, mustar, w2=None):
+  '''
+  Function to calculate Tc, broadcasting over lam, wlog and mustar
+
+  INPUT:
+    lam: Total lambda
+    wlog: omega_log [K]
+    mustar: Coulomb pseudopotential
+    w2: sqrt(<w^2>) [K] for the f1 f2 corrections (None: McMillan form)
+  OUTPUT:
+    Tc [K] (0 where the exponent is not defined)
+  '''
+  lam = np.asarray(lam, dtype=float); mustar = np.asarray(mustar, dtype=float)
+  denom = lam - mustar*(1 + 0.62*lam)
+  ok = denom > 0
+  expo = np.where(ok, -1.04*(1 + lam)/np.where(ok, denom, 1), -np.inf)
+  tc = wlog/1.2*np.exp(expo)
+  if w2 is not None:
+    ratio = w2/wlog
+    lam1 = 2.46*(1 + 3.8*mustar)
+    lam2 = 1.82*(1 + 6.3*mustar)*ratio
+    f1 = np.cbrt(1 + (lam/lam1)**1.5)
+    f2 = 1 + (ratio - 1)*lam**2/(lam**2 + lam2**2)
+    tc = f1*f2*tc
+  return np.where(ok, tc, 0.0)
+
+
+def eliashberg(lambd, freq, weights=None, mustar=0.1, omega=None, smear=0.0):
+  '''
+  Function to integrate the Eliashberg function for all broadenings
+
+  INPUT:
+    lambd: lambda_qv (nq, nsig, nmodes)
+    freq: Frequencies (nq, nmodes) [cm-1], modes with w <= 0 are skipped
+    weights: q-point weights (nq,), None for uniform
+    mustar: Coulomb pseudopotential(s) (nmu,) or scalar
+    omega: Frequency grid of a2F [cm-1] (nw,), None for 500 points up to max(w)
+    smear: Gaussian width [cm-1], 0 for a histogram on the grid
+  OUTPUT:
+    Dictionary with omega (nw,), a2f and lambda_cum (nsig, nw), lambda,
+    wlog, w2 (nsig,) [K], and tc, tc_ad (nsig, nmu) [K]
+  '''
+  nq, nsig, nmodes = lambd.shape
+  weights = np.full(nq, 1/nq) if weights is None else qWeights(weights)
+  mustar = np.atleast_1d(mustar).astype(float)
+
+  # Flatten (q, v) and keep the real, positive modes
+  w = np.asarray(freq, dtype=float).ravel()
+  wl = (np.asarray(lambd)*weights[:,None,None]).transpose(1,0,2).reshape(nsig, -1)
+  keep = w > 0
+  w = w[keep]; wl = wl[:,keep]
+
+  lam = wl.sum(1)
+  safe = np.where(lam != 0, lam, 1)
+  wlog = np.exp(wl @ np.log(w*CM2K)/safe)
+  w2 = np.sqrt(wl @ (w*CM2K)**2/safe)
+
+  # a2F on the grid: contributions 1/2 w_q lambda_qv w_qv
+  if omega is None:
+    omega = np.linspace(0, 1.1*w.max(), 500)
+  dw = omega[1] - omega[0]
+  contrib = 0.5*wl*w
+  if smear > 0:
+    a2f = np.zeros((nsig, len(omega)))
+    for k in range(0, len(w), CHUNK):
+      gauss = np.exp(-0.5*((omega[None,:] - w[k:k+CHUNK,None])/smear)**2)
+      a2f += contrib[:,k:k+CHUNK] @ gauss
+    a2f /= np.sqrt(2*np.pi)*smear
+  else:
+    idx = np.clip(np.rint((w - omega[0])/dw).astype(int), 0, len(omega)-1)
+    a2f = np.zeros((nsig, len(omega)))
+    np.add.at(a2f, (slice(None), idx), contrib/dw)
+  idx = np.searchsorted(omega, w)
+  lam_cum = np.zeros((nsig, len(omega) + 1))
+  np.add.at(lam_cum, (slice(None), idx), wl)
+  lam_cum = np.cumsum(lam_cum, 1)[:,:-1]
+
+  res = {'omega': omega, 'a2f': a2f, 'lambda_cum': lam_cum, 'lambda': lam,
+         'wlog': wlog, 'w2': w2, 'mustar': mustar}
+  res['tc'] = allenDynes(lam[:,None], wlog[:,None], mustar[None,:])
+  res['tc_ad'] = allenDynes(lam[:,None], wlog[:,None], mustar[None,:], w2[:,None])
+  return res
+
+
+def writeA2F(fname, res, degauss):
+  '''Function to write a2F(w) for every broadening, in the columns of alpha2F.dat'''
+  head = 'w [cm-1]  ' + '  '.join('a2F(%.3f Ry)'%d for d in degauss)
+  np.savetxt(fname, np.column_stack([res['omega'], res['a2f'].T]), fmt='%12.6f', header=head)
+
+
+if __name__ == "__main__":
+
+  argp = argparse.ArgumentParser(description='Eliashberg function, lambda, omega_log and Tc')
+  argp.add_argument('-p', '--prefix', help='Prefix of the dyn files (default: found from *.dyn1)')
+  argp.add_argument('-d', '--elph-dir', default='elph_dir_corrected',
+                    help='Directory of the elph.inp_lambda files (default: elph_dir_corrected)')
+  argp.add_argument('-u', '--mustar', type=float, nargs='+', default=[0.1, 0.13, 0.16])
+  argp.add_argument('-s', '--smear', type=float, default=0.0, help='Gaussian width [cm-1] (0: histogram)')
+  argp.add_argument('-n', '--nw', type=int, default=500, help='Points of the a2F grid')
+  argp.add_argument('-o', '--out', default='alpha2F.dat', help='Output file of a2F(w)')
+  args = argp.parse_args()
+
+  pref = args.prefix or findPrefix()
+  elph_dir = args.elph_dir if os.path.isdir(args.elph_dir) else 'elph_dir'
+  data = loadElphSet(pref, elph_dir=elph_dir)
+  freq = data['freq']/CM2GHZ
+  omega = np.linspace(0, 1.1*freq.max(), args.nw)
+  res = eliashberg(data['lambda'], freq, data['nstar'], args.mustar, omega, args.smear)
+
+  degauss = data['elph'][0]['degauss']
+  writeA2F(args.out, res, degauss)
+  print('%i q-points from %s, a2F -> %s'%(len(data['qpts']), elph_dir, args.out))
+  print('%9s %9s %10s %8s %8s %10s'%('degauss', 'lambda', 'wlog [K]', 'mu*', 'Tc [K]', 'Tc_AD [K]'))
+  for isig in range(len(degauss)):
+    for imu, mu in enumerate(res['mustar']):
+      print('%9.3f %9.4f %10.2f %8.3f %8.2f %10.2f'%(degauss[isig], res['lambda'][isig],
+            res['wlog'][isig], mu, res['tc'][isig,imu], res['tc_ad'][isig,imu]))
@@ -1,4 +1,4 @@
-#!/bin/python
+#!/usr/bin/env python3
 
 ###########################################################
 # Script to recalculate lambda_v values from the linewidth
@@ -9,87 +9,123 @@
 ###########################################################
 # Written by Kemal Atalar (Aug 16, 2019)
 ###########################################################
+# All the q-points (prefix.dynN, elph_dir/elph.inp_lambda.N)
+# and broadenings are loaded into (nq, nsig, nmodes) arrays
+# and recalculated together; corrected files are written to
+# OUTDIR/elph.inp_lambda.N
+# (python elph_correct_q.py [-m MODES] [-q QPTS] [-o OUTDIR])
+###########################################################
 
-from __future__ import division
-import numpy as np
-import os
+import argparse
 import glob
-import fileinput
+import os
+import sys
+
+import numpy as np
+
+from dynmat import dynFiles
+from elphlambda import elphLines, writeElph
+from phcache import loadDyn, loadElph
 
 ###########################################################
 # Parameters
 lmbd_mode = [1,2,3,4] # Modes, \nu to recalculate
-		      # (especially for phason modes)
-q_no = 1 # q-pt for the dynamical matrix file
-print_b = False # Printing
+                      # (especially for phason modes)
+# GHz in one Ry, converting gamma/freq^2 (both in GHz) to Ry^-1 in
+# lambda = gamma/(pi N(Ef) freq^2). Value of the original script, kept
+# as is: about 4e-4 below RY_TO_GHZ = 3289841.96 of QE (constants.f90)
+GHZ2RY = 3288463.807502993
+CM2GHZ = 29.9792458
 ###########################################################
 
-# Read frequencies
-freq = []
-freq_GHz = []
-if print_b: 
-  print 'Dyn files'
-  print glob.glob('*.dyn*')
-for f in glob.glob('*.dyn%i'%q_no):
-  i = int(f.split('dyn')[1])
-  if print_b: print i
-  pref = f.split('.')[0]
-  scf_f = pref + '.scf.in'
-  with open(f) as file:
-    for line in file:
-      if 'q' in line.split():
-        qobj = line.split('(')[-1].split(')')[0]
-        q_point = qobj.split()
-      if 'freq' in line.split():
-        w = float(line.split()[-2])
-        freq.append(w) # in cm-1
-        freq_GHz.append(w*29.9792458)
-  if len(freq) != 0: 
-    if print_b: print 'SYSTEM = %s'%pref
-    if print_b: print '   '
-  if freq:
-    if print_b: print 'freq', freq
-    command = 'freq%i = [q_point,freq_GHz]'%i
-    exec(command)
-    if print_b:
-      prnt_command = 'print freq%i'%i
-      exec(prnt_command)
-  freq = []; freq_GHz = []
-
-# Obtain details of system
-#no_atoms = len(freq1[1])
-no_qpoints = len(glob.glob('*.dyn1'))-1
-if print_b: print no_atoms, no_qpoints
-
-# Output format template
-template = "     lambda({0:5d})= {1:7.4f}   gamma={2:8.2f} GHz"
-
-# Read gamma and modify lambda
-lambd = []
-dos_iter = 0; lambd_iter = 0
-for f in glob.glob('elph_dir/elph.inp_lambda.%i'%q_no):
-  i = int(f.split('lambda.')[1])
-  command_freq = 'freq_c = freq%i'%i
-  exec(command_freq)
-  for line in fileinput.input(f):
-    if fileinput.filelineno() == 1: q_pt = line.split()[:3]
-    if 'DOS' in line:
-      if dos_iter > 0:
-        command = 'lambd%i = [q_pt,lambd]'%i
-        exec(command)
-      lambd = []; lambd_iter = 0
-      # Read the value of DOS at Ef
-      nef = float(line.split('=')[1].split()[0])
-      #print 'DOS= %f'%nef
-    if 'lambda(' in line:
-      gamma = float(line.split()[-2]) # linewidth in GHz
-      ghz2ry = 3288463.807502993
-      # Calculate the lambda value
-      lambd_v = gamma*ghz2ry/(np.pi*nef*freq_c[1][lambd_iter]**2)
-      if lambd_iter+1 in lmbd_mode:
-	print template.format(lambd_iter+1,lambd_v,gamma)
-      else:
-	print line[:-1]
-      lambd_iter += 1
+def findPrefix(path='.'):
+  '''Function to find the prefix of the dyn files in a directory'''
+  files = sorted(glob.glob(os.path.join(path, '*.dyn1')))
+  if not files:
+    print('Error in findPrefix: No dyn files in %s'%path)
+    sys.exit()
+  return os.path.basename(files[0])[:-len('.dyn1')]
+
+
+def loadElphSet(pref, path='.', qpts=None, elph_dir='elph_dir'):
+  '''
+  Function to read the frequencies and elph data of all (or the selected)
+  q-points of a run
+
+  OUTPUT:
+    Dictionary with qpts (nq,), nstar (nq,), freq (nq, nmodes) [GHz], the
+    elph dictionaries and the stacked dos (nq, nsig) and gamma, lambda
+    (nq, nsig, nmodes)
+  '''
+  elphs = []; freq = []; nstar = []; found = []
+  for f in dynFiles(pref, path):
+    iq = int(f.split('.dyn')[-1])
+    fel = os.path.join(path, elph_dir, 'elph.inp_lambda.%i'%iq)
+    if (qpts and iq not in qpts) or not os.path.isfile(fel):
+      continue
+    dyn = loadDyn(f)
+    freq.append(dyn['freq'][0]*CM2GHZ)
+    nstar.append(max(len(dyn['dynq']), 1))
+    elphs.append(loadElph(fel))
+    found.append(iq)
+  if not found:
+    print('Error in loadElphSet: No q-points with both dyn and elph files in %s'%path)
+    sys.exit()
+
+  data = {'qpts': np.array(found), 'nstar': np.array(nstar), 'freq': np.array(freq), 'elph': elphs}
+  data['dos'] = np.stack([e['dos'] for e in elphs])
+  data['gamma'] = np.stack([e['gamma'] for e in elphs])
+  data['lambda'] = np.stack([e['lambda'] for e in elphs])
+  return data
+
+
+def correctLambda(gamma, dos, freq, lambd, modes=None):
+  '''
+  Function to recalculate lambda_v = gamma/(pi N(Ef) w^2) for the selected
+  modes of all the q-points and broadenings at once
+
+  INPUT:
+    gamma: Linewidths (nq, nsig, nmodes) [GHz]
+    dos: DOS at Ef (nq, nsig) [states/spin/Ry]
+    freq: Frequencies (nq, nmodes) [GHz]
+    lambd: Original lambdas (nq, nsig, nmodes), kept for the other modes
+    modes: Modes (1-based) to recalculate, None for all
+  OUTPUT:
+    Corrected lambdas (nq, nsig, nmodes)
+  '''
+  denom = np.pi*dos[:,:,None]*freq[:,None,:]**2
+  new = np.divide(gamma*GHZ2RY, denom, out=np.zeros_like(gamma, dtype=float), where=denom != 0)
+  if modes is None:
+    return new
+  sel = np.zeros(gamma.shape[-1], dtype=bool)
+  sel[np.asarray(modes) - 1] = True
+  return np.where(sel, new, lambd)
+
+
+if __name__ == "__main__":
+
+  argp = argparse.ArgumentParser(description='Recalculate lambda_v from the linewidths for all q-points')
+  argp.add_argument('-p', '--prefix', help='Prefix of the dyn files (default: found from *.dyn1)')
+  argp.add_argument('-m', '--modes', type=int, nargs='+', default=lmbd_mode,
+                    help='Modes to recalculate (default: %s)'%' '.join(map(str, lmbd_mode)))
+  argp.add_argument('-a', '--all-modes', action='store_true', help='Recalculate all the modes')
+  argp.add_argument('-q', '--qpts', type=int, nargs='+', help='q-points to process (default: all)')
+  argp.add_argument('-o', '--outdir', default='elph_dir_corrected', help='Directory of the corrected files')
+  argp.add_argument('--stdout', action='store_true', help='Print the corrected files instead')
+  args = argp.parse_args()
+
+  pref = args.prefix or findPrefix()
+  data = loadElphSet(pref, qpts=args.qpts)
+  lambd = correctLambda(data['gamma'], data['dos'], data['freq'], data['lambda'],
+                        None if args.all_modes else args.modes)
+
+  if not args.stdout:
+    os.makedirs(args.outdir, exist_ok=True)
+  for iq, elph, lam in zip(data['qpts'], data['elph'], lambd):
+    out = dict(elph, **{'lambda': lam})
+    if args.stdout:
+      print('\n'.join(elphLines(out)))
     else:
-      print line[:-1]
+      writeElph(os.path.join(args.outdir, 'elph.inp_lambda.%i'%iq), out)
+  if not args.stdout:
+    print('Corrected %i q-points x %i broadenings -> %s'%(lambd.shape[0], lambd.shape[1], args.outdir))
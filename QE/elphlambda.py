@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+###########################################################
+# Script to read and write the electron-phonon files of
+# 'ph.x' (elph_dir/elph.inp_lambda.N) as NumPy arrays
+# (python elphlambda.py FILE)
+###########################################################
+# readElph(fname) returns a dictionary with:
+#  - q: q-point [2pi/alat], w2: squared frequencies [Ry^2]
+#  - degauss [Ry], ngauss, dos [states/spin/Ry], ef [eV]
+#    and ddelta (double delta at Ef) for every broadening
+#  - lambda, gamma [GHz]: arrays of shape (nsig, nmodes)
+###########################################################
+
+import sys
+
+import numpy as np
+
+###########################################################
+# Output formats of elphsum (elphon.f90)
+HEAD_FMT = '%15.8f%15.8f%15.8f%8d%8d'
+BROAD_FMT = "     Gaussian Broadening: %7.3f Ry, ngauss=%4d"
+DOS_FMT = "     DOS =%10.6f states/spin/Ry/Unit Cell at Ef=%10.6f eV"
+DDELTA_FMT = "     double delta at Ef =%10.6f"
+LAMBDA_FMT = "     lambda(%5d)=%8.4f   gamma=%8.2f GHz"
+###########################################################
+
+def readElph(fname):
+  '''Function to read an elph.inp_lambda file'''
+  with open(fname) as f:
+    lines = f.read().splitlines()
+
+  head = lines[0].split()
+  nsig, nmodes = int(head[3]), int(head[4])
+  nw = (nmodes + 5)//6
+  elph = {}
+  elph['q'] = np.array(head[:3], dtype=float)
+  elph['w2'] = np.fromstring(' '.join(lines[1:1+nw]), sep=' ')
+
+  degauss = []; ngauss = []; dos = []; ef = []; ddelta = []
+  lam_lines = []
+  for line in lines[1+nw:]:
+    if 'lambda(' in line:
+      lam_lines.append(line)
+    elif 'Broadening' in line:
+      degauss.append(float(line.split(':')[1].split()[0]))
+      ngauss.append(int(line.split('=')[1]))
+    elif 'DOS' in line:
+      dos.append(float(line.split('=')[1].split()[0]))
+      ef.append(float(line.split('=')[2].split()[0]))
+    elif 'double delta' in line:
+      ddelta.append(float(line.split('=')[1]))
+
+  # Bulk conversion of all the lambda lines
+  text = ' '.join(lam_lines)
+  for word in ('lambda(', ')=', 'gamma=', 'GHz'):
+    text = text.replace(word, ' ')
+  vals = np.fromstring(text, sep=' ').reshape(nsig, nmodes, 3)
+
+  elph['degauss'] = np.array(degauss)
+  elph['ngauss'] = np.array(ngauss, dtype=int)
+  elph['dos'] = np.array(dos)
+  elph['ef'] = np.array(ef)
+  elph['ddelta'] = np.array(ddelta)
+  elph['lambda'] = vals[...,1]
+  elph['gamma'] = vals[...,2]
+
+  return elph
+
+
+def elphLines(elph):
+  '''Function to format an elph dictionary as the lines of elph.inp_lambda'''
+  nsig, nmodes = elph['lambda'].shape
+  out = [HEAD_FMT%(tuple(elph['q']) + (nsig, nmodes))]
+  w2 = elph['w2']
+  for k in range(0, nmodes, 6):
+    out.append(''.join('%14.6E'%w for w in w2[k:k+6]))
+  for isig in range(nsig):
+    out.append(BROAD_FMT%(elph['degauss'][isig], elph['ngauss'][isig]))
+    out.append(DOS_FMT%(elph['dos'][isig], elph['ef'][isig]))
+    if len(elph['ddelta']) == nsig:
+      out.append(DDELTA_FMT%(elph['ddelta'][isig]))
+    out += [LAMBDA_FMT%(nu+1, l, g) for nu, (l, g)
+            in enumerate(zip(elph['lambda'][isig], elph['gamma'][isig]))]
+  return out
+
+
+def writeElph(fname, elph):
+  '''Function to write an elph.inp_lambda file in the format of ph.x'''
+  with open(fname, 'w') as f:
+    f.write('\n'.join(elphLines(elph)) + '\n')
+
+
+if __name__ == "__main__":
+
+  elph = readElph(sys.argv[1])
+  print('q = ( %.6f %.6f %.6f )'%tuple(elph['q']))
+  for isig in range(len(elph['dos'])):
+    print('degauss = %.3f Ry, DOS = %.6f, lambda = %.4f'%(elph['degauss'][isig],
+          elph['dos'][isig], elph['lambda'][isig].sum()))
@@ -1,42 +1,35 @@
-#!/bin/python
+#!/usr/bin/env python3
 
 ###########################################################
-# Script to extract frequencies from 'ph.x' dynamical 
+# Script to extract frequencies from 'ph.x' dynamical
 # matrix output, and print to standard output
 ###########################################################
 # Written by Kemal Atalar (Aug 18, 2019)
 ###########################################################
 
-from __future__ import division
-import numpy as np
-import os
 import glob
 
+from phcache import loadDyn, loadModes
+
 # Choose files including frequency info
-asr = int(raw_input('ASR corrected/not for dynamical matrix? (1/0)'))
+asr = int(input('ASR corrected/not for dynamical matrix? (1/0)'))
 
 if asr == 1:
   dyn_file = 'dynmat.out'
 elif asr == 0:
   dyn_file = '*.dyn*'
 else:
-  print 'ERROR: Wrong input, put 1 or 0'
+  print('ERROR: Wrong input, put 1 or 0')
 
-# Get frequencies
-freq = []
-for f in glob.glob(dyn_file):
+# Get frequencies (dyn0 only holds the q-point grid)
+for f in sorted(glob.glob(dyn_file)):
+  if f.endswith('.dyn0'):
+    continue
   pref = f.split('.')[0]
-  scf_f = pref + '.scf.in'
-  with open(f) as file:
-    for line in file:
-      if 'q' in line.split():
-        q_point = line
-      if 'freq' in line.split():
-        freq.append(float(line.split()[-2]))
-  if len(freq) != 0: 
-    print 'SYSTEM = %s'%pref
-    print q_point
+  dyn = loadModes(f) if asr == 1 else loadDyn(f)
+  for q_point, freq in zip(dyn['q'], dyn['freq']):
+    print('SYSTEM = %s'%pref)
+    print('     q = ( %.9f %.9f %.9f ) '%tuple(q_point))
     for ind,w in enumerate(freq):
-      print 'freq (%i) = %f [cm-1], %e [Hartree]'%(ind+1,w,w*4.5563e-6)
-    print '   '
-  freq = []
+      print('freq (%i) = %f [cm-1], %e [Hartree]'%(ind+1,w,w*4.5563e-6))
+    print('   ')
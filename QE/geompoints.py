@@ -3,61 +3,58 @@
 ###########################################################
 # Script to extract positions after a geometry relaxation
 # calculation by "pw.x" from the output
-# (python geompoints.py >> SCFFILE)
+# (python geompoints.py [OUTPUT] [-s STEP] [-t TRAJ] >> SCFFILE)
 ###########################################################
 # Written by Kemal Atalar (May 30, 2019)
 ###########################################################
+# All the ionic steps are read with pwtraj.readTrajectory;
+# the last one (or -s STEP) is printed, and -t also saves
+# the whole trajectory as a binary .npz file
+###########################################################
 
-import numpy as np
+import argparse
 import os
 
-cwd = os.getcwd()
-#appr = 78
-appr = int(cwd.split('_atom')[0].split('/')[-1])
-
-#file_n = '%i_atom/geom_ideal_stricter/rb%i.geom.out'%(appr, appr)
-file_n = 'rb%i.geom.out'%(appr)
-
-pos=[]; latt=[]
-with open(file_n) as f:
-    count=0
-    # Get atom positions
-    for ind,line in enumerate(f):
-        if 'Rb' in line[0:2]:
-            if 'Rb' == line.split()[0]:
-                pos.append(line.split()[1:])
-        # Get latt parameters
-        if 'CELL_PARAMETERS' in line.split():
-            alat = line.split()[-1].split(')')[0]
-            count+=1
-        else: 
-            if count > 0:
-                latt.append(line.split())
-                count += 1
-        if count == 4:
-            count = 0
-
-alat_bohr = float(alat)
-alat = float(alat)*0.529
-latt_par = np.array(latt[-3:]).astype(float)
-pos_A = np.array(pos[-appr:]).astype(float)
-
-pos_scaled = np.zeros(np.shape(pos_A))
-for ind_r,row in enumerate(pos_A):
-    for ind_c,col in enumerate(row):
-        pos_scaled[ind_r,ind_c] = col/(alat*latt_par[ind_c,ind_c])
-
-print 'alat=%f'%alat
-print 'Cell_parameters (Angstrom)'
-for i in latt_par:
-    print i[0]*alat,i[1]*alat,i[2]*alat
-print 'Cell_parameters (a.u.)'
-for i in latt_par:
-    print i[0]*alat_bohr,i[1]*alat_bohr,i[2]*alat_bohr
-print 'Atom positions (scaled)'
+from pwtraj import BOHR_A, readTrajectory, saveTrajectory
+
+argp = argparse.ArgumentParser(description='Positions and cell of a pw.x relaxation')
+argp.add_argument('file_n', nargs='?', help='pw.x output (default: rbN.geom.out of the N_atom directory)')
+argp.add_argument('-s', '--step', type=int, default=-1, help='Ionic step (default: last)')
+argp.add_argument('-t', '--traj', help='Save all the steps to this .npz file')
+args = argp.parse_args()
+
+if args.file_n:
+    file_n = args.file_n
+else:
+    cwd = os.getcwd()
+    #appr = 78
+    appr = int(cwd.split('_atom')[0].split('/')[-1])
+
+    #file_n = '%i_atom/geom_ideal_stricter/rb%i.geom.out'%(appr, appr)
+    file_n = 'rb%i.geom.out'%(appr)
+
+traj = readTrajectory(file_n)
+if args.traj:
+    saveTrajectory(args.traj, traj)
+
+alat_bohr = traj['alat']
+alat = alat_bohr*BOHR_A
+latt_A = traj['cell'][args.step]
+pos_A = traj['pos'][args.step]
+pos_scaled = traj['frac'][args.step]
+names = [traj['species'][t] for t in traj['ityp']]
+
+print('alat=%f'%alat)
+print('Cell_parameters (Angstrom)')
+for i in latt_A:
+    print(i[0],i[1],i[2])
+print('Cell_parameters (a.u.)')
+for i in latt_A/BOHR_A:
+    print(i[0],i[1],i[2])
+print('Atom positions (scaled)')
 for i in pos_scaled:
-    print i[0],i[1],i[2]
-print 'Atom positions (Angstrom)'
-for i in pos_A:
-    print 'Rb', i[0],i[1],i[2]
-print 'ibrav= 6, celldm(1) =%f, celldm(3) = %f'%(alat_bohr*latt_par[0][0],latt_par[2][2]/latt_par[1][1])
+    print(i[0],i[1],i[2])
+print('Atom positions (Angstrom)')
+for name, i in zip(names, pos_A):
+    print(name, i[0],i[1],i[2])
+print('ibrav= 6, celldm(1) =%f, celldm(3) = %f'%(latt_A[0][0]/BOHR_A,latt_A[2][2]/latt_A[1][1]))
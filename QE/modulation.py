@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+###########################################################
+# Script to create the 'pw.x' input of a supercell modulated
+# by phonon modes at a commensurate q (CDW distortions)
+# (python modulation.py PREF DYN -d N1 N2 N3 [-q IQ]
+#    [-m 1 2] [-a AMP ...] [--zpa] [-p PHASE ...]
+#    [--species Rb ...] [-o OUT])
+###########################################################
+# The displacement of atom k in the cell R of the supercell
+# is, for each mode nu with eigenvector e (dyn file, mass
+# weighted and complex):
+#   u_k(R) = A Re[e_k exp(i(2pi q.R + phase))]/sqrt(m_k)
+# evaluated for all atoms and images at once. A is fixed by
+# the amplitude, either in Angstrom (rms displacement per
+# primitive cell, sqrt(sum |u|^2/ncell) = amp, which is the
+# plain eigvec*amp of eigvec_ph.py for q = 0 and equal
+# masses) or in units of the zero-point amplitude of the
+# mode (--zpa: mass-weighted norm sqrt(hbar/(2 omega))).
+# The default phase maximizes the real pattern.
+###########################################################
+
+import argparse
+import sys
+
+import numpy as np
+
+from phcache import loadDyn
+from pwinput import latticeVectors, readPwInput, supercellImages
+
+###########################################################
+# Zero-point amplitude sqrt(hbar/(2 m omega)) [Angstrom] for
+# m = 1 amu and omega = 1 cm-1
+HBAR = 1.054571817e-34 # J s
+AMU_KG = 1.66053906660e-27
+C_CM = 2.99792458e10 # cm/s
+ZPA = np.sqrt(HBAR/(2*AMU_KG*2*np.pi*C_CM))*1e10
+###########################################################
+
+def qCrystal(dyn, q):
+  '''q-points [2pi/alat] (..., 3) in crystal coordinates of the dyn lattice'''
+  basis = dyn['basis'] if 'basis' in dyn else latticeVectors(dyn['ibrav'], dyn['celldm'][:3])
+  return np.asarray(q) @ basis.T
+
+
+def isCommensurate(qc, dims, tol=1e-4):
+  '''Whether the crystal q (3,) is commensurate with the supercell dims'''
+  x = np.asarray(qc)*np.asarray(dims)
+  return bool(np.all(np.abs(x - np.round(x)) < tol))
+
+
+def bestPhase(eigvec, mass, qc, images):
+  '''
+  Phases maximizing the norm of the real patterns Re[c exp(i phase)],
+  -arg(sum c^2)/2, for the modes eigvec (nmodes, nat, 3) divided by
+  sqrt(mass) as in modulation
+  '''
+  vec = eigvec/np.sqrt(mass)[None,:,None]
+  ph = np.exp(2j*np.pi*(images @ qc))
+  s = np.einsum('mka,mka->m', vec, vec)*np.sum(ph**2)
+  return -np.angle(s)/2
+
+
+def modulation(eigvec, mass, qc, images, phase=0.0):
+  '''
+  Function to build the real supercell displacement patterns
+
+  INPUT:
+    eigvec: Complex mass-weighted eigenvectors (nmodes, nat, 3)
+    mass: Masses of the atoms (nat,) [amu]
+    qc: q-point in crystal coordinates (3,)
+    images: Lattice translations of the cells (ncell, 3) [crystal]
+    phase: Phase of each mode (nmodes,) or scalar [rad]
+  OUTPUT:
+    Patterns Re[e_k exp(i(2pi q.R + phase))]/sqrt(m_k) (nmodes, nat, ncell, 3)
+  '''
+  phase = np.broadcast_to(np.asarray(phase, dtype=float), (len(eigvec),))
+  ph = np.exp(1j*(2*np.pi*(images @ qc)[None,:] + phase[:,None])) # (nmodes, ncell)
+  vec = eigvec/np.sqrt(mass)[None,:,None]
+  return (vec[:,:,None,:]*ph[:,None,:,None]).real
+
+
+def scaleModes(patterns, mass, amps, freq=None):
+  '''
+  Function to scale the patterns to their amplitudes
+
+  INPUT:
+    patterns: Output of modulation (nmodes, nat, ncell, 3)
+    amps: Amplitudes (nmodes,) [Angstrom], or in zero-point units if freq is given
+    freq: Frequencies of the modes (nmodes,) [cm-1] (imaginary ones as negative)
+  OUTPUT:
+    Total displacements (nat, ncell, 3) [Angstrom]
+  '''
+  amps = np.asarray(amps, dtype=float)
+  ncell = patterns.shape[2]
+  if freq is None:
+    norm = np.sqrt(np.sum(patterns**2, axis=(1,2,3))/ncell)
+  else:
+    # Mass-weighted norm sqrt(sum m|u|^2) = sqrt(hbar/(2 omega))
+    wnorm = np.sqrt(np.einsum('mkca,k->m', patterns**2, mass))
+    norm = wnorm*np.sqrt(np.abs(freq))/ZPA
+  if np.any(norm == 0):
+    print('Error in scaleModes: Zero pattern (try another phase)')
+    sys.exit()
+  return np.tensordot(amps/norm, patterns, axes=1)
+
+
+if __name__ == "__main__":
+
+  argp = argparse.ArgumentParser(description='Supercell modulated by phonon modes at a commensurate q')
+  argp.add_argument('pref', help="Prefix of the scf input (PREF.scf.in)")
+  argp.add_argument('dyn', help='Dynamical matrix file (PREF.dynN)')
+  argp.add_argument('-d', '--dims', type=int, nargs=3, required=True, help='Supercell N1 N2 N3')
+  argp.add_argument('-q', '--iq', type=int, default=0, help='q-point of the dyn file (default: 0, the first)')
+  argp.add_argument('-m', '--modes', type=int, nargs='+', default=[1], help='Modes (default: 1)')
+  argp.add_argument('-a', '--amps', type=float, nargs='+', default=[0.05],
+                    help='Amplitude of each mode [Angstrom, or zero-point units with --zpa]')
+  argp.add_argument('--zpa', action='store_true', help='Amplitudes in units of the zero-point amplitude')
+  argp.add_argument('-p', '--phase', type=float, nargs='+', help='Phase of each mode [deg] (default: maximal pattern)')
+  argp.add_argument('--species', nargs='+', help='Species of the dyn atoms when it has fewer atoms than the input')
+  argp.add_argument('-o', '--out', help='Output (default: PREF.mod.scf.in)')
+  args = argp.parse_args()
+
+  dyn = loadDyn(args.dyn)
+  inp = readPwInput(args.pref + '.scf.in')
+  modes = np.array(args.modes) - 1
+  amps = np.broadcast_to(args.amps, modes.shape)
+  if args.species:
+    mask = inp.speciesMask(args.species)
+  elif dyn['nat'] == inp.nat:
+    mask = None
+  else:
+    print('Error: dyn and scf atoms differ, give --species')
+    sys.exit()
+  if (inp.nat if mask is None else mask.sum()) != dyn['nat']:
+    print('Error: Wrong eigvec length')
+    sys.exit()
+
+  dims = np.array(args.dims)
+  qc = qCrystal(dyn, dyn['q'][args.iq])
+  if not isCommensurate(qc, dims):
+    print('Error: q = (%.4f %.4f %.4f) not commensurate with %ix%ix%i'%(*qc, *dims))
+    sys.exit()
+  images = supercellImages(dims)
+  eigvec = dyn['eigvec'][args.iq, modes]
+  mass = dyn['mass'][dyn['ityp']]
+  freq = dyn['freq'][args.iq, modes]
+  phase = np.radians(args.phase) if args.phase else bestPhase(eigvec, mass, qc, images)
+
+  patterns = modulation(eigvec, mass, qc, images, phase)
+  disp = scaleModes(patterns, mass, amps, freq if args.zpa else None)
+
+  sup = inp.supercell(dims)
+  smask = None if mask is None else np.repeat(mask, len(images))
+  out = args.out or args.pref + '.mod.scf.in'
+  sup.write(out, sup.displaced(disp.reshape(-1, 3), smask))
+  print('q = (%.4f %.4f %.4f), %i atoms, max displacement %.4f A -> %s'%(*qc, sup.nat,
+        np.sqrt((disp**2).sum(-1)).max(), out))
+  for m, f, a in zip(modes, freq, amps):
+    print('  mode %i: %10.3f cm-1, amplitude %g%s'%(m+1, f, a, ' zpa' if args.zpa else ' A'))
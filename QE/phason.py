@@ -1,8 +1,8 @@
-#!/bin/python
+#!/usr/bin/env python3
 
 ###########################################################
 # Script to determine phason modes from the 'ph.x' output
-# (python phason.py)
+# (python phason.py [-e ELEMENT] [-n TOP] [-o CSV])
 ###########################################################
 # If standard deviation is zero along x&y but non-zero
 # along z, it hints for a phason mode in the host-guest
@@ -10,75 +10,171 @@
 ###########################################################
 # Written by Kemal Atalar (Aug 18, 2019)
 ###########################################################
+# All the modes of all the q-points (prefix.dynN) are
+# scored at once:
+#  - acoustic: overlap with the acoustic (ASR corrected)
+#    eigenvectors of dynmat.out, or rigid translations
+#  - rigidity of the guest and host sublattices, i.e.
+#    |sum_i e_i|^2/(n sum_i |e_i|^2) (1: rigid sliding)
+#  - phason: both sublattices rigid, but not acoustic
+# and the modes are ranked by their phason score
+###########################################################
 
-from __future__ import division
-import numpy as np
+import argparse
+import glob
 import os
 import sys
-import glob
+
+import numpy as np
+
+from dynmat import readDynSet
+from phcache import loadDyn, loadModes
 
 ###########################################################
 ####### INPUT PARAMETERS & DIRECTORIES ####################
 ###########################################################
 
-element = 2 # 1 for Rb, 2 for K, 3 for Na
-
 #---- Cases for different materials ------
-if element == 1:
-  atom = 'Rb'; atom_lc = 'rb' # lowercase
-elif element == 2:
-  atom = 'K'; atom_lc = 'k'
-elif element == 3:
-  atom = 'Na'; atom_lc = 'na'
-else:
-  print 'ERROR: Use a valid element number input'
+ATOMS = {1: ('Rb', 'rb'), 2: ('K', 'k'), 3: ('Na', 'na')} # atom, lowercase
 #-----------------------------------------
-
-#pref = sys.argv[1] # Prefix, e.g. 'rb20'
-pref = glob.glob('*.dyn1')[0].split('.')[0]
-atom_no = int(pref.split(atom_lc)[1])
-dyn_f = '%s.dyn1'%(pref)
 dyn_asr_f = 'dynmat.out'
-eigv = 6 # eigenvector of the dynmat to use 
-
-debug=False
+ACOUSTIC_MIN = 0.9 # Overlap with the acoustic modes
+PHASON_MIN = 0.8 # Phason score
 ##########################################################
 
-# Read eigenvector from the dyn file
-eigvec = []
-eig_asr = []
-
-# Read ASR applied eigenvectors
-count = 0
-with open(dyn_f) as f:
-  eig_sub = []
-  for line in f:
-    if 'freq' in line.split():
-      if count != 0 and count <= eigv: eigvec.append(np.array(eig_sub))
-      eig_sub = []
-      count += 1
-    elif count > 0 and count <= atom_no:
-      splt = line.split()
-      eig_sub.append( [float(splt[1]), float(splt[3]), float(splt[5])] )
-
-if debug: print ' ----- First eigvec: \n', eigvec[0]
-if debug: print ' ----- First eigvec (ASR): \n', eig_asr[0]
-
-# Look at the eigvectors and try to identify the phason
-for ind, vec in enumerate(eigvec):
-
-  if debug:
-    if ind==0: print vec
-
-  print ' ---- Eigvec(%i)'%(ind+1)
-
-  # Method 1: Standard deviation and mean of eigvec
-  av_xyz = np.mean(vec,axis=0) # averages over columns
-  std_xyz = np.std(vec,axis=0)
-  print 'Average std along axes:  %.5f  %.5f  %.5f '%(std_xyz[0],std_xyz[1],std_xyz[2])
-'''
-  # Method 2: Comparison to ASR aplied eigvec
-  for ind_a, vec_asr in enumerate(eig_asr):
-    diff = np.sum((vec-vec_asr)**2.0)/len(vec)
-    print ' * Diff to eig_asr(%i) is   %.5f'%(ind_a+1, diff)
-'''
+def realGauge(eigvec):
+  '''
+  Function to fix the arbitrary phase of complex eigenvectors (..., nat, 3)
+  so that their largest component is real, and return the real part
+  '''
+  flat = eigvec.reshape(eigvec.shape[:-2] + (-1,))
+  big = np.take_along_axis(flat, np.abs(flat).argmax(-1)[...,None], -1)
+  phase = np.exp(-1j*np.angle(big))
+  return (flat*phase).real.reshape(eigvec.shape)
+
+
+def sublatticeStats(vec, mask):
+  '''
+  Function to calculate the statistics of the displacements of a sublattice
+
+  INPUT:
+    vec: Real eigenvectors (..., nat, 3)
+    mask: Atoms of the sublattice (nat,)
+  OUTPUT:
+    (mean, std, rigid, weight): mean and std along x, y, z (..., 3),
+    rigidity and fraction of |e|^2 on the sublattice (...)
+  '''
+  sub = vec[...,mask,:]
+  n = max(mask.sum(), 1)
+  mean = sub.sum(-2)/n
+  std = np.sqrt(np.maximum((sub**2).sum(-2)/n - mean**2, 0))
+  norm2 = (sub**2).sum((-2,-1))
+  total = (vec**2).sum((-2,-1))
+  rigid = np.divide(n*(mean**2).sum(-1), norm2, out=np.zeros_like(norm2), where=norm2 > 1e-12)
+  weight = np.divide(norm2, total, out=np.zeros_like(norm2), where=total > 0)
+  return mean, std, rigid, weight
+
+
+def acousticReference(nat, asr_f=None):
+  '''
+  Function to get the acoustic eigenvectors (3, nat, 3): the three lowest
+  modes at Gamma of the ASR corrected dynmat.out, or rigid translations
+  '''
+  if asr_f and os.path.isfile(asr_f):
+    modes = loadModes(asr_f)
+    if modes['nat'] == nat:
+      iq = np.linalg.norm(modes['q'], axis=1).argmin()
+      low = np.argsort(np.abs(modes['freq'][iq]))[:3]
+      return np.array(modes['eigvec'][iq, low])
+    print('Warning: %s has %i atoms instead of %i, using rigid translations'%(asr_f, modes['nat'], nat))
+  ref = np.zeros((3, nat, 3))
+  for k in range(3):
+    ref[k,:,k] = 1/np.sqrt(nat)
+  return ref
+
+
+def classifyModes(eigvec, guest, ref):
+  '''
+  Function to score all the modes of all the q-points
+
+  INPUT:
+    eigvec: Complex eigenvectors (nq, nmodes, nat, 3)
+    guest: Guest atoms (nat,)
+    ref: Acoustic eigenvectors (nref, nat, 3)
+  OUTPUT:
+    Dictionary of (nq, nmodes) arrays: acoustic, best_ref, rigid_guest,
+    rigid_host, guest_weight, phason, cls (0 acoustic, 1 phason, 2 optical),
+    and the guest mean, std (nq, nmodes, 3)
+  '''
+  nq, nmodes, nat, _ = eigvec.shape
+  vec = eigvec/np.linalg.norm(eigvec.reshape(nq, nmodes, -1), axis=-1)[...,None,None]
+  ref = ref/np.linalg.norm(ref.reshape(len(ref), -1), axis=-1)[:,None,None]
+
+  # Overlaps with the acoustic modes as one batched product
+  ovl = np.abs(vec.reshape(nq, nmodes, -1) @ ref.reshape(len(ref), -1).conj().T)**2
+  res = {'acoustic': ovl.sum(-1), 'best_ref': ovl.argmax(-1)}
+
+  real = realGauge(vec)
+  mean, std, res['rigid_guest'], res['guest_weight'] = sublatticeStats(real, guest)
+  res['guest_mean'] = mean; res['guest_std'] = std
+  if (~guest).any():
+    res['rigid_host'] = sublatticeStats(real, ~guest)[2]
+  else:
+    res['rigid_host'] = np.ones_like(res['rigid_guest']) # Guest only dyn files
+
+  res['phason'] = res['rigid_guest']*res['rigid_host']*(1 - np.minimum(res['acoustic'], 1))
+  res['cls'] = np.where(res['acoustic'] >= ACOUSTIC_MIN, 0, np.where(res['phason'] >= PHASON_MIN, 1, 2))
+  return res
+
+
+def rankModes(res):
+  '''Function to order all the (q, mode) pairs by decreasing phason score'''
+  order = np.argsort(-res['phason'], axis=None, kind='stable')
+  return np.unravel_index(order, res['phason'].shape)
+
+
+if __name__ == "__main__":
+
+  argp = argparse.ArgumentParser(description='Classify the modes of all q-points as acoustic, phason or optical')
+  argp.add_argument('-e', '--element', type=int, default=2, help='Guest: 1 for Rb, 2 for K, 3 for Na')
+  argp.add_argument('-p', '--prefix', help='Prefix of the dyn files (default: found from *.dyn1)')
+  argp.add_argument('-n', '--top', type=int, default=20, help='Rows of the ranked table (0: all)')
+  argp.add_argument('-o', '--csv', help='Write the full ranked table to a CSV file')
+  args = argp.parse_args()
+
+  if args.element not in ATOMS:
+    print('ERROR: Use a valid element number input')
+    sys.exit()
+  atom = ATOMS[args.element][0]
+  pref = args.prefix or glob.glob('*.dyn1')[0].split('.')[0]
+
+  dyn = readDynSet(pref, reader=loadDyn)
+  guest = np.array([dyn['species'][t] == atom for t in dyn['ityp']])
+  if not guest.any():
+    print('Warning: No %s atoms in %s, all atoms taken as guest'%(atom, pref))
+    guest[:] = True
+  ref = acousticReference(dyn['nat'], dyn_asr_f)
+  res = classifyModes(dyn['eigvec'], guest, ref)
+
+  names = ['acoustic', 'phason', 'optical']
+  head = 'rank,file,q,mode,freq,class,phason,acoustic,ref,rigid_guest,rigid_host,guest_weight,std_x,std_y,std_z'
+  rows = []
+  for rank, (iq, nu) in enumerate(zip(*rankModes(res))):
+    std = res['guest_std'][iq, nu]
+    rows.append((rank+1, os.path.basename(dyn['files'][dyn['qfile'][iq]]),
+                 ' '.join('%.4f'%x for x in dyn['q'][iq]), nu+1, dyn['freq'][iq, nu], names[res['cls'][iq, nu]],
+                 res['phason'][iq, nu], res['acoustic'][iq, nu], res['best_ref'][iq, nu]+1,
+                 res['rigid_guest'][iq, nu], res['rigid_host'][iq, nu], res['guest_weight'][iq, nu],
+                 std[0], std[1], std[2]))
+
+  print('%4s %-12s %-26s %4s %10s %-8s %7s %7s %7s %7s  %s'%('rank', 'file', 'q', 'mode', 'freq[cm-1]',
+        'class', 'phason', 'acoust', 'rig_g', 'rig_h', 'std x y z (guest)'))
+  for row in rows[:args.top or len(rows)]:
+    print('%4i %-12s %-26s %4i %10.4f %-8s %7.4f %7.4f %7.4f %7.4f  %.5f %.5f %.5f'%(row[:8] + row[9:11] + row[12:]))
+  print('acoustic: %i, phason: %i, optical: %i'%tuple((res['cls'] == k).sum() for k in range(3)))
+
+  if args.csv:
+    with open(args.csv, 'w') as f:
+      f.write(head + '\n')
+      for row in rows:
+        f.write(','.join(str(v) for v in row) + '\n')
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+###########################################################
+# Script to scan a tree of phonon run directories (one per
+# composition, e.g. rb20, k36, na78) and collect their
+# frequencies, elph lambdas and ph.x timings in one go
+# (python phbatch.py ROOT [-o OUTPREF] [-j NPROC])
+###########################################################
+# Directories are parsed in parallel with a process pool
+# (dyn and elph files through the phcache binary cache)
+# and the results are merged into columnar NumPy arrays,
+# written as OUTPREF.npz and one CSV file per table:
+#  - freq:   dir, q, mode, freq [cm-1]
+#  - elph:   dir, q, sigma, degauss, dos, mode, lambda, gamma
+#  - timing: dir, file, q, irreps, iterations, secs/iter...
+###########################################################
+
+import argparse
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from phcache import loadDyn, loadElph
+from phtime import parsePhOutput
+
+###########################################################
+# Columns of the output tables
+COLUMNS = {
+  'freq': ['dir', 'q', 'mode', 'freq'],
+  'elph': ['dir', 'q', 'sigma', 'degauss', 'dos', 'mode', 'lambda', 'gamma'],
+  'timing': ['dir', 'file', 'q', 'nirreps', 'irreps_done', 'iterations',
+             'sec_per_iter', 'precalc', 'est_time', 'finished', 'cores', 'npool', 'nspace'],
+}
+###########################################################
+
+def _qIndex(fname, sep):
+  '''q-point number from the end of a file name, e.g. rb20.dyn3'''
+  try:
+    return int(fname.split(sep)[-1])
+  except ValueError:
+    return -1
+
+
+def isRunDir(path, files):
+  '''Function to check whether a directory holds phonon data'''
+  return any('.dyn' in f or '.ph' in f or '.elph' in f for f in files) \
+         or os.path.isdir(os.path.join(path, 'elph_dir'))
+
+
+def scanDirectory(path):
+  '''
+  Function to parse all the phonon data of a single run directory into
+  column lists (executed in the worker processes)
+  '''
+  tab = {key: {col: [] for col in cols} for key, cols in COLUMNS.items()}
+
+  # Frequencies from the dyn files
+  for f in sorted(glob.glob(os.path.join(path, '*.dyn*'))):
+    q = _qIndex(f, 'dyn')
+    if q < 1:
+      continue # dyn0 holds only the q-point grid
+    freq = loadDyn(f)['freq'].ravel().tolist()
+    t = tab['freq']
+    t['dir'] += [path]*len(freq); t['q'] += [q]*len(freq)
+    t['mode'] += list(range(1, len(freq)+1)); t['freq'] += freq
+
+  # Linewidths and lambdas from the elph files
+  for f in sorted(glob.glob(os.path.join(path, 'elph_dir', 'elph.inp_lambda.*'))):
+    q = _qIndex(f, '.')
+    t = tab['elph']
+    elph = loadElph(f)
+    for isig in range(len(elph['dos'])):
+      n = elph['lambda'].shape[1]
+      t['dir'] += [path]*n; t['q'] += [q]*n; t['sigma'] += [isig+1]*n
+      t['degauss'] += [float(elph['degauss'][isig])]*n; t['dos'] += [float(elph['dos'][isig])]*n
+      t['mode'] += list(range(1, n+1))
+      t['lambda'] += elph['lambda'][isig].tolist(); t['gamma'] += elph['gamma'][isig].tolist()
+
+  # Timings from the ph.x outputs
+  outs = glob.glob(os.path.join(path, '*.ph*out*')) + glob.glob(os.path.join(path, '*.elph*out*'))
+  for f in sorted(set(outs)):
+    run = parsePhOutput(f)
+    t = tab['timing']
+    for qt in run.qpoints:
+      t['dir'].append(path); t['file'].append(os.path.basename(f)); t['q'].append(qt.q)
+      t['nirreps'].append(qt.nirreps); t['irreps_done'].append(qt.irreps_done)
+      t['iterations'].append(qt.iterations); t['sec_per_iter'].append(qt.sec_per_iter)
+      t['precalc'].append(qt.precalc); t['est_time'].append(qt.est_time)
+      t['finished'].append(qt.finished); t['cores'].append(run.cores)
+      t['npool'].append(run.npool); t['nspace'].append(run.nspace)
+
+  return tab
+
+
+def findRunDirs(root):
+  '''Function to list all the run directories below root'''
+  dirs = []
+  for path, subdirs, files in os.walk(root):
+    subdirs[:] = [d for d in subdirs if d != 'elph_dir' and not d.startswith('_ph')]
+    if isRunDir(path, files):
+      dirs.append(path)
+  return sorted(dirs)
+
+
+def mergeTables(tabs):
+  '''Function to merge the per-directory columns into arrays'''
+  merged = {}
+  for key, cols in COLUMNS.items():
+    merged[key] = {}
+    for col in cols:
+      values = [v for tab in tabs for v in tab[key][col]]
+      merged[key][col] = np.array(values) if values else np.zeros(0)
+  return merged
+
+
+def scanTree(root, nproc=None):
+  '''
+  Function to parse all the run directories below root in parallel
+
+  OUTPUT:
+    Dictionary of tables ('freq', 'elph', 'timing'), each a dictionary of
+    column arrays
+  '''
+  dirs = findRunDirs(root)
+  with ProcessPoolExecutor(max_workers=nproc) as pool:
+    tabs = list(pool.map(scanDirectory, dirs, chunksize=max(1, len(dirs)//64)))
+  return mergeTables(tabs)
+
+
+def writeTables(tables, outpref):
+  '''Function to write the tables as OUTPREF.npz and OUTPREF_TABLE.csv'''
+  np.savez(outpref + '.npz', **{'%s.%s'%(key, col): arr
+                                for key, tab in tables.items() for col, arr in tab.items()})
+  for key, tab in tables.items():
+    cols = COLUMNS[key]
+    with open('%s_%s.csv'%(outpref, key), 'w') as f:
+      f.write(','.join(cols) + '\n')
+      for row in zip(*[tab[col] for col in cols]):
+        f.write(','.join(str(v) for v in row) + '\n')
+
+
+if __name__ == "__main__":
+
+  argp = argparse.ArgumentParser(description='Parse many phonon run directories in parallel')
+  argp.add_argument('root', nargs='?', default='.', help='Top directory of the runs')
+  argp.add_argument('-o', '--outpref', default='phbatch', help='Prefix of the output files')
+  argp.add_argument('-j', '--nproc', type=int, default=None, help='Number of processes')
+  args = argp.parse_args()
+
+  tables = scanTree(args.root, args.nproc)
+  writeTables(tables, args.outpref)
+  for key, tab in tables.items():
+    print('%-7s %i rows'%(key, len(tab[COLUMNS[key][0]])))
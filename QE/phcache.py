@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+###########################################################
+# Script to keep parsed phonon data (dyn and elph files)
+# in a binary cache, so that repeated analyses skip the
+# text parsing (python phcache.py [DIR] [--clear])
+###########################################################
+# Every parsed file is stored next to it, in .phcache/,
+# as one .npy file per array (loaded memory-mapped) plus a
+# key.json with the path, size and mtime of the source:
+#   rb20.dyn3 -> .phcache/rb20.dyn3.dyn/{key.json,*.npy}
+# An entry is re-parsed as soon as the source changes.
+# Each cache directory is bounded (PHCACHE_MAX_MB, default
+# 1024 MB); least recently used entries are evicted first.
+# PHCACHE=0 disables the cache.
+###########################################################
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from dynmat import readDyn, readModes
+from elphlambda import readElph
+
+###########################################################
+CACHE_DIR = '.phcache'
+MAX_BYTES = int(float(os.environ.get('PHCACHE_MAX_MB', 1024))*2**20)
+ENABLED = os.environ.get('PHCACHE', '1') != '0'
+###########################################################
+
+def _sourceKey(fname):
+  '''Identity of a source file: absolute path, size and mtime'''
+  st = os.stat(fname)
+  return {'path': os.path.abspath(fname), 'size': st.st_size, 'mtime': st.st_mtime_ns}
+
+
+def _entryDir(fname, tag):
+  '''Cache entry of a source file for a given reader tag'''
+  path = os.path.abspath(fname)
+  return os.path.join(os.path.dirname(path), CACHE_DIR, '%s.%s'%(os.path.basename(path), tag))
+
+
+def _store(entry, key, data):
+  '''Function to write an entry: arrays as .npy, everything else in key.json'''
+  root = os.path.dirname(entry)
+  os.makedirs(root, exist_ok=True)
+  tmp = tempfile.mkdtemp(dir=root, prefix='.tmp')
+  values = {}
+  try:
+    for name, val in data.items():
+      if isinstance(val, np.ndarray) and val.dtype != object:
+        np.save(os.path.join(tmp, name + '.npy'), val)
+      else:
+        values[name] = val.tolist() if isinstance(val, np.generic) else val
+    with open(os.path.join(tmp, 'key.json'), 'w') as f:
+      json.dump({'key': key, 'values': values}, f)
+    shutil.rmtree(entry, ignore_errors=True)
+    os.rename(tmp, entry)
+  except BaseException:
+    shutil.rmtree(tmp, ignore_errors=True)
+    raise
+
+
+def _load(entry, key, mmap):
+  '''Function to load an entry, or None if it is missing or stale'''
+  meta = os.path.join(entry, 'key.json')
+  try:
+    with open(meta) as f:
+      head = json.load(f)
+    if head['key'] != key:
+      return None
+    data = dict(head['values'])
+    for name in os.listdir(entry):
+      if name.endswith('.npy'):
+        data[name[:-4]] = np.load(os.path.join(entry, name), mmap_mode='r' if mmap else None)
+    os.utime(meta) # Mark as recently used
+  except (OSError, ValueError, KeyError):
+    return None
+  return data
+
+
+def _entrySize(entry):
+  '''Size of an entry in bytes'''
+  return sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+
+
+def evictCache(root, max_bytes=MAX_BYTES):
+  '''
+  Function to bound the size of a cache directory, removing the least
+  recently used entries first
+
+  OUTPUT:
+    Number of removed entries
+  '''
+  entries = []
+  for name in os.listdir(root):
+    entry = os.path.join(root, name)
+    try:
+      entries.append((os.path.getmtime(os.path.join(entry, 'key.json')), _entrySize(entry), entry))
+    except OSError:
+      continue # Entry being written by another process
+  total = sum(e[1] for e in entries)
+  nrem = 0
+  for used, size, entry in sorted(entries):
+    if total <= max_bytes:
+      break
+    shutil.rmtree(entry, ignore_errors=True)
+    total -= size
+    nrem += 1
+  return nrem
+
+
+def cachedRead(fname, reader, tag=None, mmap=True):
+  '''
+  Function to read a file through the cache
+
+  INPUT:
+    fname: Source file
+    reader: Parser returning a dictionary of arrays (and plain values)
+    tag: Name of the entry, to cache several readers of the same file
+    mmap: Load the cached arrays memory-mapped (read-only)
+  OUTPUT:
+    Dictionary returned by reader(fname), or its cached copy
+  '''
+  if not ENABLED:
+    return reader(fname)
+  tag = tag or reader.__name__
+  key = _sourceKey(fname)
+  entry = _entryDir(fname, tag)
+  data = _load(entry, key, mmap)
+  if data is not None:
+    return data
+
+  data = reader(fname)
+  try:
+    _store(entry, key, data)
+    evictCache(os.path.dirname(entry))
+  except OSError:
+    pass # Read-only run directory: keep working without a cache
+  return data
+
+
+def loadDyn(fname, mmap=True):
+  '''Function to read a dyn file through the cache (see dynmat.readDyn)'''
+  return cachedRead(fname, readDyn, 'dyn', mmap)
+
+
+def loadModes(fname, mmap=True):
+  '''Function to read only the modes (e.g. of dynmat.out) through the cache (see dynmat.readModes)'''
+  return cachedRead(fname, readModes, 'modes', mmap)
+
+
+def loadElph(fname, mmap=True):
+  '''Function to read an elph.inp_lambda file through the cache (see elphlambda.readElph)'''
+  return cachedRead(fname, readElph, 'elph', mmap)
+
+
+if __name__ == "__main__":
+
+  argp = argparse.ArgumentParser(description='List or clear the cache of a run directory')
+  argp.add_argument('dir', nargs='?', default='.', help='Run directory')
+  argp.add_argument('--clear', action='store_true', help='Remove the cache')
+  args = argp.parse_args()
+
+  root = os.path.join(args.dir, CACHE_DIR)
+  if not os.path.isdir(root):
+    print('No cache in %s'%root)
+    sys.exit()
+  for name in sorted(os.listdir(root)):
+    entry = os.path.join(root, name)
+    if os.path.isdir(entry):
+      print('%-40s %10.1f kB'%(name, _entrySize(entry)/1024))
+  if args.clear:
+    shutil.rmtree(root)
+    print('Removed %s'%root)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+###########################################################
+# Script to keep the progress of many ph.x/elph runs in a
+# SQLite database, updated incrementally
+# (python phdb.py update [ROOTS or outputs] [--db FILE])
+# (python phdb.py summary [--db FILE])
+# (python phdb.py query "SELECT ..." [--db FILE])
+###########################################################
+# Every output is followed with phtime.PhFollower, whose
+# state (file offset, inode, hash of the head and the
+# counters of the parser) is stored in plain columns of
+# runs, so each update only parses the bytes appended
+# since the previous one. Tables:
+#  - runs:     output file, dir, cores, npool, nspace,
+#              nqpoints, nat, k-grid, offset, resume state
+#  - qpoints:  per run and q: irreps done/total, iterations,
+#              seconds, precalc, status (running, finished,
+#              mismatch: finished with irreps != nirreps)
+#  - irreps:   per run, q and irrep: iterations, seconds
+#  - qtimes:   view joining qpoints and runs, with
+#              sec_per_iter and iter_per_rep
+###########################################################
+
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import time
+
+import numpy as np
+
+from phtime import IRREP_DTYPE, PhFollower, QTime, readKgrid
+
+###########################################################
+DB_FILE = 'phdb.sqlite'
+OUT_GLOBS = ('*.ph*out*', '*.elph*out*')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+  id INTEGER PRIMARY KEY, fname TEXT UNIQUE, dir TEXT,
+  cores INTEGER, npool INTEGER, nspace INTEGER, nqpoints INTEGER,
+  nat INTEGER, k1 INTEGER, k2 INTEGER, k3 INTEGER,
+  offset INTEGER, updated REAL,
+  ino INTEGER, nhead INTEGER, hhash TEXT, rest BLOB, nirreps INTEGER,
+  sec_bef REAL, iter_bef INTEGER, irr_no INTEGER, irr_iter INTEGER, irr_secs REAL,
+  cur_q INTEGER, cur_nirreps INTEGER, cur_done INTEGER, cur_iter INTEGER,
+  cur_nsec INTEGER, cur_secs REAL, cur_precalc REAL, cur_finished INTEGER);
+CREATE TABLE IF NOT EXISTS qpoints (
+  run INTEGER, q INTEGER, nirreps INTEGER, irreps_done INTEGER,
+  iterations INTEGER, nsec INTEGER, seconds REAL, precalc REAL, status TEXT,
+  PRIMARY KEY (run, q));
+CREATE TABLE IF NOT EXISTS irreps (
+  run INTEGER, q INTEGER, irrep INTEGER, iterations INTEGER, seconds REAL,
+  PRIMARY KEY (run, q, irrep));
+CREATE VIEW IF NOT EXISTS qtimes AS
+  SELECT r.dir, r.fname, r.cores, r.npool, r.nspace, r.nat, r.k1, r.k2, r.k3,
+         q.q, q.nirreps, q.irreps_done, q.iterations, q.status, q.precalc,
+         q.seconds/q.nsec AS sec_per_iter,
+         CAST(q.iterations AS REAL)/q.irreps_done AS iter_per_rep
+  FROM qpoints q JOIN runs r ON q.run = r.id WHERE q.nsec > 0;
+'''
+# Resume state of a PhFollower in the runs table
+FOLLOWER_COLS = ('offset', 'ino', 'nhead', 'hhash')
+PARSER_COLS = ('rest', 'nirreps', 'sec_bef', 'iter_bef', 'irr_no', 'irr_iter', 'irr_secs')
+QTIME_COLS = ('cur_q', 'cur_nirreps', 'cur_done', 'cur_iter', 'cur_nsec', 'cur_secs',
+              'cur_precalc', 'cur_finished')
+STATE_COLS = FOLLOWER_COLS + PARSER_COLS + QTIME_COLS
+###########################################################
+
+def openDB(fname=DB_FILE):
+  '''Function to open (and create) the progress database'''
+  con = sqlite3.connect(fname)
+  con.executescript(SCHEMA)
+  return con
+
+
+def readSystem(path):
+  '''Function to read nat and the k-grid from the scf input of a run directory'''
+  nat = -1; kgrid = [-1]*3
+  scf = sorted(glob.glob(os.path.join(path, '*scf.in')))
+  if scf:
+    kg = readKgrid(scf[0])
+    kgrid = [int(k) if k.isdigit() else -1 for k in kg]
+    with open(scf[0]) as f:
+      m = re.search(r'\bnat\s*=\s*(\d+)', f.read(), re.IGNORECASE)
+    if m: nat = int(m.group(1))
+  return nat, kgrid
+
+
+def findOutputs(paths):
+  '''Function to list the ph.x outputs given directly or found below directories'''
+  files = []
+  for path in paths:
+    if os.path.isfile(path):
+      files.append(path)
+      continue
+    for root, subdirs, names in os.walk(path):
+      subdirs[:] = [d for d in subdirs if not d.startswith('_ph') and not d.startswith('.')]
+      found = set(f for pat in OUT_GLOBS for f in glob.glob(os.path.join(root, pat)))
+      files += sorted(found)
+  return [os.path.abspath(f) for f in files]
+
+
+def _qStatus(qt):
+  if not qt.finished:
+    return 'running'
+  return 'finished' if qt.irreps_done == qt.nirreps else 'mismatch'
+
+
+def saveState(fol):
+  '''Function to list the values of STATE_COLS of a PhFollower'''
+  parser = fol.parser; qt = parser.qt
+  state = [getattr(fol, c) for c in FOLLOWER_COLS] + [getattr(parser, c) for c in PARSER_COLS]
+  if qt is None:
+    return state + [None]*len(QTIME_COLS)
+  return state + [qt.q, qt.nirreps, qt.irreps_done, qt.iterations, qt.nsec, qt.seconds,
+                  qt.precalc, int(qt.finished)]
+
+
+def loadFollower(con, run_id, fname):
+  '''
+  Function to rebuild the PhFollower of a run from its resume state, with
+  the run info of runs and the irreps of the current q-point already done
+  '''
+  row = con.execute('SELECT cores, npool, nspace, nqpoints, %s FROM runs WHERE id = ?'
+                    %', '.join(STATE_COLS), (run_id,)).fetchone()
+  fol = PhFollower(fname)
+  state = dict(zip(STATE_COLS, row[4:]))
+  if state['ino'] is None: # Nothing read yet
+    return fol
+  run = fol.parser.run
+  run.cores, run.npool, run.nspace, run.nqpoints = row[:4]
+  for c in FOLLOWER_COLS:
+    setattr(fol, c, state[c])
+  for c in PARSER_COLS:
+    setattr(fol.parser, c, state[c])
+  if state['cur_q'] is None:
+    return fol
+
+  qt = fol.parser.qt = QTime(*(state[c] for c in QTIME_COLS[:-1]), finished=bool(state['cur_finished']))
+  if qt.finished:
+    run.qpoints.append(qt)
+  irr_no = fol.parser.irr_no
+  done = con.execute('SELECT q, irrep, iterations, seconds FROM irreps WHERE run = ? AND q = ? '
+                     'AND (? = 0 OR irrep < ?) ORDER BY irrep', (run_id, qt.q, irr_no, irr_no)).fetchall()
+  if done:
+    fol.parser.irr_done.append(np.array(done, IRREP_DTYPE))
+  return fol
+
+
+def updateRun(con, fname):
+  '''
+  Function to ingest the new part of a ph.x output
+
+  OUTPUT:
+    Number of bytes parsed
+  '''
+  row = con.execute('SELECT id FROM runs WHERE fname = ?', (fname,)).fetchone()
+  if row is None:
+    fol = PhFollower(fname)
+    nat, kgrid = readSystem(os.path.dirname(fname))
+    cur = con.execute('INSERT INTO runs (fname, dir, nat, k1, k2, k3, offset) VALUES (?,?,?,?,?,?,0)',
+                      (fname, os.path.dirname(fname), nat, *kgrid))
+    run_id = cur.lastrowid
+  else:
+    run_id = row[0]
+    fol = loadFollower(con, run_id, fname)
+
+  # q-points from the one in progress at the previous update onwards
+  q_from = fol.parser.qt.q if fol.parser.qt is not None else 0
+  offset = fol.offset
+  if not fol.update():
+    return 0
+  if fol.resets: # Restarted job: everything is re-read
+    q_from = 0; offset = 0
+
+  parser = fol.parser; run = parser.run
+  qpts = [qt for qt in run.qpoints if qt.q >= q_from]
+  if parser.qt is not None and not parser.qt.finished and parser.qt.nsec > 0:
+    qpts.append(parser.qt)
+  irreps = parser.irrepTable()
+  irreps = irreps[irreps['q'] >= q_from]
+
+  con.execute('DELETE FROM qpoints WHERE run = ? AND q >= ?', (run_id, q_from))
+  con.execute('DELETE FROM irreps WHERE run = ? AND q >= ?', (run_id, q_from))
+  con.executemany('INSERT INTO qpoints VALUES (?,?,?,?,?,?,?,?,?)',
+                  [(run_id, qt.q, qt.nirreps, qt.irreps_done, qt.iterations, qt.nsec,
+                    qt.seconds, qt.precalc, _qStatus(qt)) for qt in qpts])
+  con.executemany('INSERT INTO irreps VALUES (?,?,?,?,?)',
+                  [(run_id, int(q), int(i), int(n), float(s)) for q, i, n, s in irreps])
+  con.execute('UPDATE runs SET cores=?, npool=?, nspace=?, nqpoints=?, updated=?, %s WHERE id=?'
+              %', '.join('%s=?'%c for c in STATE_COLS),
+              (run.cores, run.npool, run.nspace, run.nqpoints, time.time(), *saveState(fol), run_id))
+  return fol.offset - offset
+
+
+def updateDB(con, paths):
+  '''Function to update the database from all the outputs below paths'''
+  nbytes = 0
+  files = findOutputs(paths)
+  for fname in files:
+    with con:
+      nbytes += updateRun(con, fname)
+  return len(files), nbytes
+
+
+def printSummary(con):
+  '''Print the throughput of all the runs grouped by cores, pools and k-grid'''
+  rows = con.execute('''
+    SELECT cores, npool, nspace, nat, k1||'x'||k2||'x'||k3, COUNT(*), AVG(sec_per_iter),
+           AVG(iter_per_rep), SUM(status = 'running'), SUM(status = 'mismatch')
+    FROM qtimes GROUP BY cores, npool, nspace, nat, k1, k2, k3 ORDER BY nat, cores''').fetchall()
+  print('%6s %6s %6s %5s %10s %7s %10s %10s %8s %8s'%('cores', 'npool', 'nspace', 'nat', 'k-grid',
+        'q-pts', 's/iter', 'iter/rep', 'running', 'mismatch'))
+  for cores, npool, nspace, nat, kgrid, nq, spi, ipr, nrun, nmis in rows:
+    print('%6i %6i %6i %5i %10s %7i %10.2f %10.2f %8i %8i'%(cores, npool, nspace, nat, kgrid, nq,
+          spi or 0, ipr or 0, nrun, nmis))
+
+
+if __name__ == "__main__":
+
+  argp = argparse.ArgumentParser(description='Incremental progress database of ph.x runs')
+  argp.add_argument('command', choices=['update', 'summary', 'query'])
+  argp.add_argument('args', nargs='*', help='update: run directories or outputs (default: .), query: SQL')
+  argp.add_argument('--db', default=DB_FILE, help='Database file (default: %s)'%DB_FILE)
+  args = argp.parse_args()
+
+  con = openDB(args.db)
+  if args.command == 'update':
+    nfile, nbytes = updateDB(con, args.args or ['.'])
+    print('%i outputs, %.1f MB parsed -> %s'%(nfile, nbytes/2**20, args.db))
+  elif args.command == 'summary':
+    printSummary(con)
+  else:
+    cur = con.execute(' '.join(args.args))
+    print('\t'.join(d[0] for d in cur.description))
+    for row in cur:
+      print('\t'.join(str(v) for v in row))
+  con.close()
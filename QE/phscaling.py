@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+###########################################################
+# Script to analyze the parallel efficiency of ph.x runs
+# from the timing records of the progress database (phdb)
+# and to recommend the pools (-npool/-nk) for a new system
+# (python phscaling.py [--db FILE] [--update ROOTS ...]
+#    [--nat N --kgrid K1 K2 K3 --cores P])
+###########################################################
+# Cost model for the seconds per iteration, fitted with
+# least squares on the logarithms:
+#  ln T = c0 + a ln(nat) + b ln(nk) - g ln(cores)
+#       + d ln(nspace) + e ln(nspace)^2 + h ln(imbalance)
+# with nk the number of k-points of the scf grid, nspace
+# the cores per pool (R & G division) and imbalance the
+# load imbalance ceil(nk/npool)*npool/nk of the pools.
+# Features that do not vary among the runs are left out.
+# Strong scaling: efficiency T1*p1/(T*p) of the runs of the
+# same system (nat, k-grid) relative to the fewest cores;
+# weak scaling: the same for the time per work nat^a nk^b
+###########################################################
+
+import argparse
+
+import numpy as np
+
+from phdb import DB_FILE, openDB, updateDB
+
+###########################################################
+FEATURES = ['const', 'ln_nat', 'ln_nk', 'ln_cores', 'ln_nspace', 'ln_nspace2', 'ln_imbalance']
+###########################################################
+
+def readRecords(con):
+  '''
+  Function to read the timing records of the q-points with converged
+  irreps, averaged per run
+
+  OUTPUT:
+    Dictionary of arrays: nat, nk, cores, npool, nspace, sec_per_iter, nq
+  '''
+  rows = con.execute('''
+    SELECT nat, k1*k2*k3, cores, npool, nspace, AVG(sec_per_iter), COUNT(*)
+    FROM qtimes WHERE irreps_done > 0 AND sec_per_iter > 0 AND cores > 0
+    GROUP BY fname''').fetchall()
+  names = ['nat', 'nk', 'cores', 'npool', 'nspace', 'sec_per_iter', 'nq']
+  arr = np.array(rows, dtype=float).reshape(-1, len(names))
+  rec = {name: arr[:,k] for k, name in enumerate(names)}
+  # Missing parallelization info: a single pool
+  rec['npool'] = np.where(rec['npool'] > 0, rec['npool'], 1)
+  rec['nspace'] = np.where(rec['nspace'] > 0, rec['nspace'], rec['cores']/rec['npool'])
+  return rec
+
+
+def features(nat, nk, cores, npool, nspace=None):
+  '''
+  Function to build the design matrix of the cost model (n, len(FEATURES)),
+  with the cores per pool nspace (default cores/npool, i.e. no -nd/-nt)
+  '''
+  if nspace is None:
+    nspace = np.asarray(cores, dtype=float)/np.asarray(npool, dtype=float)
+  nat, nk, cores, npool, nspace = np.broadcast_arrays(*[np.asarray(x, dtype=float)
+                                                       for x in (nat, nk, cores, npool, nspace)])
+  lns = np.log(nspace)
+  nk_safe = np.where(nk > 0, nk, 1)
+  imbalance = np.ceil(nk_safe/npool)*npool/nk_safe
+  return np.stack([np.ones_like(lns), np.log(np.maximum(nat, 1)), np.log(nk_safe), -np.log(cores),
+                   lns, lns**2, np.log(imbalance)], axis=-1)
+
+
+def fitCostModel(rec):
+  '''
+  Function to fit the cost model to the records
+
+  OUTPUT:
+    (coef, used, rms): coefficients (len(FEATURES),) with 0 for the features
+    left out, mask of the used features and rms error of ln T
+  '''
+  X = features(rec['nat'], rec['nk'], rec['cores'], rec['npool'], rec['nspace'])
+  y = np.log(rec['sec_per_iter'])
+  used = np.ptp(X, axis=0) > 1e-12
+  used[0] = True
+  # No more parameters than (distinct) records
+  nmax = len(np.unique(X, axis=0))
+  for k in np.flatnonzero(used)[::-1]:
+    if used.sum() <= nmax:
+      break
+    used[k] = False
+  coef = np.zeros(len(FEATURES))
+  coef[used] = np.linalg.lstsq(X[:,used], y, rcond=None)[0]
+  rms = np.sqrt(np.mean((X @ coef - y)**2)) if len(y) else np.nan
+  return coef, used, rms
+
+
+def predict(coef, nat, nk, cores, npool, nspace=None):
+  '''Function to predict the seconds per iteration'''
+  return np.exp(features(nat, nk, cores, npool, nspace) @ coef)
+
+
+def scalingTable(rec, coef):
+  '''
+  Function to calculate the strong and weak scaling efficiencies
+
+  OUTPUT:
+    Dictionary of arrays (one entry per run, sorted by system and cores):
+    nat, nk, cores, npool, sec_per_iter, speedup, strong, weak
+  '''
+  order = np.lexsort((rec['cores'], rec['nk'], rec['nat']))
+  tab = {key: rec[key][order] for key in ('nat', 'nk', 'cores', 'npool', 'nspace', 'sec_per_iter')}
+  T, p = tab['sec_per_iter'], tab['cores']
+  # Strong scaling within each system
+  system = np.unique(np.stack([tab['nat'], tab['nk']], 1), axis=0, return_inverse=True)[1].ravel()
+  first = np.zeros(system.max() + 1 if len(system) else 0, dtype=int)
+  first[system[::-1]] = np.arange(len(system))[::-1] # Fewest cores of each system
+  ref = first[system]
+  tab['speedup'] = T[ref]/T
+  tab['strong'] = T[ref]*p[ref]/(T*p)
+  # Weak scaling: time per core and unit of work, relative to the fewest cores overall
+  work = np.exp(coef[1]*np.log(np.maximum(tab['nat'], 1)) + coef[2]*np.log(np.maximum(tab['nk'], 1)))
+  tw = T*p/work
+  tab['weak'] = tw[np.argmin(p)]/tw if len(p) else tw
+  return tab
+
+
+def recommendPools(coef, nat, nk, cores, nks=None):
+  '''
+  Function to rank the pool divisions of a number of cores for a new system
+
+  INPUT:
+    nat, nk: Atoms and k-points of the scf grid
+    cores: Number of cores
+    nks: Upper limit of the pools (k-points of the run, default nk)
+  OUTPUT:
+    List of (npool, nspace, predicted sec/iter) sorted by the prediction
+  '''
+  nks = nks or nk
+  npool = np.array([n for n in range(1, cores+1) if cores % n == 0 and n <= nks])
+  T = predict(coef, nat, nk, cores, npool)
+  order = np.argsort(T)
+  return [(int(npool[k]), cores//int(npool[k]), float(T[k])) for k in order]
+
+
+if __name__ == "__main__":
+
+  argp = argparse.ArgumentParser(description='Parallel efficiency and pool recommendation for ph.x')
+  argp.add_argument('--db', default=DB_FILE, help='Progress database (default: %s)'%DB_FILE)
+  argp.add_argument('--update', nargs='+', metavar='ROOT', help='Update the database from these runs first')
+  argp.add_argument('--nat', type=int, help='Atoms of the new system')
+  argp.add_argument('--kgrid', type=int, nargs=3, help='scf k-grid of the new system')
+  argp.add_argument('--cores', type=int, help='Cores of the new run')
+  args = argp.parse_args()
+
+  con = openDB(args.db)
+  if args.update:
+    updateDB(con, args.update)
+  rec = readRecords(con)
+  con.close()
+  if len(rec['cores']) == 0:
+    print('No timing records in %s (run phdb.py update first)'%args.db)
+    raise SystemExit
+
+  coef, used, rms = fitCostModel(rec)
+  print('Cost model from %i runs (rms error of ln T = %.3f):'%(len(rec['cores']), rms))
+  print('  ' + '  '.join('%s=%.3f'%(name, c) for name, c, u in zip(FEATURES, coef, used) if u))
+
+  tab = scalingTable(rec, coef)
+  print('%5s %8s %6s %6s %6s %10s %8s %8s %8s'%('nat', 'nk', 'cores', 'npool', 'nspace', 's/iter',
+        'speedup', 'strong', 'weak'))
+  for row in zip(*[tab[k] for k in ('nat', 'nk', 'cores', 'npool', 'nspace', 'sec_per_iter',
+                                    'speedup', 'strong', 'weak')]):
+    print('%5i %8i %6i %6i %6i %10.2f %8.2f %8.2f %8.2f'%row)
+
+  if args.nat and args.kgrid and args.cores:
+    nk = int(np.prod(args.kgrid))
+    ranked = recommendPools(coef, args.nat, nk, args.cores)
+    print('Pools for nat=%i, k-grid=%ix%ix%i, %i cores:'%(args.nat, *args.kgrid, args.cores))
+    print('%6s %6s %12s %14s'%('npool', 'nspace', 's/iter', 'core-h/1000it'))
+    for npool, nspace, T in ranked[:5]:
+      print('%6i %6i %12.2f %14.2f'%(npool, nspace, T, T*args.cores*1000/3600))
+    print('Recommended: -npool %i (-nk %i)'%(ranked[0][0], ranked[0][0]))
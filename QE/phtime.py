@@ -1,143 +1,481 @@
-#!/bin/python
+#!/usr/bin/env python3
 
 ###########################################################
-# Script to read the details of time taken for a 'ph.x' 
+# Script to read the details of time taken for a 'ph.x'
 # calculation, separated for different q-points
-# (python phtime.py)
+# (python phtime.py [ph.x outputs])
+# (python phtime.py --follow [ph.x outputs] for running jobs)
+###########################################################
+# The output is read in large binary blocks and only the
+# lines starting with the relevant keywords are matched,
+# so multi-GB elph outputs are parsed in a single pass.
+# Timings are returned as a list of QTime records and a
+# structured array of irreps (IRREP_DTYPE). In follow mode
+# only the bytes appended since the last poll are parsed and
+# the ETA of the current q-point and of the run are updated
 ###########################################################
 # Written by Kemal Atalar (Aug 6, 2019)
 ###########################################################
 
-from __future__ import division
-import numpy as np
-import os
+import argparse
 import glob
+import hashlib
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
 
 ###########################################################
-# Find the phonon or electron-phonon output file in the current directory
-if not glob.glob('*.ph*out*'):
-  file_n =  glob.glob('*.elph*out*')[-1]
-else:
-  file_n =  glob.glob('*.ph*out*')[0]
-print file_n
-
-scf_f = glob.glob('*scf.in')[0]
-pref = scf_f.split('.')[0]
-
-rep_no = -1; core_no = -1,
-nspace = -1; npool = -1
-switch = 1
+BLOCK = 1 << 24 # Bytes read at once (16 MB)
+HEAD = 512 # First bytes compared to detect a file rewritten in place
+
+# Lines used from the ph.x output
+LINE_RE = re.compile(
+  rb' +(?:'
+  rb'iter # *(?P<iter>\d+) total cpu time : *(?P<secs>[0-9.]+)'
+  rb'|(?P<comp>Computing dynamical matrix)'
+  rb'|(?P<diag>Diagonalizing the dynamical matrix)'
+  rb'|There are +(?P<nirr>\d+) irreducible'
+  rb'|PHONON +: *(?P<cpu>\S+(?: \S+)*) +CPU +(?P<wall>\S+(?: \S+)*) +WALL'
+  rb'|Parallel version.*running on +(?P<cores>\d+) processor'
+  rb'|R & G space division:.*= +(?P<nspace>\d+)'
+  rb'|K-points division: +npool += +(?P<npool>\d+)'
+  rb'|\( *(?P<nqs>\d+) q-points\)'
+  rb')')
+# First letters (columns 6-8) of the lines above other than the iterations
+KEYS = np.frombuffer(b'ComDiaThePHOParR &K-p', np.uint8).reshape(-1,3)
+QLIST = ord('(') # Column 6 of the line with the number of q-points
+
+# Fixed format of the iteration lines (solve_linter.f90):
+# (/,5x," iter # ",i3," total cpu time :",f8.1," secs   av.it.: ",f5.1)
+ITER_MARK = (11, ord('#')); ITER_SEP = (32, ord(':')); ITER_DOT = 39
+ITER_COLS = np.array([13,14,15, 33,34,35,36,37,38, 40])
+
+# Iterations and time of every irrep of every q-point
+IRREP_DTYPE = np.dtype([('q','i4'), ('irrep','i4'), ('iterations','i4'), ('seconds','f8')])
 ###########################################################
 
-# Read k-grid points from scf input
-with open(scf_f) as ff:
-  k_ind = -1
-  for ind,line in enumerate(ff):
-    if 'K_POINTS' in line.split():
-      k_ind = ind+1
-    if ind == k_ind:
-      kgrid = line.split()[:3]
-
-# Read info and times from ph output
-with open(file_n) as f:
-  count_sec = 0; count_iter = 0
-  total_sec = 0; total_iter = 0
-  count_q = -1
-  iter_bef = 0
-
-  for line in f:
-    # Read data
-    if 'irreducible' in line.split():
-      rep_no = int(line.split('irreducible')[0].split()[-1])
-    if 'processors' in line.split():
-      core_no = int(line.split('processors')[0].split()[-1])
-    if 'space' in line.split():
-      nspace = int(line.split()[-1])
-    if 'K-points' in line.split():
-      npool = int(line.split()[-1])
-
-    # Initial representations
-    if 'PHONON' == line[5:11] and switch == 1:
-      switch = 0
-      # CPU time
-      rep_cpu = line.split(':')[1].split('CPU')[0]
-      # Wall time
-      rep_wall = line.split('CPU')[1].split('WALL')[0]
-
-      print '    '
-      print 'INFO ---- System: %s'%(pref)
-      print '     -- scf k-grid = %sx%sx%s'%(kgrid[0],kgrid[1],kgrid[2])
-      print '     -- no. of irreps = %i'%(rep_no)
-      print '     -- no. of cores = %i'%(core_no)
-      print '     -- no. of pools (k-point paral.) = %i'%(npool)
-      print '     -- no. of cores for space paral. = %i'%(nspace)
-
-      print 'TIME'
-      print ' -- Time taken for deciding irreps ='
-      print '%s CPU, %s WALL'%(rep_cpu, rep_wall)
-
-    # Iterations
-    if ('secs' in line.split()) and ('iter' in line.split()):
-      count_sec += 1
-
-      # Time taken per iteration
-      secs = float(line.split(':')[1].split()[0])
-      if count_sec != 1:
-        sec_diff = secs - sec_bef
-        total_sec += sec_diff
-      elif count_q > 0:
-	sec_diff = secs - sec_bef
-        print ' -- Time for precalculations (q%i) = %f secs'%(count_q, sec_diff)
-      else: print ' -- Time for precalculations (q%i) = %f secs'%(count_q, secs)
-      sec_bef = secs
-
-      # Iterations
-      iter = int(line.split()[2])
-      if iter < iter_bef:
-        count_iter += 1
-        total_iter += iter_bef
-	'''
-        if count_iter == rep_no:
-          it_per_rep = total_iter/count_iter
-          print ' -- Iterations per rep (q%i) = %f'%(count_q,it_per_rep)
-          count_iter = 0; total_iter = 0
-	'''
-      iter_bef = iter
-
-    # Calculate and reset when a q point is finished
-    if 'Computing' in line.split():
-      if count_q > -1: # After the first q calculation ends
-	# Check if correct no of irreps are calculated
-        if count_iter != rep_no-1:
-	  print 'Error: no match for rep_no (%i != %i)'%(count_iter,rep_no-1)
-
-        # Iterations per irrep
-        it_per_rep = (total_iter+iter_bef)/(count_iter+1)
-        print ' -- Iterations per rep (q%i) = %f'%(count_q,it_per_rep)
-
-	# Time taken per iteration
-        sec_per_iter = total_sec/count_sec
-	print ' -- Seconds per iteration (q%i) = %f secs'%(count_q,sec_per_iter)
-        tot_time = sec_per_iter*it_per_rep*rep_no
-	print ' -- Estimated total time for q%i = %f secs'%(count_q,tot_time)
-	print '  (without initial irrep time)   = %f min'%(tot_time/60)
-	print '                                 = %f hr'%(tot_time/3600)
-        print '    '
-
-      # Reset
-      iter_bef = 0 # To prevent counting of this iter into next q point
-      count_iter = 0; total_iter = 0
-      count_sec = 0; total_sec = 0
-      count_q += 1
-
-  # Calculate the average for next q point if the calculation is not finished yet
-  if count_iter < rep_no and count_iter != 0:
-    it_per_rep = total_iter/count_iter
-    print ' -- Iterations per rep (q%i) upto %i reps = %f'%(count_q,count_iter,it_per_rep)
-    sec_per_iter = total_sec/count_sec
-    print ' -- Seconds per iteration (q%i) = %f secs'%(count_q,sec_per_iter)
-    tot_time = sec_per_iter*it_per_rep*rep_no
-    print ' -- Estimated total time for q%i = %f secs'%(count_q,tot_time)
-    print '  (without initial irrep time)   = %f min'%(tot_time/60)
-    print '                                 = %f hr'%(tot_time/3600)
-    print '    '
+@dataclass
+class QTime:
+  '''Timing summary of a q-point'''
+  q: int
+  nirreps: int = -1
+  irreps_done: int = 0  # Irreps with converged iterations
+  iterations: int = 0   # Total iterations of the irreps done
+  nsec: int = 0         # Number of iteration lines
+  seconds: float = 0.0  # Time spent between iteration lines
+  precalc: float = 0.0  # Time before the first iteration
+  finished: bool = False
+
+  @property
+  def iter_per_rep(self):
+    return self.iterations/self.irreps_done if self.irreps_done else 0.0
+
+  @property
+  def sec_per_iter(self):
+    return self.seconds/self.nsec if self.nsec else 0.0
+
+  @property
+  def est_time(self):
+    '''Estimated total time for the q-point (without initial irrep time)'''
+    return self.sec_per_iter*self.iter_per_rep*self.nirreps
+
+@dataclass
+class PhRun:
+  '''Parallelization info and timing records of a ph.x output'''
+  fname: str
+  cores: int = -1
+  npool: int = -1
+  nspace: int = -1
+  irrep_cpu: str = ''
+  irrep_wall: str = ''
+  nqpoints: int = -1
+  qpoints: list = field(default_factory=list)
+  irreps: np.ndarray = field(default_factory=lambda: np.zeros(0, IRREP_DTYPE))
+
+
+class PhTimeParser:
+  '''
+  Single pass parser of ph.x outputs. Data is given in arbitrary byte
+  blocks with feed(), only the state of the current q-point and irrep is
+  kept between the blocks.
+
+  Lines are screened by their 6th/7th byte with NumPy; the (fixed format)
+  iteration lines are decoded together as arrays and only the few other
+  candidate lines are matched with LINE_RE.
+  '''
+  def __init__(self, fname=''):
+    self.run = PhRun(fname)
+    self.rest = b''     # Incomplete last line of the previous block
+    self.qt = None      # Current q-point
+    self.irr_no = 0     # Current irrep (0 before the first iteration of a q-point)
+    self.irr_iter = 0
+    self.irr_secs = 0.0
+    self.irr_done = []  # Blocks of finished irreps (IRREP_DTYPE)
+    self.nirreps = -1
+    self.sec_bef = 0.0  # Cumulative time of the previous iteration line
+    self.iter_bef = 0
+
+  def feed(self, data):
+    '''Parse all the complete lines in data'''
+    data = self.rest + data
+    end = data.rfind(b'\n') + 1
+    self.rest = data[end:]
+    if end == 0:
+      return
+
+    # Start, length and first letters of every line
+    buf = np.frombuffer(data, np.uint8, count=end)
+    nl = np.flatnonzero(buf == 10)
+    starts = np.empty_like(nl)
+    starts[0] = 0; starts[1:] = nl[:-1] + 1
+    length = nl - starts
+    c5 = np.take(buf, starts + 5, mode='clip')
+
+    # Iteration lines in the fixed format
+    cand = starts[(c5 == 32) & (length > ITER_COLS[-1])]
+    cand = cand[np.take(buf, cand + 6) == ord('i')]
+    ok = (buf[cand + ITER_MARK[0]] == ITER_MARK[1]) & (buf[cand + ITER_SEP[0]] == ITER_SEP[1]) \
+         & (buf[cand + ITER_DOT] == ord('.'))
+    it_pos = cand[ok]
+    digits = buf[it_pos[:,None] + ITER_COLS].astype(np.int32) - 48
+    digits[digits == -16] = 0 # Blanks
+    it = digits[:,:3] @ np.array([100,10,1], dtype=np.int32)
+    secs = digits[:,3:] @ np.array([1e5,1e4,1e3,1e2,10.,1.,0.1])
+
+    # Other lines (including iterations in an unexpected format)
+    other_pos = starts[np.isin(c5, KEYS[:,0]) & (length > 7)]
+    head = buf[other_pos[:,None] + np.arange(5,8)]
+    other_pos = other_pos[np.any(np.all(head[:,None,:] == KEYS, axis=2), axis=1)]
+    other_pos = np.union1d(other_pos, starts[c5 == QLIST])
+    if len(it_pos) < len(cand):
+      other_pos = np.union1d(other_pos, cand[~ok])
+
+    # Handle the iterations in between the other lines
+    first = 0
+    for pos in other_pos:
+      m = LINE_RE.match(data, pos, data.find(b'\n', pos))
+      if m is None:
+        continue
+      last = np.searchsorted(it_pos, pos)
+      if last > first:
+        self._iterations(it[first:last], secs[first:last])
+      first = last
+      self._line(m)
+    self._iterations(it[first:], secs[first:])
+
+  def _line(self, m):
+    if m.group('iter') is not None:
+      self._iterations(np.array([int(m.group('iter'))]), np.array([float(m.group('secs'))]))
+    elif m.group('comp') is not None:
+      self._closeQ()
+      q = self.qt.q + 1 if self.qt is not None else 0
+      self.qt = QTime(q, self.nirreps)
+      self.irr_no = 0; self.iter_bef = 0
+    elif m.group('diag') is not None:
+      self._closeQ()
+    elif m.group('nirr') is not None:
+      self.nirreps = int(m.group('nirr'))
+      if self.qt is not None: self.qt.nirreps = self.nirreps
+    elif m.group('cpu') is not None:
+      if not self.run.irrep_cpu:
+        self.run.irrep_cpu = m.group('cpu').decode()
+        self.run.irrep_wall = m.group('wall').decode()
+    elif m.group('cores') is not None:
+      self.run.cores = int(m.group('cores'))
+    elif m.group('nspace') is not None:
+      self.run.nspace = int(m.group('nspace'))
+    elif m.group('npool') is not None:
+      self.run.npool = int(m.group('npool'))
+    elif m.group('nqs') is not None:
+      self.run.nqpoints = int(m.group('nqs'))
+
+  def _iterations(self, it, secs):
+    '''Add a sequence of iteration lines of the current q-point'''
+    if len(it) == 0:
+      return
+    qt = self.qt
+    if qt is None: # Iterations before any q-point header
+      qt = self.qt = QTime(0, self.nirreps)
+    diff = secs - np.concatenate(([self.sec_bef], secs[:-1]))
+    if qt.nsec == 0:
+      qt.precalc = float(diff[0])
+      diff[0] = 0.0
+    qt.nsec += len(it)
+    qt.seconds += float(diff.sum())
+
+    # A new irrep starts when the iteration number drops
+    new = it < np.concatenate(([self.iter_bef], it[:-1]))
+    if self.irr_no == 0: new[0] = True
+    bounds = np.flatnonzero(new)
+    if len(bounds) == 0 or bounds[0] != 0:
+      bounds = np.concatenate(([0], bounds))
+    irr_secs = np.add.reduceat(diff, bounds)
+    irr_iter = it[np.concatenate((bounds[1:], [len(it)])) - 1]
+    if not new[0]: # Continue the current irrep
+      self.irr_secs += irr_secs[0]; self.irr_iter = int(irr_iter[0])
+      irr_secs = irr_secs[1:]; irr_iter = irr_iter[1:]
+    nnew = len(irr_iter)
+    if nnew > 0:
+      # Close the current irrep and all the new ones but the last
+      no = self.irr_no + np.arange(nnew)
+      done = np.zeros(nnew, IRREP_DTYPE)
+      done['q'] = qt.q; done['irrep'] = no
+      done['iterations'][1:] = irr_iter[:-1]; done['seconds'][1:] = irr_secs[:-1]
+      done['iterations'][0] = self.irr_iter; done['seconds'][0] = self.irr_secs
+      self._closeIrreps(done[1:] if self.irr_no == 0 else done)
+      self.irr_no += nnew
+      self.irr_iter = int(irr_iter[-1]); self.irr_secs = float(irr_secs[-1])
+    self.sec_bef = float(secs[-1]); self.iter_bef = int(it[-1])
+
+  def _closeIrreps(self, done):
+    if len(done) == 0:
+      return
+    self.irr_done.append(done)
+    self.qt.irreps_done += len(done)
+    self.qt.iterations += int(done['iterations'].sum())
+
+  def _current(self):
+    '''Record of the irrep in progress'''
+    cur = np.zeros(1 if self.irr_no > 0 else 0, IRREP_DTYPE)
+    if self.irr_no > 0:
+      cur[0] = (self.qt.q, self.irr_no, self.irr_iter, self.irr_secs)
+    return cur
+
+  def _closeQ(self):
+    if self.qt is None or self.qt.finished or self.qt.nsec == 0:
+      return
+    self._closeIrreps(self._current())
+    self.qt.finished = True
+    self.run.qpoints.append(self.qt)
+    self.irr_no = 0
+
+  def irrepTable(self):
+    '''Structured array of all the irreps read so far'''
+    return np.concatenate(self.irr_done + [self._current()])
+
+  def close(self):
+    '''Finish parsing and add the unfinished q-point (if any)'''
+    if self.rest:
+      self.feed(b'\n')
+    if self.qt is not None and not self.qt.finished and self.qt.nsec > 0:
+      self.run.qpoints.append(self.qt)
+    self.run.irreps = self.irrepTable()
+    return self.run
+
+
+def headHash(data):
+  '''Hash of the first bytes of an output (see PhFollower)'''
+  return hashlib.sha1(data).hexdigest()
+
+
+def parsePhOutput(fname):
+  '''Function to read the timing records of a ph.x output file'''
+  parser = PhTimeParser(fname)
+  with open(fname, 'rb') as f:
+    while True:
+      data = f.read(BLOCK)
+      if not data:
+        break
+      parser.feed(data)
+  return parser.close()
+
+
+class PhFollower:
+  '''
+  Reader of a growing ph.x output, keeping the file offset so that every
+  update() only parses the bytes appended since the previous one
+
+  A restarted job (file shorter than the offset, replaced by another inode,
+  or rewritten from the start, e.g. by a new "ph.x > out") is read again
+  from the beginning, and counted in resets. The start of the file is kept
+  as the hash hhash of its first nhead bytes.
+  '''
+  def __init__(self, fname):
+    self.fname = fname
+    self.offset = 0
+    self.parser = PhTimeParser(fname)
+    self.ino = None
+    self.nhead = 0
+    self.hhash = headHash(b'')
+    self.resets = 0
+
+  def _reset(self):
+    self.offset = 0
+    self.parser = PhTimeParser(self.fname)
+    self.nhead = 0
+    self.hhash = headHash(b'')
+    self.resets += 1
+
+  def update(self):
+    '''Parse the new part of the file, returns True if there was any'''
+    try:
+      st = os.stat(self.fname)
+    except OSError:
+      return False
+    if self.offset and (st.st_size < self.offset or st.st_ino != self.ino):
+      self._reset()
+    self.ino = st.st_ino
+    if st.st_size == self.offset:
+      return False
+    with open(self.fname, 'rb') as f:
+      if self.offset and headHash(f.read(self.nhead)) != self.hhash:
+        self._reset()
+      f.seek(self.offset)
+      while True:
+        data = f.read(BLOCK)
+        if not data:
+          break
+        self.parser.feed(data)
+        self.offset += len(data)
+      if self.nhead < HEAD:
+        self.nhead = min(self.offset, HEAD)
+        f.seek(0)
+        self.hhash = headHash(f.read(self.nhead))
+    return True
+
+
+def runETA(parser):
+  '''
+  Function to estimate the remaining time (secs) of the current q-point
+  and of the whole run from the records parsed so far
+  '''
+  run, qt = parser.run, parser.qt
+  done = run.qpoints
+  q_left = 0.0
+  est = 0.0
+  if qt is not None and not qt.finished:
+    if qt.irreps_done > 0:
+      est = qt.est_time
+    elif done:
+      est = np.mean([q.est_time for q in done])
+    q_left = max(est - qt.seconds, 0.0)
+
+  if run.nqpoints < 0:
+    return q_left, np.nan
+  # Average time of the finished q-points (or the current estimate)
+  if done:
+    q_avg = np.mean([q.precalc + q.seconds for q in done])
+  elif qt is not None:
+    q_avg = qt.precalc + est
+  else:
+    return q_left, np.nan
+  running = 1 if qt is not None and not qt.finished else 0
+  q_todo = max(run.nqpoints - len(done) - running, 0)
+  return q_left, q_left + q_todo*q_avg
+
+
+def printStatus(followers):
+  '''Print the progress and ETA of all the followed outputs'''
+  print('---- %s'%time.strftime('%Y-%m-%d %H:%M:%S'))
+  print('%-40s %9s %9s %10s %12s %12s'%('file','q','irreps','s/iter','q ETA (hr)','run ETA (hr)'))
+  for fol in followers:
+    parser = fol.parser
+    qt = parser.qt
+    if qt is None:
+      print('%-40s %9s'%(fol.fname[-40:], 'waiting'))
+      continue
+    q_left, run_left = runETA(parser)
+    nq = '%i/%s'%(len(parser.run.qpoints) + (0 if qt.finished else 1),
+                  parser.run.nqpoints if parser.run.nqpoints > 0 else '?')
+    irr = '%i/%i'%(qt.irreps_done, qt.nirreps)
+    print('%-40s %9s %9s %10.2f %12.3f %12.3f'%(fol.fname[-40:], nq, irr,
+          qt.sec_per_iter, q_left/3600, run_left/3600))
+
+
+def followOutputs(files, interval=30.):
+  '''
+  Function to follow many running ph.x jobs from a single process, by
+  polling the size of the outputs every interval seconds
+  '''
+  followers = [PhFollower(f) for f in files]
+  while True:
+    changed = [fol.update() for fol in followers]
+    if any(changed):
+      printStatus(followers)
+      sys.stdout.flush()
+    time.sleep(interval)
+
+
+def readKgrid(scf_f):
+  '''Function to read the k-grid from the scf input'''
+  kgrid = ['?']*3
+  with open(scf_f) as ff:
+    k_ind = -1
+    for ind,line in enumerate(ff):
+      if 'K_POINTS' in line.split():
+        k_ind = ind+1
+      if ind == k_ind:
+        kgrid = line.split()[:3]
+  return kgrid
+
+
+def printQ(qt):
+  '''Print the summary of a q-point'''
+  if not qt.finished:
+    print(' -- Iterations per rep (q%i) upto %i reps = %f'%(qt.q,qt.irreps_done,qt.iter_per_rep))
+  else:
+    if qt.irreps_done != qt.nirreps:
+      print('Error: no match for rep_no (%i != %i)'%(qt.irreps_done,qt.nirreps))
+    print(' -- Iterations per rep (q%i) = %f'%(qt.q,qt.iter_per_rep))
+  print(' -- Seconds per iteration (q%i) = %f secs'%(qt.q,qt.sec_per_iter))
+  tot_time = qt.est_time
+  print(' -- Estimated total time for q%i = %f secs'%(qt.q,tot_time))
+  print('  (without initial irrep time)   = %f min'%(tot_time/60))
+  print('                                 = %f hr'%(tot_time/3600))
+  print('    ')
+
+
+def printRun(run, pref, kgrid):
+  '''Print the details of a ph.x run and the timings of all q-points'''
+  print(run.fname)
+  print('    ')
+  print('INFO ---- System: %s'%(pref))
+  print('     -- scf k-grid = %sx%sx%s'%(kgrid[0],kgrid[1],kgrid[2]))
+  nirreps = run.qpoints[0].nirreps if run.qpoints else -1
+  print('     -- no. of irreps = %i'%(nirreps))
+  print('     -- no. of cores = %i'%(run.cores))
+  print('     -- no. of pools (k-point paral.) = %i'%(run.npool))
+  print('     -- no. of cores for space paral. = %i'%(run.nspace))
+
+  print('TIME')
+  print(' -- Time taken for deciding irreps =')
+  print('%s CPU, %s WALL'%(run.irrep_cpu, run.irrep_wall))
+  for qt in run.qpoints:
+    print(' -- Time for precalculations (q%i) = %f secs'%(qt.q, qt.precalc))
+    if qt.irreps_done == 0: # No converged irrep to estimate from
+      continue
+    printQ(qt)
+
+
+if __name__ == "__main__":
+
+  argp = argparse.ArgumentParser(description='Timings of ph.x calculations')
+  argp.add_argument('files', nargs='*', help='ph.x outputs (default: found in cwd)')
+  argp.add_argument('--follow', action='store_true',
+                    help='Keep reading the outputs of running jobs and update the ETA')
+  argp.add_argument('--interval', type=float, default=30.,
+                    help='Polling interval in follow mode (secs)')
+  args = argp.parse_args()
+
+  # Use the given outputs, or find the phonon or electron-phonon
+  # output file in the current directory
+  files = args.files
+  if not files:
+    if not glob.glob('*.ph*out*'):
+      files = glob.glob('*.elph*out*')[-1:]
+    else:
+      files = glob.glob('*.ph*out*')[:1]
+
+  if args.follow:
+    followOutputs(files, args.interval)
+
+  scf_f = glob.glob('*scf.in')[0]
+  pref = scf_f.split('.')[0]
+  kgrid = readKgrid(scf_f)
+
+  for file_n in files:
+    printRun(parsePhOutput(file_n), pref, kgrid)
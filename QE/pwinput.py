@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+
+###########################################################
+# Script to read a 'pw.x' input into arrays, modify the
+# structure and write it back (python pwinput.py FILE)
+###########################################################
+# readPwInput(fname) returns a PwInput with:
+#  - namelists: {name: {key: value string}} (&control...)
+#  - species, masses, pseudos (ATOMIC_SPECIES)
+#  - ityp: species index of the atoms (nat,)
+#  - pos (nat, 3), pos_units, if_pos (nat, 3) or None (atoms
+#    without flags get 1 1 1 when others have them)
+#  - cell (3, 3) or None, cell_units (CELL_PARAMETERS)
+#  - cards: the cards in their order, the other ones
+#    (K_POINTS...) as raw lines
+# Unmodified namelists are written back as they were read.
+# Displacements are given in Angstrom and converted to the
+# units of the positions (the lattice of ibrav = 1-4, 6, 8
+# is built when there are no CELL_PARAMETERS)
+# supercell(dims) repeats the atoms and the cell.
+# texts(new_pos) serializes many position sets (..., nat, 3)
+# with a single format operation per file
+###########################################################
+
+import copy
+import re
+import sys
+
+import numpy as np
+
+###########################################################
+BOHR_A = 0.529177210903 # Bohr radius in Angstrom
+POS_FMT = '%s       %.10f     %.10f     %.10f'
+CARDS = ('ATOMIC_SPECIES', 'ATOMIC_POSITIONS', 'CELL_PARAMETERS', 'K_POINTS',
+         'CONSTRAINTS', 'OCCUPATIONS', 'ATOMIC_FORCES', 'ADDITIONAL_K_POINTS',
+         'SOLVENTS', 'HUBBARD')
+# key = value pairs of a namelist line (values may be quoted and contain commas)
+PAIR_RE = re.compile(r"([\w()%,]+?)\s*=\s*('[^']*'|\"[^\"]*\"|[^,\s]+)")
+###########################################################
+
+def latticeVectors(ibrav, celldm):
+  '''
+  Function to build the Bravais lattice of ibrav = 1-4, 6, 8 as in pw.x
+
+  INPUT:
+    celldm: celldm(1..3) (alat, b/a, c/a)
+  OUTPUT:
+    Lattice vectors (3, 3) [alat]
+  '''
+  ba = celldm[1] or 1.0; ca = celldm[2] or 1.0
+  if ibrav == 1:
+    return np.eye(3)
+  if ibrav == 2:
+    return 0.5*np.array([[-1,0,1], [0,1,1], [-1,1,0]])
+  if ibrav == 3:
+    return 0.5*np.array([[1,1,1], [-1,1,1], [-1,-1,1]])
+  if ibrav == 4:
+    return np.array([[1,0,0], [-0.5,np.sqrt(3)/2,0], [0,0,ca]])
+  if ibrav == 6:
+    return np.diag([1, 1, ca])
+  if ibrav == 8:
+    return np.diag([1, ba, ca])
+  print('Error in latticeVectors: No CELL_PARAMETERS and ibrav = %i not supported'%ibrav)
+  sys.exit()
+
+
+def supercellImages(dims):
+  '''Lattice translations of the cells of a (n1 x n2 x n3) supercell (ncell, 3) [crystal]'''
+  return np.indices(dims).reshape(3, -1).T
+
+
+def _units(line):
+  '''Units of a card header: CARD {units}, CARD (units) or CARD units'''
+  rest = line.split(None, 1)[1] if len(line.split()) > 1 else ''
+  return rest.strip().strip('{}()').strip().lower()
+
+
+def _strip(line):
+  '''Line without its comment'''
+  return re.split(r'[!#]', line, 1)[0].rstrip()
+
+
+def _isCard(line):
+  return bool(line.split()) and line.split()[0].upper() in CARDS
+
+
+def _cardEnd(lines, k, n=0):
+  '''Index after the body of the card at k: n lines, or up to the next card if n = 0'''
+  if n:
+    return k + 1 + n
+  k += 1
+  while k < len(lines) and not _isCard(lines[k]):
+    k += 1
+  return k
+
+
+class PwInput:
+  '''Structure and parameters of a pw.x input'''
+  def __init__(self):
+    self.namelists = {}   # name -> {key: value string}
+    self.raw = {}         # name -> original lines, while unmodified
+    self.species = []; self.masses = np.zeros(0); self.pseudos = []
+    self.ityp = np.zeros(0, dtype=int)
+    self.pos = np.zeros((0,3)); self.pos_units = 'alat'
+    self.if_pos = None
+    self.cell = None; self.cell_units = ''
+    self.cards = []       # (header, lines) of the cards, lines None for the ones above
+
+  @property
+  def nat(self):
+    return len(self.ityp)
+
+  @property
+  def labels(self):
+    return [self.species[t] for t in self.ityp]
+
+  def get(self, name, key, default=None):
+    '''Value of a namelist variable as a Python number, string or bool'''
+    val = self.namelists.get(name, {}).get(key)
+    if val is None:
+      return default
+    if val[0] in '\'"':
+      return val[1:-1]
+    if val.lower() in ('.true.', '.false.'):
+      return val.lower() == '.true.'
+    try:
+      return int(val)
+    except ValueError:
+      return float(val.lower().replace('d', 'e'))
+
+  def set(self, name, key, value):
+    '''Set a namelist variable (strings are quoted, bools as .true./.false.)'''
+    if isinstance(value, bool):
+      value = '.true.' if value else '.false.'
+    elif isinstance(value, str):
+      value = "'%s'"%value
+    self.namelists.setdefault(name, {})[key] = str(value)
+    self.raw.pop(name, None)
+
+  def unset(self, name, key):
+    '''Remove a namelist variable'''
+    if self.namelists.get(name, {}).pop(key, None) is not None:
+      self.raw.pop(name, None)
+
+  def speciesMask(self, names):
+    '''Atoms of the given species (nat,)'''
+    missing = [s for s in names if s not in self.species]
+    if missing:
+      print('Error in speciesMask: No %s atoms'%', '.join(missing))
+      sys.exit()
+    return np.isin(self.ityp, [self.species.index(s) for s in names])
+
+  def cartesian(self, pos=None):
+    '''Positions in Angstrom (for pos_units crystal, angstrom, bohr or alat with celldm)'''
+    pos = self.pos if pos is None else pos
+    if self.pos_units == 'crystal':
+      return pos @ self.cellAngstrom()
+    if self.pos_units == 'angstrom':
+      return pos
+    if self.pos_units == 'bohr':
+      return pos*BOHR_A
+    return pos*self.alat()*BOHR_A
+
+  def fromCartesian(self, vec):
+    '''Vectors (..., 3) in Angstrom converted to the units of pos'''
+    if self.pos_units == 'crystal':
+      return np.linalg.solve(self.cellAngstrom().T, np.moveaxis(vec, -1, 0).reshape(3, -1)).T.reshape(vec.shape)
+    if self.pos_units == 'angstrom':
+      return vec
+    if self.pos_units == 'bohr':
+      return vec/BOHR_A
+    return vec/(self.alat()*BOHR_A)
+
+  def alat(self):
+    '''Lattice parameter [bohr] from celldm(1) or A'''
+    if self.get('system', 'celldm(1)') is not None:
+      return self.get('system', 'celldm(1)')
+    if self.get('system', 'a') is not None:
+      return self.get('system', 'a')/BOHR_A
+    return 1.0
+
+  def celldm(self, k):
+    '''celldm(k), or the equivalent ratio from A, B, C (cosines are not converted)'''
+    val = self.get('system', 'celldm(%i)'%k)
+    if val is None and k in (2, 3) and self.get('system', 'a') is not None:
+      other = self.get('system', 'b' if k == 2 else 'c')
+      val = other/self.get('system', 'a') if other is not None else None
+    return val
+
+  def cellAngstrom(self):
+    '''Lattice vectors in Angstrom, from CELL_PARAMETERS or from ibrav'''
+    if self.cell is None:
+      celldm = [self.alat(), self.celldm(2), self.celldm(3)]
+      return latticeVectors(self.get('system', 'ibrav', 0), celldm)*self.alat()*BOHR_A
+    if self.cell_units == 'angstrom':
+      return self.cell
+    if self.cell_units == 'bohr':
+      return self.cell*BOHR_A
+    return self.cell*self.alat()*BOHR_A
+
+  def displaced(self, disp, mask=None):
+    '''
+    Function to displace atoms, broadcasting over leading axes
+
+    INPUT:
+      disp: Cartesian displacements (..., n, 3) [Angstrom], for the atoms
+            of mask (n = mask.sum()) or for all of them
+      mask: Atoms to displace (nat,), None for all
+    OUTPUT:
+      New positions (..., nat, 3) in the units of pos
+    '''
+    disp = self.fromCartesian(np.asarray(disp, dtype=float))
+    new = np.broadcast_to(self.pos, disp.shape[:-2] + self.pos.shape).copy()
+    if mask is None:
+      new += disp
+    else:
+      new[...,mask,:] += disp
+    return new
+
+  def supercell(self, dims):
+    '''
+    Function to build the (n1 x n2 x n3) supercell input
+
+    The atoms are ordered atom-major (atom k of cell c is k*ncell + c, with
+    the cells of supercellImages), the cell is written as CELL_PARAMETERS
+    (ibrav = 0) and an automatic k-grid is divided by dims
+    '''
+    dims = np.asarray(dims, dtype=int)
+    images = supercellImages(dims)
+    ncell = len(images)
+    sup = copy.deepcopy(self)
+    shift = self.fromCartesian(images @ self.cellAngstrom())
+    pos = self.pos[:,None] + shift[None]
+    if self.pos_units == 'crystal':
+      pos = pos/dims
+    sup.pos = pos.reshape(-1, 3)
+    sup.ityp = np.repeat(self.ityp, ncell)
+    if self.if_pos is not None:
+      sup.if_pos = np.repeat(self.if_pos, ncell, axis=0)
+    if self.cell is None:
+      sup.cell = self.cellAngstrom()/(self.alat()*BOHR_A); sup.cell_units = 'alat'
+      for key in ('celldm(2)', 'celldm(3)', 'celldm(4)', 'celldm(5)', 'celldm(6)',
+                  'b', 'c', 'cosab', 'cosac', 'cosbc'):
+        sup.unset('system', key)
+      sup.set('system', 'ibrav', 0)
+    sup.cell = sup.cell*dims[:,None]
+    sup.set('system', 'nat', sup.nat)
+    for k, (head, lines) in enumerate(sup.cards):
+      if head.split()[0].upper() == 'K_POINTS' and _units(head) == 'automatic' and lines:
+        grid = np.array(lines[0].split(), dtype=int)
+        grid[:3] = np.maximum(1, np.round(grid[:3]/dims)).astype(int)
+        sup.cards[k] = (head, [' %i %i %i %i %i %i'%tuple(grid)] + lines[1:])
+    return sup
+
+  def _template(self):
+    '''Text of the input as a format string with the positions as %f fields'''
+    out = []
+    for name, keys in self.namelists.items():
+      if name in self.raw:
+        out += self.raw[name]
+      else:
+        out.append('&%s'%name)
+        out += ['  %s = %s'%(key, val) for key, val in keys.items()]
+        out.append('/')
+    out = [line.replace('%', '%%') for line in out]
+
+    cards = self.cards
+    if self.cell is not None and not any(h == 'CELL_PARAMETERS' for h, l in cards):
+      cards = [('CELL_PARAMETERS', None)] + cards
+    for head, lines in cards:
+      if lines is not None:
+        out += [l.replace('%', '%%') for l in [head] + lines]
+      elif head == 'ATOMIC_SPECIES':
+        out.append('ATOMIC_SPECIES')
+        out += ['%s  %s  %s'%(s, ('%.6f'%m).rstrip('0').rstrip('.'), p)
+                for s, m, p in zip(self.species, self.masses, self.pseudos)]
+      elif head == 'CELL_PARAMETERS' and self.cell is not None:
+        out.append('CELL_PARAMETERS %s'%self.cell_units if self.cell_units else 'CELL_PARAMETERS')
+        out += ['  %14.9f %14.9f %14.9f'%tuple(row) for row in self.cell]
+      elif head == 'ATOMIC_POSITIONS':
+        out.append('ATOMIC_POSITIONS %s'%self.pos_units)
+        for k, label in enumerate(self.labels):
+          line = POS_FMT.replace('%s', label)
+          if self.if_pos is not None:
+            line += '   %i %i %i'%tuple(self.if_pos[k])
+          out.append(line)
+    return '\n'.join(out) + '\n'
+
+  def texts(self, pos=None):
+    '''Generator of the input files for the position sets pos (..., nat, 3)'''
+    fmt = self._template()
+    pos = self.pos if pos is None else np.asarray(pos)
+    for xyz in pos.reshape(-1, self.nat*3):
+      yield fmt%tuple(xyz)
+
+  def write(self, fname, pos=None):
+    '''Function to write the input, optionally with other positions'''
+    with open(fname, 'w') as f:
+      f.write(next(self.texts(pos)))
+
+
+def readPwInput(fname):
+  '''Function to read a pw.x input file'''
+  with open(fname) as f:
+    lines = f.read().splitlines()
+
+  inp = PwInput()
+  k = 0
+  # Namelists: everything from &name to /
+  while k < len(lines):
+    line = _strip(lines[k]).strip()
+    if line.startswith('&'):
+      name = line[1:].split()[0].lower()
+      keys = {}; raw = [lines[k]]
+      k += 1
+      while k < len(lines) and _strip(lines[k]).strip() != '/':
+        raw.append(lines[k])
+        for key, val in PAIR_RE.findall(_strip(lines[k])):
+          keys[key.lower()] = val
+        k += 1
+      raw.append(lines[k] if k < len(lines) else '/')
+      inp.namelists[name] = keys; inp.raw[name] = raw
+    elif line and line.split()[0].upper() in CARDS:
+      break
+    k += 1
+
+  nat = inp.get('system', 'nat', 0)
+  ntyp = inp.get('system', 'ntyp', 0)
+  labels = []
+  while k < len(lines):
+    line = _strip(lines[k])
+    card = line.split()[0].upper() if line.split() else ''
+    if card == 'ATOMIC_SPECIES':
+      rows = [l.split() for l in lines[k+1:k+1+ntyp]]
+      inp.species = [r[0] for r in rows]
+      inp.masses = np.array([r[1] for r in rows], dtype=float)
+      inp.pseudos = [r[2] for r in rows]
+      inp.cards.append((card, None))
+      k += 1 + ntyp
+    elif card == 'ATOMIC_POSITIONS':
+      inp.pos_units = _units(line) or 'alat'
+      end = _cardEnd(lines, k, nat)
+      rows = [_strip(l).split() for l in lines[k+1:end]]
+      rows = [r for r in rows if r]
+      labels = [r[0] for r in rows]
+      inp.pos = np.array([r[1:4] for r in rows], dtype=float).reshape(-1,3)
+      if any(len(r) >= 7 for r in rows):
+        # Atoms without flags are free (1 1 1)
+        inp.if_pos = np.array([r[4:7] if len(r) >= 7 else [1, 1, 1] for r in rows], dtype=int)
+      inp.cards.append((card, None))
+      k = end
+    elif card == 'CELL_PARAMETERS':
+      inp.cell_units = _units(line)
+      inp.cell = np.array([_strip(l).split()[:3] for l in lines[k+1:k+4]], dtype=float)
+      inp.cards.append((card, None))
+      k += 4
+    elif card in CARDS:
+      end = _cardEnd(lines, k)
+      head = lines[k]; body = lines[k+1:end]
+      k = end
+      while body and not body[-1].strip():
+        body.pop()
+      inp.cards.append((head, body))
+    else:
+      k += 1
+
+  # Species of the atoms (species only found in the positions are added)
+  for s in labels:
+    if s not in inp.species:
+      inp.species.append(s); inp.pseudos.append('')
+      inp.masses = np.append(inp.masses, 0.0)
+  inp.ityp = np.array([inp.species.index(s) for s in labels], dtype=int)
+  return inp
+
+
+if __name__ == "__main__":
+
+  inp = readPwInput(sys.argv[1])
+  print('namelists: %s'%', '.join(inp.namelists))
+  print('nat = %i, species = %s'%(inp.nat, ', '.join(inp.species)))
+  print('positions (%s):'%inp.pos_units)
+  for s, row in zip(inp.labels, inp.pos):
+    print('  %-4s %12.6f %12.6f %12.6f'%((s,) + tuple(row)))
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+
+###########################################################
+# Script to extract every ionic step of a 'pw.x' relax or
+# vc-relax (or md) output as NumPy arrays, in one pass
+# (python pwtraj.py OUTPUT [-o TRAJ.npz])
+###########################################################
+# readTrajectory(fname) returns a dictionary with:
+#  - species: names, ityp: species index of the atoms (nat,)
+#  - alat [bohr]
+#  - cell: lattice vectors in rows (nsteps, 3, 3) [Angstrom]
+#  - pos: cartesian positions (nsteps, nat, 3) [Angstrom]
+#  - frac: crystal coordinates (nsteps, nat, 3)
+#  - energy: total energies (nsteps,) [Ry]
+#  - forces: (nsteps, nat, 3) [Ry/bohr]
+#  - stress: (nsteps, 3, 3) [kbar] (NaN if not computed)
+# Step k is the structure of the k-th SCF (the initial one
+# first), with the energy, forces and stress computed for it
+#
+# Random access: indexSteps(fname) finds the byte offsets of
+# the blocks of every step with mmap, and readStep(fname, k)
+# parses only the blocks of step k. loadIndex keeps the
+# index in the phcache binary cache, so it is built once
+# per version of the output
+# (python pwtraj.py OUTPUT -s STEP)
+###########################################################
+
+import argparse
+import mmap
+import sys
+
+import numpy as np
+
+from phcache import cachedRead
+
+###########################################################
+BOHR_A = 0.529177210903 # Bohr radius in Angstrom
+###########################################################
+
+class _Buffer:
+  '''Preallocated array of records of a given shape, doubled when full'''
+  def __init__(self, shape, fill=np.nan, size=64):
+    self.data = np.full((size,) + tuple(shape), fill)
+    self.n = 0
+    self.fill = fill
+
+  def put(self, k, value):
+    while k >= len(self.data):
+      self.data = np.concatenate((self.data, np.full_like(self.data, self.fill)))
+    self.data[k] = value
+    self.n = max(self.n, k+1)
+
+  def array(self, n):
+    return self.data[:n].copy()
+
+
+def _block(f, n):
+  '''Next n lines of a file'''
+  return [next(f) for _ in range(n)]
+
+
+def _floats(lines, first, last):
+  '''Columns first:last of a block of lines as a float array'''
+  return np.array([line.split()[first:last] for line in lines], dtype=float)
+
+
+def _cellUnits(line, alat):
+  '''Conversion factor to Angstrom of a CELL_PARAMETERS header'''
+  if 'alat' in line:
+    try:
+      alat = float(line.split('=')[1].split(')')[0])
+    except (IndexError, ValueError):
+      pass
+    return alat*BOHR_A
+  if 'angstrom' in line:
+    return 1.0
+  return BOHR_A # bohr
+
+
+def _toCart(line, xyz, cell, alat):
+  '''Cartesian positions [Angstrom] from an ATOMIC_POSITIONS block'''
+  if 'crystal' in line:
+    return xyz @ cell
+  if 'angstrom' in line:
+    return xyz
+  if 'bohr' in line:
+    return xyz*BOHR_A
+  return xyz*alat*BOHR_A # alat
+
+
+def readTrajectory(fname):
+  '''Function to read all the ionic steps of a pw.x output'''
+  nat = 0; alat = 1.0
+  cell = np.zeros((3,3)); species = []; ityp = None
+  nstruct = 0; nener = 0
+  cells = pos = forces = None
+  energy = _Buffer(())
+  stress = _Buffer((3,3))
+
+  with open(fname) as f:
+    for line in f:
+      if line.startswith('!'):
+        energy.put(nener, float(line.split('=')[1].split()[0]))
+        nener += 1
+      elif 'Forces acting on atoms' in line:
+        lines = []
+        while len(lines) < nat:
+          l = next(f)
+          if 'force =' in l:
+            lines.append(l.split('=')[1])
+        forces.put(nener-1, _floats(lines, 0, 3))
+      elif 'total   stress' in line:
+        stress.put(nener-1, _floats(_block(f, 3), 3, 6))
+      elif line.startswith('CELL_PARAMETERS'):
+        cell = _floats(_block(f, 3), 0, 3)*_cellUnits(line, alat)
+      elif line.startswith('ATOMIC_POSITIONS'):
+        lines = _block(f, nat)
+        xyz = _floats(lines, 1, 4)
+        cells.put(nstruct, cell); pos.put(nstruct, _toCart(line, xyz, cell, alat))
+        nstruct += 1
+      elif 'number of atoms/cell' in line:
+        nat = int(line.split('=')[1])
+        cells = _Buffer((3,3)); pos = _Buffer((nat,3)); forces = _Buffer((nat,3))
+      elif 'lattice parameter (alat)' in line:
+        alat = float(line.split('=')[1].split()[0])
+      elif 'crystal axes: (cart. coord. in units of alat)' in line:
+        lines = [l.split('(')[2].split(')')[0] for l in _block(f, 3)]
+        cell = _floats(lines, 0, 3)*alat*BOHR_A
+      elif 'site n.' in line and 'alat units' in line and nstruct == 0:
+        lines = _block(f, nat)
+        labels = [l.split()[1] for l in lines]
+        species = list(dict.fromkeys(labels))
+        ityp = np.array([species.index(s) for s in labels])
+        xyz = _floats([l.split('(')[2].split(')')[0] for l in lines], 0, 3)
+        cells.put(0, cell); pos.put(0, xyz*alat*BOHR_A)
+        nstruct = 1
+
+  if nat == 0:
+    print('Error in readTrajectory: No atoms found in %s'%fname)
+    sys.exit()
+  # The final coordinates of a relax repeat the last structure
+  nsteps = min(nstruct, nener)
+  traj = {'species': species, 'ityp': ityp, 'alat': alat}
+  traj['cell'] = cells.array(nsteps)
+  traj['pos'] = pos.array(nsteps)
+  # Crystal coordinates: solve frac @ cell = pos for all the steps at once
+  traj['frac'] = np.linalg.solve(traj['cell'].transpose(0,2,1), traj['pos'].transpose(0,2,1)).transpose(0,2,1)
+  traj['energy'] = energy.array(nsteps)
+  traj['forces'] = forces.array(nsteps)
+  traj['stress'] = stress.array(nsteps)
+  return traj
+
+
+def saveTrajectory(fname, traj):
+  '''Function to write a trajectory as a compressed .npz file'''
+  np.savez_compressed(fname, **{key: np.asarray(val) for key, val in traj.items()})
+
+
+def loadTrajectory(fname):
+  '''Function to read a trajectory written by saveTrajectory'''
+  with np.load(fname) as data:
+    traj = {key: data[key] for key in data.files}
+  traj['species'] = traj['species'].tolist()
+  traj['alat'] = float(traj['alat'])
+  return traj
+
+
+def _findAll(mm, key):
+  '''Offsets of all the occurrences of key in a mapped file'''
+  out = []
+  k = mm.find(key, 0)
+  while k >= 0:
+    out.append(k)
+    k = mm.find(key, k + 1)
+  return np.array(out, dtype=np.int64)
+
+
+def _lines(mm, off, n):
+  '''n lines of a mapped file after the line starting at off'''
+  mm.seek(off)
+  head = mm.readline().decode()
+  return head, [mm.readline().decode() for _ in range(n)]
+
+
+def _after(offs, marks):
+  '''For every mark, the first offset after it (and before the next mark), or -1'''
+  ind = np.searchsorted(offs, marks)
+  found = np.full(len(marks), -1, dtype=np.int64)
+  ok = ind < len(offs)
+  found[ok] = offs[ind[ok]]
+  nxt = np.append(marks[1:], np.iinfo(np.int64).max)
+  found[found >= nxt] = -1
+  return found
+
+
+def _before(offs, marks, lower):
+  '''For every mark, the last offset before it (and after lower), or -1'''
+  if len(offs) == 0:
+    return np.full(len(marks), -1, dtype=np.int64)
+  ind = np.searchsorted(offs, marks) - 1
+  found = np.where(ind >= 0, offs[np.maximum(ind, 0)], -1)
+  found[found < lower] = -1
+  return found
+
+
+def _carry(off):
+  '''Replace the missing (-1) offsets by the previous valid one'''
+  last = np.maximum.accumulate(np.where(off >= 0, np.arange(len(off)), 0))
+  return off[last]
+
+
+def indexSteps(fname):
+  '''
+  Function to index the ionic steps of a pw.x output
+
+  OUTPUT:
+    Dictionary with the header (nat, alat, species, ityp, axes [Angstrom]),
+    the energies (nsteps,) and the byte offsets (nsteps,) of the energy,
+    positions, cell, forces and stress blocks of every step (-1: missing;
+    positions of step 0 and missing cells refer to the header)
+  '''
+  with open(fname, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+    head, lines = _lines(mm, mm.find(b'number of atoms/cell', 0), 0)
+    nat = int(head.split('=')[1])
+    head, lines = _lines(mm, mm.find(b'lattice parameter (alat)', 0), 0)
+    alat = float(head.split('=')[1].split()[0])
+    head, lines = _lines(mm, mm.find(b'crystal axes: (cart. coord. in units of alat)', 0), 3)
+    axes = _floats([l.split('(')[2].split(')')[0] for l in lines], 0, 3)*alat*BOHR_A
+    site = mm.find(b'site n.', 0)
+    head, lines = _lines(mm, site, nat)
+    labels = [l.split()[1] for l in lines]
+    species = list(dict.fromkeys(labels))
+
+    ener = _findAll(mm, b'\n!') + 1
+    energy = np.array([float(mm[k:mm.find(b'\n', k)].split(b'=')[1].split()[0]) for k in ener])
+    apos = _findAll(mm, b'\nATOMIC_POSITIONS') + 1
+    cpar = _findAll(mm, b'\nCELL_PARAMETERS') + 1
+    frc = _findAll(mm, b'Forces acting on atoms')
+    strs = _findAll(mm, b'total   stress')
+
+  nsteps = len(ener)
+  prev = np.concatenate(([site], ener[:-1]))
+  index = {'nat': nat, 'alat': alat, 'species': species,
+           'ityp': np.array([species.index(s) for s in labels]), 'axes': axes, 'energy': energy}
+  index['energy_off'] = ener
+  # Structures are carried over the steps without a new block (e.g. the
+  # cell of a relax, which has no CELL_PARAMETERS)
+  pos_off = _before(apos, ener, prev)
+  cell_off = _before(cpar, pos_off, prev)
+  if nsteps:
+    pos_off[0] = site; cell_off[0] = -1
+  index['pos_off'] = _carry(pos_off)
+  index['cell_off'] = _carry(cell_off)
+  index['force_off'] = _after(frc, ener)
+  index['stress_off'] = _after(strs, ener)
+  return index
+
+
+def loadIndex(fname):
+  '''Function to read the step index of a pw.x output through the cache'''
+  return cachedRead(fname, indexSteps, 'pwindex', mmap=False)
+
+
+def readStep(fname, k, index=None):
+  '''
+  Function to read a single ionic step through the index and mmap
+
+  OUTPUT:
+    Dictionary with species, ityp, cell (3, 3), pos, frac (nat, 3)
+    [Angstrom], energy [Ry], forces (nat, 3) [Ry/bohr], stress (3, 3) [kbar]
+  '''
+  index = index or loadIndex(fname)
+  nat, alat = index['nat'], index['alat']
+  k = range(len(index['energy']))[k] # Negative steps count from the end
+  step = {'species': index['species'], 'ityp': index['ityp'], 'energy': float(index['energy'][k])}
+  with open(fname, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+    cell = index['axes']
+    if index['cell_off'][k] >= 0:
+      head, lines = _lines(mm, index['cell_off'][k], 3)
+      cell = _floats(lines, 0, 3)*_cellUnits(head, alat)
+    head, lines = _lines(mm, index['pos_off'][k], nat)
+    if k == 0:
+      pos = _floats([l.split('(')[2].split(')')[0] for l in lines], 0, 3)*alat*BOHR_A
+    else:
+      pos = _toCart(head, _floats(lines, 1, 4), cell, alat)
+    forces = np.full((nat,3), np.nan)
+    if index['force_off'][k] >= 0:
+      mm.seek(index['force_off'][k])
+      flines = []
+      while len(flines) < nat:
+        line = mm.readline().decode()
+        if 'force =' in line:
+          flines.append(line.split('=')[1])
+      forces = _floats(flines, 0, 3)
+    stress = np.full((3,3), np.nan)
+    if index['stress_off'][k] >= 0:
+      head, lines = _lines(mm, index['stress_off'][k], 3)
+      stress = _floats(lines, 3, 6)
+  step['cell'] = cell; step['pos'] = pos
+  step['frac'] = np.linalg.solve(cell.T, pos.T).T
+  step['forces'] = forces; step['stress'] = stress
+  return step
+
+
+if __name__ == "__main__":
+
+  argp = argparse.ArgumentParser(description='Ionic steps of a pw.x output')
+  argp.add_argument('fname', help='pw.x output')
+  argp.add_argument('-o', '--out', help='Trajectory file (default: OUTPUT.traj.npz)')
+  argp.add_argument('-s', '--step', type=int, help='Print only this step (through the index)')
+  args = argp.parse_args()
+
+  if args.step is not None:
+    step = readStep(args.fname, args.step)
+    print('energy = %.8f Ry'%step['energy'])
+    print('CELL_PARAMETERS (angstrom)')
+    for row in step['cell']:
+      print('  %14.9f %14.9f %14.9f'%tuple(row))
+    print('ATOMIC_POSITIONS (angstrom)')
+    for t, row in zip(step['ityp'], step['pos']):
+      print('%-4s %14.10f %14.10f %14.10f'%((step['species'][t],) + tuple(row)))
+    sys.exit()
+
+  traj = readTrajectory(args.fname)
+  out = args.out or args.fname.rsplit('.out', 1)[0] + '.traj.npz'
+  saveTrajectory(out, traj)
+  nsteps, nat = traj['pos'].shape[:2]
+  print('%i steps, %i atoms (%s) -> %s'%(nsteps, nat, ' '.join(traj['species']), out))
+  fmax = np.abs(traj['forces']).max(axis=(1,2))
+  press = np.trace(traj['stress'], axis1=1, axis2=2)/3
+  print('%5s %18s %12s %12s %10s'%('step', 'energy [Ry]', 'dE [Ry]', 'Fmax [Ry/au]', 'P [kbar]'))
+  for k in range(nsteps):
+    dE = traj['energy'][k] - traj['energy'][k-1] if k else 0.0
+    print('%5i %18.8f %12.3e %12.6f %10.2f'%(k, traj['energy'][k], dE, fmax[k], press[k]))